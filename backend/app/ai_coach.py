@@ -1,34 +1,55 @@
 import os
+import time
 import httpx
 import json
-from typing import List, Optional
-from pydantic import BaseModel
-from fastapi import FastAPI
+import logging
 from dotenv import load_dotenv
+from app.models import WorkoutRequest, Exercise, WorkoutDay, WorkoutPlan
+from app.circuit_breaker import CircuitBreaker, register
 
+# This module is imported lazily by app.main on the first AI request,
+# so loading .env and httpx here no longer costs anything at API startup.
 load_dotenv()
 
-# --- Models ---
-class WorkoutRequest(BaseModel):
-    fitness_level: str
-    days_per_week: int
-    focus_areas: Optional[str] = None
+logger = logging.getLogger(__name__)
 
-class Exercise(BaseModel):
-    name: str
-    sets: str
-    reps: str
-    notes: Optional[str] = None
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+# Hard deadline per call; calls slower than OPENAI_SLOW_CALL count against
+# the circuit breaker even when they succeed.
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "20"))
+OPENAI_SLOW_CALL = float(os.getenv("OPENAI_SLOW_CALL", "10"))
 
-class WorkoutDay(BaseModel):
-    day: str
-    focus: str
-    exercises: List[Exercise]
+breaker = register(CircuitBreaker(
+    "openai",
+    slow_call=OPENAI_SLOW_CALL,
+    cooldown=float(os.getenv("OPENAI_BREAKER_COOLDOWN", "30")),
+))
 
-class WorkoutPlan(BaseModel):
-    routine_name: str
-    schedule: List[WorkoutDay]
-    coach_tip: str
+_client: httpx.AsyncClient | None = None
+
+def get_client() -> httpx.AsyncClient:
+    # One pooled client for all AI calls instead of a new connection each time.
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(base_url=OPENAI_BASE_URL, timeout=OPENAI_TIMEOUT)
+    return _client
+
+def set_client(client: httpx.AsyncClient | None):
+    global _client
+    _client = client
+
+def _fallback_plan(reason: str, tip: str) -> WorkoutPlan:
+    return WorkoutPlan(
+        routine_name="Fallback Routine (Connection Error)",
+        schedule=[
+            WorkoutDay(
+                day="Error Day",
+                focus="None",
+                exercises=[Exercise(name="Rest", sets="0", reps="0", notes=reason)]
+            )
+        ],
+        coach_tip=tip
+    )
 
 # --- Service Logic ---
 class AICoachService:
@@ -37,7 +58,7 @@ class AICoachService:
         use_mock = os.getenv("USE_MOCK_AI", "False").lower() == "true"
         
         if use_mock:
-            print("DEBUG: Mock Mode is ON. Returning fake data (No Cost).")
+            logger.debug("Mock Mode is ON. Returning fake data (No Cost).")
             return WorkoutPlan(
                 routine_name="Test Routine (Mock Mode)",
                 schedule=[
@@ -83,48 +104,42 @@ class AICoachService:
 
         user_prompt = f"Level: {request.fitness_level}, Days: {request.days_per_week}, Focus: {request.focus_areas}. IMPORTANT: Every single workout day MUST include at least one exercise targeting {request.focus_areas}. CRITICAL: You MUST provide at least 5 exercises per day. If you provide less than 5, the system will fail. VITAL: ENSURE VARIETY. Compound movements (like squats, bench) should generally have lower reps (e.g., 5-8) and isolation movements (like curls, flyes) should have higher reps (e.g., 10-15). Do NOT output the same sets/reps for every exercise."
 
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            try:
-                response = await client.post(
-                    "https://api.openai.com/v1/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {api_key}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "model": "gpt-3.5-turbo",
-                        "messages": [
-                            {"role": "system", "content": system_prompt},
-                            {"role": "user", "content": user_prompt}
-                        ],
-                        "temperature": 0.7
-                    }
-                )
-                
-                response.raise_for_status()
-                data = response.json()
-                content = data["choices"][0]["message"]["content"]
-                
-                plan_dict = json.loads(content)
-                return WorkoutPlan(**plan_dict)
+        if not breaker.allow():
+            return _fallback_plan(
+                "AI coach temporarily unavailable",
+                "The AI coach is having trouble right now. Please try again in a minute."
+            )
 
-            except Exception as e:
-                print(f"Error calling OpenAI: {e}")
-                return WorkoutPlan(
-                    routine_name="Fallback Routine (Connection Error)",
-                    schedule=[
-                        WorkoutDay(
-                            day="Error Day",
-                            focus="None",
-                            exercises=[Exercise(name="Rest", sets="0", reps="0", notes=str(e))]
-                        )
+        start = time.perf_counter()
+        try:
+            response = await get_client().post(
+                "/chat/completions",
+                headers={
+                    "Authorization": f"Bearer {api_key}",
+                    "Content-Type": "application/json"
+                },
+                json={
+                    "model": "gpt-3.5-turbo",
+                    "messages": [
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_prompt}
                     ],
-                    coach_tip="Could not connect to OpenAI. Please check your API Key and Credit."
-                )
-
-# --- FastAPI Setup ---
-app = FastAPI()
+                    "temperature": 0.7
+                }
+            )
+            response.raise_for_status()
+        except Exception as e:
+            breaker.record(False)
+            logger.exception(f"Error calling OpenAI: {e}")
+            return _fallback_plan(str(e), "Could not connect to OpenAI. Please check your API Key and Credit.")
+        # The upstream answered; a malformed plan is not an outage.
+        breaker.record(True, time.perf_counter() - start)
 
-@app.post("/generate_routine")
-async def generate_workout_endpoint(request: WorkoutRequest):
-    return await AICoachService.generate_routine(request)
\ No newline at end of file
+        try:
+            data = response.json()
+            content = data["choices"][0]["message"]["content"]
+            plan_dict = json.loads(content)
+            return WorkoutPlan(**plan_dict)
+        except Exception as e:
+            logger.exception(f"Unusable response from OpenAI: {e}")
+            return _fallback_plan(str(e), "The AI coach returned an unexpected answer. Please try again.")
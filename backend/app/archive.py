@@ -0,0 +1,240 @@
+import json
+import mmap
+import os
+import struct
+import time
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Iterable, NamedTuple
+from sqlalchemy import delete, text, update
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.models import PR, ChangeSequence
+
+# PRs older than ARCHIVE_AFTER_DAYS are moved out of the PR table by
+# scripts/archive_prs.py into one file per user under ARCHIVE_DIR.
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "./archive")
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "365"))
+
+# File layout: header, then one fixed-width column per field (native byte
+# order), then a JSON footer with the exercise names and per-exercise stats.
+# Rows are sorted by performed_at, so time ranges are two bisects.
+MAGIC = b"GPRA"
+FORMAT_VERSION = 1
+_HEADER = struct.Struct("=4sHHIQQ")  # magic, version, unused, rows, footer offset, footer length
+_DATA_START = 32
+# (attribute, array typecode); 8-byte columns first so every column is aligned.
+COLUMNS = (
+    ("ids", "q"),
+    ("performed_at", "q"),  # microseconds since the epoch, UTC
+    ("seqs", "q"),
+    ("weights", "d"),
+    ("exercise_ids", "I"),
+    ("reps", "I"),
+)
+_EPOCH = datetime(1970, 1, 1)
+
+class ExerciseStats(NamedTuple):
+    name: str
+    count: int
+    reps: int
+    max_weight: float
+
+def _micros(value: datetime) -> int:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - _EPOCH) // timedelta(microseconds=1)
+
+def path_for(user_id: int) -> str:
+    return os.path.join(ARCHIVE_DIR, f"{user_id}.prs")
+
+class Archive:
+    """One user's archived PRs, read in place from a memory-mapped file.
+
+    Columns are memoryviews over the mapping, so scans and bisects read the
+    page cache directly and nothing is copied until rows are materialized.
+    """
+
+    def __init__(self, user_id: int, path: str):
+        self.user_id = user_id
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, rows, footer_offset, footer_length = _HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} PR archive")
+        view = memoryview(self._mmap)
+        offset = _DATA_START
+        for name, typecode in COLUMNS:
+            size = rows * array(typecode).itemsize
+            setattr(self, name, view[offset:offset + size].cast(typecode))
+            offset += size
+        footer = json.loads(bytes(view[footer_offset:footer_offset + footer_length]))
+        self.exercises: list[ExerciseStats] = [ExerciseStats(*e) for e in footer["exercises"]]
+        self._rows_by_id: dict[int, int] | None = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def max_id(self) -> int:
+        return max(self.ids, default=0)
+
+    def between(self, since: datetime | None = None, until: datetime | None = None) -> range:
+        """Row positions with since <= performed_at < until."""
+        lo = bisect_left(self.performed_at, _micros(since)) if since is not None else 0
+        hi = bisect_left(self.performed_at, _micros(until)) if until is not None else len(self)
+        return range(lo, max(lo, hi))
+
+    def row(self, i: int) -> PR:
+        return PR(
+            id=self.ids[i],
+            user_id=self.user_id,
+            exercise=self.exercises[self.exercise_ids[i]].name,
+            weight=self.weights[i],
+            reps=self.reps[i],
+            performed_at=_EPOCH + timedelta(microseconds=self.performed_at[i]),
+            seq=self.seqs[i],
+        )
+
+    def rows(self, positions: Iterable[int] | None = None) -> list[PR]:
+        return [self.row(i) for i in (positions if positions is not None else range(len(self)))]
+
+    def find(self, id: int) -> PR | None:
+        if self._rows_by_id is None:
+            self._rows_by_id = {pr_id: i for i, pr_id in enumerate(self.ids)}
+        i = self._rows_by_id.get(id)
+        return self.row(i) if i is not None else None
+
+def write(user_id: int, prs: Iterable[PR]):
+    """Write (or replace) a user's archive atomically."""
+    prs = sorted(prs, key=lambda pr: (_micros(pr.performed_at), pr.id))
+    names: dict[str, int] = {}
+    stats: list[list] = []
+    columns = {name: array(typecode) for name, typecode in COLUMNS}
+    for pr in prs:
+        index = names.setdefault(pr.exercise, len(names))
+        if index == len(stats):
+            stats.append([pr.exercise, 0, 0, pr.weight])
+        entry = stats[index]
+        entry[1] += 1
+        entry[2] += pr.reps
+        entry[3] = max(entry[3], pr.weight)
+        columns["ids"].append(pr.id)
+        columns["performed_at"].append(_micros(pr.performed_at))
+        columns["seqs"].append(pr.seq)
+        columns["weights"].append(pr.weight)
+        columns["exercise_ids"].append(index)
+        columns["reps"].append(pr.reps)
+
+    data = b"".join(columns[name].tobytes() for name, _ in COLUMNS)
+    footer = json.dumps({"exercises": stats}, separators=(",", ":")).encode()
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(prs), _DATA_START + len(data), len(footer))
+
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    path = path_for(user_id)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(header.ljust(_DATA_START, b"\0"))
+        f.write(data)
+        f.write(footer)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+# Open archives by user id, with the (inode, mtime) they were opened at. A
+# rewritten file has a new inode, so one stat() per lookup keeps every
+# process current without any invalidation messages.
+_open: dict[int, tuple[tuple[int, int], Archive]] = {}
+MAX_OPEN = 256
+
+def load(user_id: int) -> Archive | None:
+    try:
+        st = os.stat(path_for(user_id))
+    except FileNotFoundError:
+        _open.pop(user_id, None)
+        return None
+    stamp = (st.st_ino, st.st_mtime_ns)
+    cached = _open.get(user_id)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    archive = Archive(user_id, path_for(user_id))
+    if len(_open) >= MAX_OPEN:
+        _open.pop(next(iter(_open)))
+    _open[user_id] = (stamp, archive)
+    return archive
+
+def user_ids() -> list[int]:
+    try:
+        names = os.listdir(ARCHIVE_DIR)
+    except FileNotFoundError:
+        return []
+    return sorted(int(name[:-4]) for name in names if name.endswith(".prs") and name[:-4].isdigit())
+
+def merge(hot: list[PR], archived: list[PR]) -> list[PR]:
+    """Archived rows first (they are older), minus any that are also hot.
+
+    A row can be in both if the archive job stopped between writing the
+    file and deleting the rows; the hot copy wins.
+    """
+    hot_ids = {pr.id for pr in hot}
+    return [pr for pr in archived if pr.id not in hot_ids] + hot
+
+async def archive_user(session: AsyncSession, user_id: int, cutoff: datetime) -> int:
+    """Move the user's PRs performed before `cutoff` into their archive file.
+
+    Runs under the database's writer lock, so the rows cannot change
+    between being written out and deleted. Rollups, strength buckets and
+    change numbers are untouched: archiving moves rows without changing
+    them. Returns the number of PRs archived.
+    """
+    await session.execute(update(ChangeSequence).where(ChangeSequence.user_id == user_id).values(seq=ChangeSequence.seq))
+    # The PR table is AUTOINCREMENT, so archived ids are never handed out again.
+    result = await session.exec(select(PR).where(PR.user_id == user_id, PR.performed_at < cutoff))
+    old = list(result.all())
+    if not old:
+        await session.rollback()
+        return 0
+
+    existing = load(user_id)
+    rows = {pr.id: pr for pr in (existing.rows() if existing is not None else [])}
+    rows.update((pr.id, pr) for pr in old)
+    write(user_id, rows.values())
+    await session.execute(delete(PR).where(PR.user_id == user_id, PR.id.in_([pr.id for pr in old])))
+    await session.commit()
+    return len(old)
+
+async def reserve_ids(conn, up_to: int):
+    """Make the PR table allocate new ids above `up_to`.
+
+    For ids that live outside the table: archived PRs of a user moved in
+    from another shard, or archives written before the table was
+    AUTOINCREMENT. `conn` is a session or a connection.
+    """
+    params = {"id": up_to}
+    await conn.execute(text("UPDATE sqlite_sequence SET seq = :id WHERE name = 'pr' AND seq < :id"), params)
+    await conn.execute(text(
+        "INSERT INTO sqlite_sequence (name, seq) SELECT 'pr', :id "
+        "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'pr')"
+    ), params)
+
+async def archive_shard(
+    engine: AsyncEngine,
+    cutoff: datetime,
+    on_progress: Callable[[dict], None] | None = None,
+) -> dict:
+    """Archive every user's PRs older than `cutoff` in one shard, user by user."""
+    stats = {"users": 0, "archived": 0, "elapsed": 0.0}
+    start = time.perf_counter()
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        result = await session.exec(select(PR.user_id).where(PR.performed_at < cutoff).distinct())
+        user_ids = sorted(result.all())
+        stats["total"] = len(user_ids)
+        for user_id in user_ids:
+            stats["archived"] += await archive_user(session, user_id, cutoff)
+            stats["users"] += 1
+            stats["elapsed"] = time.perf_counter() - start
+            if on_progress:
+                on_progress(dict(stats))
+    return stats
@@ -1,12 +1,29 @@
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
 from typing import Any, Union
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+from app import cache
+
+logger = logging.getLogger(__name__)
+
+# Development fallback only; set JWT_KEYS (or JWT_SECRET) in production.
 SECRET_KEY = "SUPER_SECRET_GYM_KEY_CHANGE_ME"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 ISSUER = "gym-pr-tracker"
 AUDIENCE = "gym-pr-tracker-ui"
+# Keys are read from the environment, with JWT_ENV_FILE (the .env that
+# scripts/rotate_keys.py edits) taking precedence so a reload picks up
+# rotations without a restart.
+JWT_ENV_FILE = os.getenv("JWT_ENV_FILE", ".env")
+# Tokens without a "kid" header (issued before key ids) verify with this kid.
+LEGACY_KID = "legacy"
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
 
 pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
 
@@ -16,6 +33,102 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+_SETTINGS = ("JWT_KEYS", "JWT_ACTIVE_KID", "JWT_SECRET")
+
+def read_settings() -> dict[str, str]:
+    settings = {k: os.environ[k] for k in _SETTINGS if k in os.environ}
+    if os.path.exists(JWT_ENV_FILE):
+        # Only imported when there is a file to read; it is slow to import.
+        from dotenv import dotenv_values
+        settings.update({k: v for k, v in dotenv_values(JWT_ENV_FILE).items() if k in _SETTINGS and v is not None})
+    return settings
+
+def parse_keys(settings: dict[str, str]) -> tuple[dict[str, str], str]:
+    """({kid: secret}, active kid) from JWT_KEYS="kid:secret,..." and JWT_ACTIVE_KID.
+
+    Without JWT_KEYS the keyring is JWT_SECRET (or the development
+    SECRET_KEY) under the legacy kid. The active kid defaults to the last
+    key listed, which is where rotate_keys.py appends new ones.
+    """
+    keys = {}
+    for entry in filter(None, (e.strip() for e in settings.get("JWT_KEYS", "").split(","))):
+        kid, sep, secret = entry.partition(":")
+        if not sep or not kid or not secret:
+            raise ValueError(f"JWT_KEYS entry {kid or entry[:8]!r} is not kid:secret")
+        keys[kid] = secret
+    if not keys:
+        keys = {LEGACY_KID: settings.get("JWT_SECRET") or SECRET_KEY}
+    active = settings.get("JWT_ACTIVE_KID") or list(keys)[-1]
+    if active not in keys:
+        raise ValueError(f"JWT_ACTIVE_KID {active!r} is not in JWT_KEYS")
+    return keys, active
+
+class VerifiedTokens:
+    """Claims of tokens that already passed verification, until they expire.
+
+    Keyed by a SHA-256 digest of the token, so raw tokens are never kept.
+    A hit skips the HMAC check and claims validation; a token is only ever
+    cached with claims that were verified for that exact byte string.
+    """
+
+    def __init__(self, maxsize: int = TOKEN_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries: OrderedDict[bytes, tuple[float, dict]] = OrderedDict()
+
+    def get(self, digest: bytes) -> dict | None:
+        entry = self._entries.get(digest)
+        if entry is None:
+            return None
+        if entry[0] <= time.time():
+            del self._entries[digest]
+            return None
+        self._entries.move_to_end(digest)
+        return entry[1]
+
+    def add(self, digest: bytes, payload: dict):
+        self._entries[digest] = (payload["exp"], payload)
+        self._entries.move_to_end(digest)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+class Keyring:
+    """Signing and verification keys by kid, reloadable while running.
+
+    Registered on the cache invalidation bus as "jwt_keys": invalidating it
+    reloads the keys in every API process (see POST /admin/keys/reload).
+    """
+
+    name = "jwt_keys"
+
+    def __init__(self):
+        self.keys: dict[str, str] = {}
+        self.active_kid = LEGACY_KID
+        self.verified = VerifiedTokens()
+        self.reload()
+
+    def reload(self):
+        keys, active = parse_keys(read_settings())
+        self.keys, self.active_kid = keys, active
+        # Tokens signed with a key that was just retired must not stay valid.
+        self.verified.clear()
+        logger.info("Loaded JWT keys", extra={"kids": list(keys), "active_kid": active})
+
+    # Invalidation bus hooks (see app.cache.InvalidationBus).
+    def invalidate(self, key):
+        try:
+            self.reload()
+        except ValueError:
+            logger.exception("Invalid JWT keyring; keeping the previous keys")
+
+    def clear(self):
+        # The bus lost Redis for a while and may have missed a reload.
+        self.invalidate(None)
+
+keyring = cache.bus.register(Keyring())
+
 def create_access_token(data: dict, expires_delta: Union[timedelta, None] = None) -> str:
     to_encode = data.copy()
     if expires_delta:
@@ -27,18 +140,29 @@ def create_access_token(data: dict, expires_delta: Union[timedelta, None] = None
         "iss": ISSUER,
         "aud": AUDIENCE
     })
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    kid = keyring.active_kid
+    encoded_jwt = jwt.encode(to_encode, keyring.keys[kid], algorithm=ALGORITHM, headers={"kid": kid})
     return encoded_jwt
 
 def decode_access_token(token: str) -> Union[dict, None]:
+    digest = hashlib.sha256(token.encode()).digest()
+    payload = keyring.verified.get(digest)
+    if payload is not None:
+        return payload
     try:
+        kid = jwt.get_unverified_header(token).get("kid", LEGACY_KID)
+        # Unverified input: a list or object here would not even hash.
+        key = keyring.keys.get(kid) if isinstance(kid, str) else None
+        if key is None:
+            return None
         payload = jwt.decode(
             token, 
-            SECRET_KEY, 
+            key, 
             algorithms=[ALGORITHM],
             audience=AUDIENCE,
             issuer=ISSUER
         )
-        return payload
     except JWTError:
         return None
+    keyring.verified.add(digest, payload)
+    return payload
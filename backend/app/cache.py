@@ -0,0 +1,229 @@
+import asyncio
+import json
+import logging
+import os
+import struct
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from app import redis_client
+from app.models import PR, MilestoneRead
+
+logger = logging.getLogger(__name__)
+
+# CACHE_ENABLED=false turns the Redis read-through cache off entirely.
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() == "true"
+CACHE_TTL = int(os.getenv("CACHE_TTL", "300"))
+# Views larger than this (compressed) are served but never stored.
+CACHE_MAX_ENTRY_BYTES = int(os.getenv("CACHE_MAX_ENTRY_BYTES", str(256 * 1024)))
+
+class LocalCache:
+    """Bounded in-process TTL cache.
+
+    Every invalidation bumps a cache-wide generation, so a value computed
+    while a write was in flight is dropped instead of being cached stale;
+    that includes loads of keys that were not cached when clear() ran. A
+    load racing an unrelated invalidation is dropped too, which only costs
+    a miss, and there is no per-key state to grow.
+    """
+
+    def __init__(self, name: str, maxsize: int = 1024, ttl: float = 60.0):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._generation = 0
+
+    def get(self, key: Hashable) -> Any | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def version(self, key: Hashable) -> int:
+        return self._generation
+
+    def set(self, key: Hashable, value: Any, version: int | None = None):
+        if version is not None and version != self.version(key):
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        self._entries.pop(key, None)
+        self._generation += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._generation += 1
+
+class InvalidationBus:
+    """Fans cache invalidations out to every API process over Redis pub/sub.
+
+    Without Redis it only invalidates locally, which is correct for a single
+    worker. Pub/sub is fire-and-forget, so cache TTLs stay as a backstop.
+    """
+
+    CHANNEL = "gym-pr-tracker:cache-invalidate"
+
+    def __init__(self):
+        self.origin = uuid.uuid4().hex
+        self._caches: dict[str, LocalCache] = {}
+        self._redis: Redis | None = None
+        self._listener: asyncio.Task | None = None
+
+    def register(self, cache: LocalCache) -> LocalCache:
+        self._caches[cache.name] = cache
+        return cache
+
+    async def start(self, redis: Redis | None):
+        if redis is None:
+            return
+        self._redis = redis
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+        self._listener = None
+        self._redis = None
+
+    async def invalidate(self, cache_name: str, key: Hashable):
+        await self.invalidate_many(cache_name, [key])
+
+    async def invalidate_many(self, cache_name: str, keys: list[Hashable]):
+        self._apply(cache_name, keys)
+        if self._redis is None:
+            return
+        message = json.dumps({"origin": self.origin, "cache": cache_name, "keys": keys})
+        try:
+            await self._redis.publish(self.CHANNEL, message)
+        except RedisError as e:
+            logger.warning(f"Could not publish cache invalidation: {e}")
+
+    def _apply(self, cache_name: str, keys: list[Hashable]):
+        cache = self._caches.get(cache_name)
+        if cache is not None:
+            for key in keys:
+                cache.invalidate(key)
+
+    async def _listen(self):
+        while True:
+            pubsub = self._redis.pubsub()
+            try:
+                await pubsub.subscribe(self.CHANNEL)
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    try:
+                        event = json.loads(message["data"])
+                        if event["origin"] != self.origin:
+                            self._apply(event["cache"], event["keys"])
+                    except (ValueError, KeyError, TypeError) as e:
+                        # Anyone can publish on the channel; one bad message
+                        # must not end the listener.
+                        logger.warning(f"Ignoring malformed cache invalidation: {e}")
+            except (RedisError, OSError) as e:
+                # Invalidations may have been missed while disconnected.
+                logger.warning(f"Cache invalidation listener lost Redis, resubscribing: {e}")
+                for cache in self._caches.values():
+                    cache.clear()
+                await asyncio.sleep(1.0)
+            finally:
+                await pubsub.aclose()
+
+class ReadThroughCache:
+    """Per-user views in Redis, tagged with the user's data version.
+
+    Every PR write INCRs the user's version key. An entry stores the version
+    it was computed at, so a single MGET of (version, entry) tells whether
+    it is current; stale entries are simply overwritten. Payloads are
+    zlib-compressed JSON behind an 8-byte version header. Version keys have
+    no TTL and must never be evicted, or a restarted counter could match an
+    old entry again: run Redis with a volatile-* maxmemory policy.
+    """
+
+    VERSION_KEY = "gym-pr-tracker:ver:{user_id}"
+
+    def __init__(self, name: str, dump: Callable[[Any], bytes], load: Callable[[bytes], Any]):
+        self.name = name
+        self._dump = dump
+        self._load = load
+
+    def _key(self, user_id: int) -> str:
+        return f"gym-pr-tracker:{self.name}:{user_id}"
+
+    async def get_or_load(self, user_id: int, loader: Callable[[], Awaitable[Any]]) -> Any:
+        redis = redis_client.get_redis()
+        if not CACHE_ENABLED or redis is None:
+            return await loader()
+
+        try:
+            version_raw, blob = await redis.mget(self.VERSION_KEY.format(user_id=user_id), self._key(user_id))
+        except RedisError as e:
+            logger.warning(f"Cache read failed, loading from database: {e}")
+            return await loader()
+        version = int(version_raw or 0)
+        if blob is not None and struct.unpack(">Q", blob[:8])[0] == version:
+            return self._load(zlib.decompress(blob[8:]))
+
+        value = await loader()
+        blob = struct.pack(">Q", version) + zlib.compress(self._dump(value), 1)
+        if len(blob) <= CACHE_MAX_ENTRY_BYTES:
+            try:
+                await redis.set(self._key(user_id), blob, ex=CACHE_TTL)
+            except RedisError as e:
+                logger.warning(f"Cache write failed: {e}")
+        return value
+
+async def invalidate_user_views(user_ids: list[int]):
+    """Expire every cached view of these users' PR data, in all processes."""
+    await bus.invalidate_many("milestones", user_ids)
+    await bus.invalidate_many("exercise_history", user_ids)
+    redis = redis_client.get_redis()
+    if not CACHE_ENABLED or redis is None:
+        return
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                pipe.incr(ReadThroughCache.VERSION_KEY.format(user_id=user_id))
+            await pipe.execute()
+    except RedisError as e:
+        # Entries then go stale until CACHE_TTL expires them.
+        logger.warning(f"Could not bump cache versions: {e}")
+
+bus = InvalidationBus()
+
+# Per-process caches. Keys: username for users, user id for the others.
+users = bus.register(LocalCache("users", maxsize=4096, ttl=300))
+milestones = bus.register(LocalCache("milestones", maxsize=4096, ttl=60))
+exercise_history = bus.register(LocalCache("exercise_history", maxsize=4096, ttl=300))
+# Population-wide strength sketches by exercise. Every PR write nudges them,
+# so they are refreshed on a short TTL rather than invalidated per write.
+strength_sketches = bus.register(LocalCache("strength", maxsize=1024, ttl=30))
+
+def _dump_models(values: list) -> bytes:
+    return json.dumps([v.model_dump(mode="json") for v in values], separators=(",", ":")).encode()
+
+# Shared Redis caches, keyed by user id (see ReadThroughCache).
+pr_lists = ReadThroughCache(
+    "prs", _dump_models, lambda raw: [PR.model_validate(d) for d in json.loads(raw)]
+)
+milestone_views = ReadThroughCache(
+    "milestones", _dump_models, lambda raw: [MilestoneRead.model_validate(d) for d in json.loads(raw)]
+)
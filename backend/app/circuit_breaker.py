@@ -0,0 +1,99 @@
+import time
+from collections import deque
+from typing import Callable
+
+class CircuitBreaker:
+    """Stops calling an upstream that keeps failing or timing out.
+
+    Closed: calls go through, and each outcome is kept for `window`
+    seconds. A call counts as failed if it errored or took longer than
+    `slow_call` seconds. Once at least `min_calls` were seen and the failed
+    share reaches `failure_rate`, the circuit opens.
+    Open: allow() is False, so callers fall back immediately, for
+    `cooldown` seconds.
+    Half-open: one probe call is let through; success closes the circuit,
+    failure opens it for another cooldown. A probe that never reports back
+    (e.g. its request was cancelled) is replaced after a cooldown.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float = 0.5,
+        slow_call: float = 10.0,
+        window: float = 60.0,
+        min_calls: int = 5,
+        cooldown: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.slow_call = slow_call
+        self.window = window
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self._clock = clock
+        self._calls: deque[tuple[float, bool]] = deque()
+        self._opened_at: float | None = None
+        self._probe_started: float | None = None
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if self._clock() - self._opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open":
+            now = self._clock()
+            if self._probe_started is None or now - self._probe_started >= self.cooldown:
+                self._probe_started = now
+                return True
+        self.rejected += 1
+        return False
+
+    def record(self, success: bool, duration: float = 0.0):
+        failed = not success or duration > self.slow_call
+        now = self._clock()
+
+        if self._opened_at is not None:
+            if self._probe_started is None:
+                return  # a call that started before the circuit opened
+            # Outcome of the half-open probe.
+            self._probe_started = None
+            if failed:
+                self._opened_at = now
+            else:
+                self._opened_at = None
+                self._calls.clear()
+            return
+
+        self._calls.append((now, failed))
+        while self._calls and self._calls[0][0] < now - self.window:
+            self._calls.popleft()
+        failures = sum(1 for _, f in self._calls if f)
+        if len(self._calls) >= self.min_calls and failures / len(self._calls) >= self.failure_rate:
+            self._opened_at = now
+            self._calls.clear()
+
+    def stats(self) -> dict:
+        recent = [f for t, f in self._calls if t >= self._clock() - self.window]
+        return {
+            "state": self.state,
+            "calls": len(recent),
+            "failures": sum(recent),
+            "rejected": self.rejected,
+        }
+
+# Every breaker in the process, by name, for /admin/metrics.
+breakers: dict[str, CircuitBreaker] = {}
+
+def register(breaker: CircuitBreaker) -> CircuitBreaker:
+    breakers[breaker.name] = breaker
+    return breaker
@@ -1,15 +1,118 @@
+import os
+from sqlalchemy import event
 from sqlmodel import SQLModel, create_engine
 from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from app import models  # noqa: F401  (registers tables on SQLModel.metadata)
+from app.models import PR
+from app.rollups import rebuild_statements
+from app import archive, percentiles
 
 DATABASE_URL = "sqlite+aiosqlite:///./gym_tracker.db"
+# Extra databases for per-user data (PRs, milestones, rollups, sync state),
+# comma separated. The main database is shard 0; it also holds the user
+# table, whose `shard` column says where each user's data lives.
+SHARD_URLS = [url.strip() for url in os.getenv("SHARD_URLS", "").split(",") if url.strip()]
 
-engine = create_async_engine(DATABASE_URL, echo=False, future=True)
+# Bump this whenever the table definitions in app/models.py change.
+SCHEMA_VERSION = 7
 
-async def init_db():
+# Steps that bring an existing database up to each version. create_all only
+# adds missing tables, so new indexes/columns on existing tables and data
+# backfills go here. Steps must be idempotent: a fresh or pre-versioning
+# database (user_version 0) runs all of them after create_all.
+def add_column(table: str, column: str, ddl: str):
+    async def step(conn):
+        result = await conn.exec_driver_sql(f"PRAGMA table_info({table})")
+        if column not in {row[1] for row in result.all()}:
+            await conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+    return step
+
+async def autoincrement_pr_ids(conn):
+    """Rebuild the PR table as AUTOINCREMENT, so no id is ever reused.
+
+    Plain rowid tables hand out max(id) + 1, which falls back into the range
+    of deleted or archived PRs once the newest row is gone.
+    """
+    result = await conn.exec_driver_sql("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'pr'")
+    if "AUTOINCREMENT" not in result.scalar().upper():
+        columns = ", ".join(column.name for column in PR.__table__.columns)
+        await conn.exec_driver_sql("ALTER TABLE pr RENAME TO pr_old")
+        for index in PR.__table__.indexes:
+            await conn.exec_driver_sql(f"DROP INDEX IF EXISTS {index.name}")
+        await conn.run_sync(PR.__table__.create)
+        await conn.exec_driver_sql(f"INSERT INTO pr ({columns}) SELECT {columns} FROM pr_old")
+        await conn.exec_driver_sql("DROP TABLE pr_old")
+    # Ids archived before this version may be above every remaining row.
+    await archive.reserve_ids(conn, max((archive.load(uid).max_id for uid in archive.user_ids()), default=0))
+
+MIGRATIONS = {
+    2: [
+        "CREATE INDEX IF NOT EXISTS ix_pr_user_id_performed_at ON pr (user_id, performed_at)",
+        *rebuild_statements(),
+    ],
+    3: [
+        add_column("pr", "seq", "INTEGER NOT NULL DEFAULT 0"),
+        "CREATE INDEX IF NOT EXISTS ix_pr_user_id_seq ON pr (user_id, seq)",
+    ],
+    4: [percentiles.rebuild],
+    5: [
+        add_column("user", "shard", "INTEGER NOT NULL DEFAULT 0"),
+        "CREATE INDEX IF NOT EXISTS ix_user_shard ON user (shard)",
+    ],
+    6: [autoincrement_pr_ids],
+    # Strength buckets keyed with SQLite's lower(trim()) before exercise_key().
+    7: [percentiles.rebuild],
+}
+
+def make_engine(url: str) -> AsyncEngine:
+    """An engine whose connections know the app's SQL functions."""
+    new_engine = create_async_engine(url, echo=False, future=True)
+
+    @event.listens_for(new_engine.sync_engine, "connect")
+    def register_functions(dbapi_connection, _):
+        dbapi_connection.create_function("exercise_key", 1, percentiles.normalize_exercise, deterministic=True)
+
+    return new_engine
+
+engine = make_engine(DATABASE_URL)
+# Every shard carries the full schema, so one set of migrations serves all.
+engines = [engine, *(make_engine(url) for url in SHARD_URLS)]
+
+async def get_schema_version(engine: AsyncEngine = engine) -> int:
+    # SQLite keeps a free integer slot in the file header for exactly this.
+    async with engine.connect() as conn:
+        result = await conn.exec_driver_sql("PRAGMA user_version")
+        return result.scalar() or 0
+
+async def migrate(engine: AsyncEngine = engine):
+    current = await get_schema_version(engine)
     async with engine.begin() as conn:
         await conn.run_sync(SQLModel.metadata.create_all)
+        for version in range(current + 1, SCHEMA_VERSION + 1):
+            for step in MIGRATIONS.get(version, []):
+                if isinstance(step, str):
+                    await conn.exec_driver_sql(step)
+                elif callable(step):
+                    await step(conn)
+                else:
+                    await conn.execute(step)
+        await conn.exec_driver_sql(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+async def init_db():
+    """Bring the schema up to date, skipping all DDL when it already is.
+
+    Set AUTO_MIGRATE=false to make API replicas refuse to start on an old
+    schema instead of migrating it themselves (run scripts/migrate.py first).
+    """
+    stale = [e for e in engines if await get_schema_version(e) < SCHEMA_VERSION]
+    if not stale:
+        return
+    if os.getenv("AUTO_MIGRATE", "true").lower() != "true":
+        raise RuntimeError("Database schema is out of date. Run scripts/migrate.py first.")
+    for e in stale:
+        await migrate(e)
 
 async def get_session() -> AsyncSession:
     async_session = sessionmaker(
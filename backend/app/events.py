@@ -0,0 +1,110 @@
+import asyncio
+import json
+import logging
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+# Events buffered per open stream. A client that falls further behind gets a
+# single "resync" event and should refetch via GET /prs/changes.
+QUEUE_SIZE = 100
+
+class InProcessBroker:
+    """Delivers per-user events to the /events streams open in this process."""
+
+    def __init__(self):
+        self._subscribers: dict[int, set[asyncio.Queue]] = {}
+
+    def subscribe(self, user_id: int) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self._subscribers.setdefault(user_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: int, queue: asyncio.Queue):
+        queues = self._subscribers.get(user_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[user_id]
+
+    async def publish(self, user_id: int, events: list[dict]):
+        self._deliver(user_id, events)
+
+    def _deliver(self, user_id: int, events: list[dict]):
+        for queue in self._subscribers.get(user_id, ()):
+            for event in events:
+                try:
+                    queue.put_nowait(event)
+                except asyncio.QueueFull:
+                    while not queue.empty():
+                        queue.get_nowait()
+                    queue.put_nowait({"type": "resync"})
+                    break
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+class RedisBroker(InProcessBroker):
+    """Same interface, but fans events out to every API process via Redis."""
+
+    CHANNEL = "gym-pr-tracker:events"
+
+    def __init__(self, redis: Redis):
+        super().__init__()
+        self.redis = redis
+        self._listener: asyncio.Task | None = None
+
+    async def publish(self, user_id: int, events: list[dict]):
+        message = json.dumps({"user_id": user_id, "events": events}, default=str)
+        try:
+            await self.redis.publish(self.CHANNEL, message)
+        except RedisError as e:
+            # Still reach this process's streams; others catch up on resync.
+            logger.warning(f"Could not publish events, delivering locally only: {e}")
+            self._deliver(user_id, events)
+
+    async def start(self):
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+        self._listener = None
+
+    async def _listen(self):
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(self.CHANNEL)
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    payload = json.loads(message["data"])
+                    self._deliver(payload["user_id"], payload["events"])
+            except (RedisError, OSError) as e:
+                logger.warning(f"Event listener lost Redis, resubscribing: {e}")
+                for user_id in list(self._subscribers):
+                    self._deliver(user_id, [{"type": "resync"}])
+                await asyncio.sleep(1.0)
+            finally:
+                await pubsub.aclose()
+
+broker: InProcessBroker = InProcessBroker()
+
+async def start(redis: Redis | None):
+    """Pick the broker for this process: Redis when available, else in-process."""
+    global broker
+    broker = RedisBroker(redis) if redis is not None else InProcessBroker()
+    await broker.start()
+
+async def stop():
+    await broker.stop()
@@ -0,0 +1,88 @@
+from bisect import bisect_left
+from collections import Counter
+from typing import Iterable
+from sqlmodel import select, func
+from app.models import PR
+from app import archive, cache
+
+# Canonical spellings suggested after the user's own history. Offering these
+# keeps names consistent across users, which is what per-exercise milestones,
+# rollups and percentiles group on.
+CATALOG = [
+    "Squat", "Front Squat", "Bench Press", "Incline Bench Press", "Close Grip Bench Press",
+    "Deadlift", "Romanian Deadlift", "Sumo Deadlift", "Overhead Press", "Push Press",
+    "Pull Up", "Chin Up", "Barbell Row", "Pendlay Row", "Dips", "Leg Press",
+    "Hip Thrust", "Lunge", "Bulgarian Split Squat", "Bicep Curl", "Tricep Extension",
+    "Lat Pulldown", "Seated Cable Row", "Lateral Raise", "Calf Raise",
+]
+
+def normalize(name: str) -> str:
+    return " ".join(name.lower().split())
+
+class PrefixIndex:
+    """Exercise names searchable by prefix with two bisects over a sorted list.
+
+    Every word start is indexed, so "press" finds "Bench Press" as well as
+    "Press"; matches at the start of the name rank first, then by weight.
+    """
+
+    def __init__(self, names: Iterable[tuple[str, int]]):
+        entries = []
+        for name, weight in names:
+            words = normalize(name).split()
+            for start in range(len(words)):
+                entries.append((" ".join(words[start:]), start > 0, -weight, name))
+        entries.sort()
+        self._keys = [entry[0] for entry in entries]
+        self._entries = entries
+
+    def search(self, prefix: str, limit: int) -> list[str]:
+        prefix = normalize(prefix)
+        lo = bisect_left(self._keys, prefix)
+        hi = bisect_left(self._keys, prefix + "\uffff", lo)
+        ranked = sorted(self._entries[lo:hi], key=lambda e: (e[1], e[2], e[3]))
+        result, seen = [], set()
+        for _, _, _, name in ranked:
+            if name not in seen:
+                seen.add(name)
+                result.append(name)
+                if len(result) == limit:
+                    break
+        return result
+
+catalog_index = PrefixIndex((name, 0) for name in CATALOG)
+
+async def _history_index(session, user_id: int) -> PrefixIndex:
+    index = cache.exercise_history.get(user_id)
+    if index is not None:
+        return index
+    version = cache.exercise_history.version(user_id)
+    result = await session.execute(
+        select(PR.exercise, func.count(PR.id)).where(PR.user_id == user_id).group_by(PR.exercise)
+    )
+    counts = Counter(dict(result.all()))
+    cold = archive.load(user_id)
+    if cold is not None:
+        counts.update({stats.name: stats.count for stats in cold.exercises})
+    # Collapse spellings that differ only in case/spacing to the most used one.
+    spellings: dict[str, tuple[int, str, int]] = {}
+    for name, count in counts.items():
+        key = normalize(name)
+        best_count, best_name, total = spellings.get(key, (0, name, 0))
+        if count > best_count:
+            best_count, best_name = count, name
+        spellings[key] = (best_count, best_name, total + count)
+    index = PrefixIndex((name, total) for _, name, total in spellings.values())
+    cache.exercise_history.set(user_id, index, version=version)
+    return index
+
+async def suggest(session, user_id: int, q: str, limit: int = 10) -> list[str]:
+    """The user's own exercises (most logged first), then catalog names."""
+    history = (await _history_index(session, user_id)).search(q, limit)
+    seen = {normalize(name) for name in history}
+    for name in catalog_index.search(q, limit):
+        if len(history) == limit:
+            break
+        if normalize(name) not in seen:
+            history.append(name)
+    return history
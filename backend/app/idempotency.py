@@ -0,0 +1,132 @@
+import hashlib
+import hmac
+import json
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from redis.exceptions import RedisError
+from app import redis_client
+
+logger = logging.getLogger(__name__)
+
+# How long a completed response is replayed, and how long an in-flight
+# request holds its key before another attempt may take over.
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", str(24 * 60 * 60)))
+IDEMPOTENCY_PENDING_TTL = int(os.getenv("IDEMPOTENCY_PENDING_TTL", "60"))
+# Keys the request fingerprints, which may cover secrets such as passwords:
+# a plain hash in a shared store could be cracked offline. Development
+# fallback only; set IDEMPOTENCY_SECRET in production.
+IDEMPOTENCY_SECRET = os.getenv("IDEMPOTENCY_SECRET", "GYM_IDEMPOTENCY_KEY_CHANGE_ME")
+
+class _LocalStore:
+    """Single-process fallback with the same SET NX EX semantics as Redis."""
+
+    def __init__(self):
+        self._entries: dict[str, tuple[float, str]] = {}
+
+    def _live(self, key: str) -> str | None:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self._entries.pop(key, None)
+            return None
+        return entry[1]
+
+    async def set(self, key: str, value: str, ex: int, nx: bool = False) -> bool:
+        if nx and self._live(key) is not None:
+            return False
+        if len(self._entries) > 10_000:
+            now = time.monotonic()
+            self._entries = {k: v for k, v in self._entries.items() if v[0] >= now}
+        self._entries[key] = (time.monotonic() + ex, value)
+        return True
+
+    async def get(self, key: str) -> str | None:
+        return self._live(key)
+
+    async def delete(self, key: str):
+        self._entries.pop(key, None)
+
+_local_store = _LocalStore()
+
+def _store():
+    return redis_client.get_redis() or _local_store
+
+def _fingerprint(payload: Any) -> str:
+    body = json.dumps(jsonable_encoder(payload), sort_keys=True, separators=(",", ":"))
+    return hmac.new(IDEMPOTENCY_SECRET.encode(), body.encode(), hashlib.sha256).hexdigest()
+
+async def run_idempotent(
+    key: str | None,
+    scope: str,
+    payload: Any,
+    handler: Callable[[], Awaitable[Any]],
+    status_code: int = 200,
+    replay: Callable[[], Any] | None = None,
+):
+    """Run `handler` at most once per (scope, Idempotency-Key).
+
+    Without a key the handler just runs. With one, the first request stores
+    its response and retries get it back (with Idempotent-Replayed: true)
+    without running the handler. Reusing a key with a different payload is
+    rejected; a retry that races the original gets 409. Failed requests
+    release the key so the client can try again.
+
+    Responses carrying credentials must not sit in the store: pass `replay`
+    and only the status is stored, retries getting `replay()` instead.
+    """
+    if key is None:
+        return await handler()
+
+    store = _store()
+    storage_key = f"gym-pr-tracker:idem:{scope}:{hashlib.sha256(key.encode()).hexdigest()}"
+    fingerprint = _fingerprint(payload)
+    pending = json.dumps({"state": "pending", "fingerprint": fingerprint})
+
+    try:
+        acquired = await store.set(storage_key, pending, ex=IDEMPOTENCY_PENDING_TTL, nx=True)
+    except RedisError as e:
+        logger.warning(f"Idempotency store unavailable, running request unguarded: {e}")
+        return await handler()
+
+    if not acquired:
+        try:
+            raw = await store.get(storage_key)
+        except RedisError as e:
+            logger.warning(f"Idempotency store unavailable, running request unguarded: {e}")
+            return await handler()
+        if raw is None:
+            raise HTTPException(status_code=409, detail="Request with this Idempotency-Key is being retried", headers={"Retry-After": "1"})
+        record = json.loads(raw)
+        if record["fingerprint"] != fingerprint:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+        if record["state"] == "pending":
+            raise HTTPException(status_code=409, detail="Request with this Idempotency-Key is still in progress", headers={"Retry-After": "1"})
+        return JSONResponse(
+            status_code=record["status"],
+            content=record["body"] if replay is None else jsonable_encoder(replay()),
+            headers={"Idempotent-Replayed": "true"},
+        )
+
+    try:
+        result = await handler()
+    except Exception:
+        try:
+            await store.delete(storage_key)
+        except RedisError as e:
+            # The key expires after IDEMPOTENCY_PENDING_TTL anyway; report
+            # the handler's error, not this one.
+            logger.warning(f"Could not release idempotency key: {e}")
+        raise
+
+    body = jsonable_encoder(result)
+    stored = body if replay is None else None
+    done = json.dumps({"state": "done", "fingerprint": fingerprint, "status": status_code, "body": stored})
+    try:
+        await store.set(storage_key, done, ex=IDEMPOTENCY_TTL)
+    except RedisError as e:
+        logger.warning(f"Could not store idempotent response: {e}")
+    return JSONResponse(status_code=status_code, content=body)
@@ -1,21 +1,47 @@
-from datetime import datetime, timedelta
+from datetime import date, datetime
+from typing import Literal, Optional
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, HTTPException, status, Depends
+import asyncio
+import json
+import signal
+from fastapi import FastAPI, HTTPException, Header, Query, Response, status, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlmodel.ext.asyncio.session import AsyncSession
-from app.models import PR, PRCreate, PRUpdate, Milestone, MilestoneRead, User, UserCreate, Token
+from app.models import PR, PRChanges, PRCreate, PRUpdate, PRBatchRequest, PRBatchResult, Milestone, MilestoneRead, PercentileRead, User, UserCreate, Token, VolumeRead, WorkoutPlan, WorkoutRequest
 from app.db import init_db, get_session
-from .repository import PRRepository, UserRepository
-from .auth import get_password_hash, verify_password, create_access_token, decode_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
-from fastapi.responses import RedirectResponse
+from app.idempotency import run_idempotent
+from app import cache, circuit_breaker, events, exercises, percentiles, rate_limit, redis_client, shards, write_pipeline
+from app.profiler import ProfilingMiddleware, profiler
+from app.logging_config import setup_logging
+from app.middleware import ConcurrencyLimitMiddleware, RequestContextMiddleware, LOAD_SHEDDING, limiters
+from .repository import PRRepository, UserRepository, PRArchivedError, PRNotFoundError
+from .auth import get_password_hash, verify_password, create_access_token, decode_access_token, keyring, parse_keys, read_settings, ACCESS_TOKEN_EXPIRE_MINUTES
+from fastapi.responses import PlainTextResponse, RedirectResponse, StreamingResponse
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    log_listener = setup_logging()
     await init_db()
+    redis = await redis_client.connect()
+    await cache.bus.start(redis)
+    await events.start(redis)
+    await write_pipeline.start()
+    # `kill -HUP` reloads the JWT keyring of this process (see also
+    # POST /admin/keys/reload, which reaches every process).
+    loop = asyncio.get_running_loop()
+    if hasattr(signal, "SIGHUP"):
+        loop.add_signal_handler(signal.SIGHUP, keyring.invalidate, None)
     yield
+    if hasattr(signal, "SIGHUP"):
+        loop.remove_signal_handler(signal.SIGHUP)
+    await write_pipeline.stop()
+    await events.stop()
+    await cache.bus.stop()
+    await redis_client.close()
+    log_listener.stop()
 
 # Initialize App
 app = FastAPI(
@@ -25,6 +51,20 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
+# Sampling profiler (PROFILING=true). Innermost, so profiles only cover
+# time spent in the app itself; when disabled it is not installed at all.
+if profiler is not None:
+    app.add_middleware(ProfilingMiddleware, profiler=profiler)
+
+# Per route class concurrency limits; innermost, so shed requests still get
+# a request id and CORS headers. LOAD_SHEDDING=false turns it off.
+if LOAD_SHEDDING:
+    app.add_middleware(ConcurrencyLimitMiddleware)
+
+# Request ids and error logging. Added before CORS so that CORS stays the
+# outer layer and error responses still carry CORS headers.
+app.add_middleware(RequestContextMiddleware)
+
 # CORS Configuration
 app.add_middleware(
     CORSMiddleware,
@@ -32,6 +72,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[
+        "Idempotent-Replayed", "Retry-After", "X-Request-ID",
+        "RateLimit-Limit", "RateLimit-Remaining", "RateLimit-Reset",
+    ],
 )
 
 # Auth Dependencies
@@ -52,12 +96,30 @@ async def get_current_user(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
         )
+    cached = cache.users.get(username)
+    if cached is not None:
+        return User(**cached)
+    version = cache.users.version(username)
     user_repo = UserRepository(session)
     user = await user_repo.get_by_username(username)
     if user is None:
         raise HTTPException(status_code=404, detail="User not found")
+    cache.users.set(username, user.model_dump(), version=version)
     return user
 
+async def get_user_session(
+    current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session)
+):
+    """Session on the database holding the current user's PRs and milestones."""
+    if current_user.shard == 0:
+        yield session
+        return
+    # Users are looked up on the main database; don't hold its connection too.
+    await session.close()
+    async with shards.session(current_user.shard) as shard_session:
+        yield shard_session
+
 async def get_admin_user(current_user: User = Depends(get_current_user)) -> User:
     if current_user.role != "admin":
         raise HTTPException(
@@ -66,20 +128,47 @@ async def get_admin_user(current_user: User = Depends(get_current_user)) -> User
         )
     return current_user
 
+def rate_limited(name: str):
+    """Dependency spending one of the caller's tokens for route class `name`."""
+    async def check(response: Response, current_user: User = Depends(get_current_user)):
+        if not rate_limit.RATE_LIMITING:
+            return
+        decision = await rate_limit.take(name, current_user.id)
+        if not decision.allowed:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Rate limit exceeded, try again later",
+                headers=decision.headers(),
+            )
+        response.headers.update(decision.headers())
+    return Depends(check)
+
 # Auth Endpoints
 @app.post("/auth/register", response_model=Token)
-async def register(user_data: UserCreate, session: AsyncSession = Depends(get_session)):
-    repo = UserRepository(session)
-    existing = await repo.get_by_username(user_data.username)
-    if existing:
-        raise HTTPException(status_code=400, detail="Username already registered")
-    
-    hashed = get_password_hash(user_data.password)
-    user = User(username=user_data.username, hashed_password=hashed)
-    await repo.create(user)
-    
-    access_token = create_access_token(data={"sub": user.username})
-    return {"access_token": access_token, "token_type": "bearer"}
+async def register(
+    user_data: UserCreate,
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+    session: AsyncSession = Depends(get_session)
+):
+    def issue_token():
+        access_token = create_access_token(data={"sub": user_data.username})
+        return {"access_token": access_token, "token_type": "bearer"}
+
+    async def handler():
+        repo = UserRepository(session)
+        existing = await repo.get_by_username(user_data.username)
+        if existing:
+            raise HTTPException(status_code=400, detail="Username already registered")
+
+        hashed = get_password_hash(user_data.password)
+        user = User(username=user_data.username, hashed_password=hashed)
+        await repo.create(user)
+
+        return issue_token()
+
+    # Retries get a fresh token for the user created the first time, rather
+    # than a stored copy of the original one.
+    return await run_idempotent(idempotency_key, "register", user_data, handler, replay=issue_token)
 
 @app.post("/auth/token", response_model=Token)
 async def login(form_data: OAuth2PasswordRequestForm = Depends(), session: AsyncSession = Depends(get_session)):
@@ -97,16 +186,46 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), session: Async
 # PR Endpoints
 @app.get("/prs", response_model=list[PR])
 async def get_all_prs(
-    session: AsyncSession = Depends(get_session),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    session: AsyncSession = Depends(get_user_session),
+    current_user: User = Depends(get_current_user)
+):
+    repo = PRRepository(session, current_user.id)
+    return await repo.list_all(since=since, until=until)
+
+@app.get("/prs/changes", response_model=PRChanges)
+async def get_pr_changes(
+    since: int = 0,
+    session: AsyncSession = Depends(get_user_session),
+    current_user: User = Depends(get_current_user)
+):
+    repo = PRRepository(session, current_user.id)
+    return await repo.get_changes(since)
+
+@app.post("/prs/batch", response_model=list[PRBatchResult])
+async def batch_prs(
+    batch: PRBatchRequest,
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+    session: AsyncSession = Depends(get_user_session),
     current_user: User = Depends(get_current_user)
 ):
     repo = PRRepository(session, current_user.id)
-    return await repo.list_all()
+
+    async def handler():
+        try:
+            return await repo.apply_batch(batch.operations)
+        except PRNotFoundError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        except PRArchivedError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+
+    return await run_idempotent(idempotency_key, f"user:{current_user.id}:batch", batch, handler)
 
 @app.get("/prs/{pr_id}", response_model=PR)
 async def get_pr(
     pr_id: int, 
-    session: AsyncSession = Depends(get_session),
+    session: AsyncSession = Depends(get_user_session),
     current_user: User = Depends(get_current_user)
 ):
     repo = PRRepository(session, current_user.id)
@@ -118,29 +237,45 @@ async def get_pr(
 @app.post("/prs", response_model=PR, status_code=status.HTTP_201_CREATED)
 async def create_pr(
     pr_data: PRCreate, 
-    session: AsyncSession = Depends(get_session),
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+    session: AsyncSession = Depends(get_user_session),
     current_user: User = Depends(get_current_user)
 ):
-    try:
-        repo = PRRepository(session, current_user.id)
-        return await repo.create(pr_data)
-    except Exception as e:
-        import traceback
-        error_details = traceback.format_exc()
-        with open("error_log.txt", "a") as f:
-            f.write(f"\n--- {datetime.now()} ---\n")
-            f.write(error_details)
-        raise HTTPException(status_code=500, detail=f"Backend Error: {str(e)}")
+    committer = write_pipeline.committer
+    if committer is not None:
+        # Committed together with other writes arriving in the same window.
+        # Hand our pooled connection back first: the committer needs one, and
+        # waiting requests must not hold them all.
+        await session.close()
+
+        async def handler():
+            try:
+                return await committer.submit(current_user.id, pr_data, shard=current_user.shard)
+            except write_pipeline.CommitterClosed:
+                # Shutting down: the session takes a new connection.
+                return await PRRepository(session, current_user.id).create(pr_data)
+    else:
+        handler = lambda: PRRepository(session, current_user.id).create(pr_data)
+    return await run_idempotent(
+        idempotency_key,
+        f"user:{current_user.id}:create_pr",
+        pr_data,
+        handler,
+        status_code=status.HTTP_201_CREATED,
+    )
 
 @app.put("/prs/{pr_id}", response_model=PR)
 async def update_pr(
     pr_id: int, 
     pr_update: PRUpdate, 
-    session: AsyncSession = Depends(get_session),
+    session: AsyncSession = Depends(get_user_session),
     current_user: User = Depends(get_current_user)
 ):
     repo = PRRepository(session, current_user.id)
-    updated_pr = await repo.update(pr_id, pr_update)
+    try:
+        updated_pr = await repo.update(pr_id, pr_update)
+    except PRArchivedError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     if not updated_pr:
         raise HTTPException(status_code=404, detail="PR not found")
     return updated_pr
@@ -148,31 +283,105 @@ async def update_pr(
 @app.delete("/prs/{pr_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_pr(
     pr_id: int, 
-    session: AsyncSession = Depends(get_session),
+    session: AsyncSession = Depends(get_user_session),
     current_user: User = Depends(get_current_user)
 ):
     repo = PRRepository(session, current_user.id)
-    success = await repo.delete(pr_id)
+    try:
+        success = await repo.delete(pr_id)
+    except PRArchivedError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     if not success:
         raise HTTPException(status_code=404, detail="PR not found")
     return None
 
-@app.get("/milestones", response_model=list[MilestoneRead])
+@app.get("/milestones", response_model=list[MilestoneRead], dependencies=[rate_limited("milestones")])
 async def get_milestones(
-    session: AsyncSession = Depends(get_session),
+    session: AsyncSession = Depends(get_user_session),
     current_user: User = Depends(get_current_user)
 ):
     repo = PRRepository(session, current_user.id)
     return await repo.get_milestones()
 
-from .ai_coach import AICoachService, WorkoutPlan, WorkoutRequest
+@app.get("/events")
+async def stream_events(
+    session: AsyncSession = Depends(get_session),
+    current_user: User = Depends(get_current_user)
+):
+    """Server-sent events: PR changes and milestone unlocks for the caller."""
+    # Streams stay open for minutes; don't pin a pooled DB connection meanwhile.
+    await session.close()
+    queue = events.broker.subscribe(current_user.id)
+
+    async def stream():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            events.broker.unsubscribe(current_user.id, queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/analytics/volume", response_model=list[VolumeRead])
+async def get_volume(
+    period: Literal["day", "week", "month"] = "week",
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    session: AsyncSession = Depends(get_user_session),
+    current_user: User = Depends(get_current_user)
+):
+    repo = PRRepository(session, current_user.id)
+    rows = await repo.get_volume(period, start=start, end=end)
+    return [
+        VolumeRead(period_start=r.bucket, exercise=r.exercise, sets=r.sets, reps=r.reps, tonnage=r.tonnage)
+        for r in rows
+    ]
+
+@app.get("/exercises/suggest", response_model=list[str])
+async def suggest_exercises(
+    q: str = "",
+    limit: int = Query(10, ge=1, le=50),
+    session: AsyncSession = Depends(get_user_session),
+    current_user: User = Depends(get_current_user)
+):
+    return await exercises.suggest(session, current_user.id, q, limit)
+
+@app.get("/analytics/percentile", response_model=PercentileRead)
+async def get_strength_percentile(
+    exercise: str = Query(min_length=2),
+    weight: float = Query(gt=0),
+    current_user: User = Depends(get_current_user)
+):
+    # Population-wide: merged from every shard.
+    sketch = await percentiles.get_sketch(exercise)
+    if not sketch.total:
+        raise HTTPException(status_code=404, detail="No lifts recorded for this exercise")
+    return PercentileRead(
+        exercise=percentiles.normalize_exercise(exercise),
+        weight=weight,
+        percentile=round(sketch.percentile(weight), 1),
+        users=sketch.total,
+        relative_error=percentiles.RELATIVE_ACCURACY,
+    )
 
-@app.post("/ai/generate_routine", response_model=WorkoutPlan)
+@app.post("/ai/generate_routine", response_model=WorkoutPlan, dependencies=[rate_limited("ai")])
 async def generate_workout_routine(
     request: WorkoutRequest,
     session: AsyncSession = Depends(get_session),
     current_user: User = Depends(get_current_user)
 ):
+    # Imported on first use so API startup does not pay for the AI client.
+    from .ai_coach import AICoachService
     return await AICoachService.generate_routine(request)
 
 @app.get("/admin/users", response_model=list[User])
@@ -185,6 +394,55 @@ async def get_all_users_admin(
     result = await session.exec(select(User))
     return list(result.all())
 
+@app.get("/admin/shards")
+async def get_shards(
+    session: AsyncSession = Depends(get_session),
+    admin_user: User = Depends(get_admin_user)
+):
+    from sqlmodel import select, func
+    users = dict((await session.exec(select(User.shard, func.count(User.id)).group_by(User.shard))).all())
+
+    async def count_prs(shard, engine):
+        async with engine.connect() as conn:
+            return (await conn.execute(select(func.count(PR.id)))).scalar()
+
+    prs = await shards.fan_out(count_prs)
+    return [{"shard": shard, "users": users.get(shard, 0), "prs": n} for shard, n in enumerate(prs)]
+
+@app.post("/admin/keys/reload")
+async def reload_keys(admin_user: User = Depends(get_admin_user)):
+    """Re-read the JWT keyring (e.g. after scripts/rotate_keys.py) in every API process."""
+    try:
+        parse_keys(read_settings())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JWT keyring: {e}")
+    await cache.bus.invalidate(keyring.name, "reload")
+    return {"active_kid": keyring.active_kid, "kids": list(keyring.keys)}
+
+@app.get("/admin/metrics")
+async def get_metrics(admin_user: User = Depends(get_admin_user)):
+    return {
+        "load": {name: limiter.stats() for name, limiter in limiters.items()},
+        "circuits": {name: breaker.stats() for name, breaker in circuit_breaker.breakers.items()},
+    }
+
+@app.get("/admin/profile")
+async def get_profile(
+    format: Literal["speedscope", "collapsed"] = "speedscope",
+    admin_user: User = Depends(get_admin_user)
+):
+    if profiler is None:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    if format == "collapsed":
+        return PlainTextResponse(profiler.collapsed())
+    return profiler.speedscope()
+
+@app.delete("/admin/profile", status_code=status.HTTP_204_NO_CONTENT)
+async def reset_profile(admin_user: User = Depends(get_admin_user)):
+    if profiler is None:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    profiler.reset()
+
 @app.get("/", include_in_schema=False)
 async def root():
     return RedirectResponse(url="/docs")
@@ -0,0 +1,218 @@
+import asyncio
+import json
+import logging
+import math
+import os
+import time
+import uuid
+from collections import deque
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.logging_config import request_id_var
+
+logger = logging.getLogger(__name__)
+
+class RequestContextMiddleware:
+    """Tags each request with an id and turns unhandled errors into logged 500s.
+
+    The id comes from an incoming X-Request-ID header or is generated, is
+    echoed back on the response, and appears on every log line written
+    while the request is handled.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        request_id = headers.get(b"x-request-id", b"").decode("latin-1") or uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+        response_started = False
+
+        async def send_with_request_id(message: Message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"x-request-id", request_id.encode("latin-1")),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        except Exception:
+            logger.exception(
+                "Unhandled error",
+                extra={"method": scope["method"], "path": scope["path"]},
+            )
+            if response_started:
+                raise
+            body = json.dumps({"detail": "Internal Server Error", "request_id": request_id}).encode()
+            await send_with_request_id({
+                "type": "http.response.start",
+                "status": 500,
+                "headers": [(b"content-type", b"application/json")],
+            })
+            await send({"type": "http.response.body", "body": body})
+        finally:
+            request_id_var.reset(token)
+
+# Per route class: (concurrent requests, queued requests, max seconds queued).
+# Override with e.g. LIMIT_AI="2,4,5.0". Auth is CPU-bound (bcrypt), writes
+# serialize on SQLite's single writer, and AI calls hold a slot for seconds.
+DEFAULT_LIMITS = {
+    "auth": (4, 32, 1.0),
+    "reads": (32, 128, 0.5),
+    "writes": (8, 64, 1.0),
+    "ai": (4, 8, 2.0),
+}
+LOAD_SHEDDING = os.getenv("LOAD_SHEDDING", "true").lower() == "true"
+
+# Long-lived streams and the metrics probe are never queued or shed.
+UNLIMITED_PATHS = {"/events", "/admin/metrics"}
+
+def route_class(method: str, path: str) -> str | None:
+    if path in UNLIMITED_PATHS:
+        return None
+    if path.startswith("/auth/"):
+        return "auth"
+    if path.startswith("/ai/"):
+        return "ai"
+    return "reads" if method in ("GET", "HEAD", "OPTIONS") else "writes"
+
+class ConcurrencyLimiter:
+    """At most `limit` holders; up to `max_queue` FIFO waiters for `max_wait`s.
+
+    acquire() returns False instead of waiting when the queue is full or
+    the deadline passes, so overload turns into fast 503s rather than
+    ever-growing latency. Service time is tracked (EWMA) to suggest how
+    long shed clients should back off.
+    """
+
+    def __init__(self, name: str, limit: int, max_queue: int, max_wait: float):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.active = 0
+        self.shed = 0
+        self.avg_service = 0.0
+        self._waiters: deque[asyncio.Future] = deque()
+
+    async def acquire(self) -> bool:
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return True
+        if len(self._waiters) >= self.max_queue:
+            self.shed += 1
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            async with asyncio.timeout(self.max_wait):
+                await waiter
+        except TimeoutError:
+            # release() may have handed us the slot in the tick the deadline
+            # fired; it is ours, so take it rather than leak it.
+            if waiter.done() and not waiter.cancelled():
+                return True
+            self._discard(waiter)
+            self.shed += 1
+            return False
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                self._discard(waiter)
+            raise
+        return True
+
+    def _discard(self, waiter: asyncio.Future):
+        # release() skips (and pops) waiters that are already cancelled.
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def release(self, elapsed: float | None = None):
+        if elapsed is not None:
+            self.avg_service = 0.9 * self.avg_service + 0.1 * elapsed if self.avg_service else elapsed
+        # Hand the slot straight to the oldest waiter, if any.
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def retry_after(self) -> int:
+        backlog = (len(self._waiters) + self.active) * self.avg_service / self.limit
+        return max(1, math.ceil(backlog))
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "queued": len(self._waiters),
+            "limit": self.limit,
+            "max_queue": self.max_queue,
+            "shed": self.shed,
+            "avg_service_ms": round(self.avg_service * 1000, 1),
+        }
+
+def _limits_from_env() -> dict[str, tuple[int, int, float]]:
+    limits = {}
+    for name, default in DEFAULT_LIMITS.items():
+        raw = os.getenv(f"LIMIT_{name.upper()}")
+        if raw:
+            limit, max_queue, max_wait = raw.split(",")
+            limits[name] = (int(limit), int(max_queue), float(max_wait))
+        else:
+            limits[name] = default
+    return limits
+
+limiters = {name: ConcurrencyLimiter(name, *config) for name, config in _limits_from_env().items()}
+
+class ConcurrencyLimitMiddleware:
+    """Gives each route class its own concurrency budget and sheds overload.
+
+    Requests beyond a class's budget queue briefly; once the queue is full
+    or a request has waited past the class deadline it gets a 503 with a
+    Retry-After hint, and the app never sees it.
+    """
+
+    def __init__(self, app: ASGIApp, limiters: dict[str, ConcurrencyLimiter] = limiters):
+        self.app = app
+        self.limiters = limiters
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        name = route_class(scope["method"], scope["path"]) if scope["type"] == "http" else None
+        limiter = self.limiters.get(name)
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not await limiter.acquire():
+            retry_after = limiter.retry_after()
+            logger.warning("Shedding request", extra={"route_class": name, "path": scope["path"]})
+            body = json.dumps({"detail": "Server is busy, retry later"}).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"retry-after", str(retry_after).encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release(time.perf_counter() - start)
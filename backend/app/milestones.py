@@ -0,0 +1,173 @@
+import functools
+import time
+from datetime import datetime, timezone
+from typing import Callable
+from sqlalchemy import case, delete, insert, union
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.orm import sessionmaker
+from sqlmodel import select, func, and_
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.models import PR, ChangeSequence, Milestone
+from app import archive, cache
+
+# Milestone definitions. "metric" is either an aggregate over all of a
+# user's PRs, or ("max", exercise, exclude) for the heaviest lift whose
+# name contains `exercise` (and not `exclude`).
+MILESTONES = {
+    "novice": {"title": "Novice Lifter", "desc": "Log your first Personal Record", "target": 1, "unit": "PR", "metric": "total_prs"},
+    "gains": {"title": "Gains Seeker", "desc": "Log 5 Personal Records", "target": 5, "unit": "PRs", "metric": "total_prs"},
+    "destroyer": {"title": "Destroyer of Weakness", "desc": "Log 10 Personal Records", "target": 10, "unit": "PRs", "metric": "total_prs"},
+    "chest-pounder": {"title": "Chest Pounder", "desc": "Bench Press 100kg", "target": 100, "unit": "kg", "metric": ("max", "bench press", "incline")},
+    "squat-king": {"title": "The Squat King", "desc": "Squat 120kg", "target": 120, "unit": "kg", "metric": ("max", "squat", None)},
+    "earth-shaker": {"title": "Earth Shaker", "desc": "Deadlift 150kg", "target": 150, "unit": "kg", "metric": ("max", "deadlift", "romanian")},
+    "shoulder-titan": {"title": "Shoulder Titan", "desc": "Overhead Press 60kg", "target": 60, "unit": "kg", "metric": ("max", "overhead press", None)},
+    "wing-master": {"title": "Wing Master", "desc": "Weighted Pull Up 20kg", "target": 20, "unit": "kg", "metric": ("max", "pull up", None)},
+    "back-builder": {"title": "Back Builder", "desc": "Barbell Row 80kg", "target": 80, "unit": "kg", "metric": ("max", "barbell row", None)},
+    "incline-ace": {"title": "Incline Ace", "desc": "Incline Bench 90kg", "target": 90, "unit": "kg", "metric": ("max", "incline bench", None)},
+    "dip-demon": {"title": "Dip Demon", "desc": "Weighted Dips 40kg", "target": 40, "unit": "kg", "metric": ("max", "dips", None)},
+    "hinge-master": {"title": "Hinge Master", "desc": "Romanian Deadlift 100kg", "target": 100, "unit": "kg", "metric": ("max", "romanian deadlift", None)},
+    "leg-press-lord": {"title": "Leg Press Lord", "desc": "Leg Press 300kg", "target": 300, "unit": "kg", "metric": ("max", "leg press", None)},
+    "century": {"title": "Century Club", "desc": "Hit 100kg in any lift", "target": 100, "unit": "kg", "metric": "max_weight"},
+    "double-century": {"title": "Double Century", "desc": "Hit 200kg in any lift", "target": 200, "unit": "kg", "metric": "max_weight"},
+    "rep-king": {"title": "Rep King", "desc": "Log 100 total reps", "target": 100, "unit": "reps", "metric": "total_reps"},
+}
+
+def _metric_expression(metric):
+    if metric == "total_prs":
+        return func.count(PR.id)
+    if metric == "total_reps":
+        return func.coalesce(func.sum(PR.reps), 0)
+    if metric == "max_weight":
+        return func.coalesce(func.max(PR.weight), 0)
+    _, exercise, exclude = metric
+    matches = func.lower(PR.exercise).contains(exercise.lower())
+    if exclude:
+        matches = and_(matches, func.lower(PR.exercise).contains(exclude.lower()) == False)
+    return func.coalesce(func.max(case((matches, PR.weight))), 0)
+
+@functools.cache
+def progress_columns():
+    """One aggregate column per milestone, labelled with its name.
+
+    Selecting these over a user's PRs (or GROUP BY user_id over many users)
+    yields every milestone's progress in a single pass over the rows. Built
+    once: the expressions are immutable and sit on every write path.
+    """
+    return tuple(_metric_expression(d["metric"]).label(name) for name, d in MILESTONES.items())
+
+def with_archive(progress, user_id: int) -> dict:
+    """Progress over hot and archived PRs.
+
+    `progress` is a row of progress_columns() values (or None for a user
+    with no hot PRs). The archive's per-exercise stats are folded in with
+    the same matching rules as the SQL above.
+    """
+    merged = {name: (progress[name] if progress is not None else 0) or 0 for name in MILESTONES}
+    cold = archive.load(user_id)
+    if cold is None:
+        return merged
+    for name, d in MILESTONES.items():
+        metric = d["metric"]
+        if metric == "total_prs":
+            merged[name] += sum(e.count for e in cold.exercises)
+        elif metric == "total_reps":
+            merged[name] += sum(e.reps for e in cold.exercises)
+        elif metric == "max_weight":
+            merged[name] = max([merged[name], *(e.max_weight for e in cold.exercises)])
+        else:
+            _, exercise, exclude = metric
+            merged[name] = max([merged[name], *(
+                e.max_weight for e in cold.exercises
+                if exercise.lower() in e.name.lower() and not (exclude and exclude.lower() in e.name.lower())
+            )])
+    return merged
+
+def unlocked_names(progress) -> set[str]:
+    return {name for name, d in MILESTONES.items() if (progress[name] or 0) >= d["target"]}
+
+async def sync_milestones(session, user_ids: list[int]) -> dict[int, tuple[set[str], set[str]]]:
+    """Make stored milestones match PR progress for these users, in bulk.
+
+    One grouped progress query, one read of existing milestones, one delete
+    per revoked milestone name and one insert. Does not commit. Returns
+    {user_id: (unlocked names, revoked names)} for users that changed.
+    """
+    progress_res = await session.execute(
+        select(PR.user_id, *progress_columns())
+        .where(PR.user_id.in_(user_ids))
+        .group_by(PR.user_id)
+    )
+    progress = {row["user_id"]: row for row in progress_res.mappings()}
+    desired = {user_id: unlocked_names(with_archive(progress.get(user_id), user_id)) for user_id in user_ids}
+
+    existing_res = await session.execute(
+        select(Milestone.user_id, Milestone.name).where(Milestone.user_id.in_(user_ids))
+    )
+    existing: dict[int, set[str]] = {}
+    for user_id, name in existing_res.all():
+        existing.setdefault(user_id, set()).add(name)
+
+    now = datetime.now(timezone.utc)
+    to_insert, to_delete, changes = [], {}, {}
+    for user_id in user_ids:
+        want, have = desired.get(user_id, set()), existing.get(user_id, set())
+        if want == have:
+            continue
+        changes[user_id] = (want - have, have - want)
+        to_insert.extend({"user_id": user_id, "name": n, "unlocked_at": now} for n in want - have)
+        for name in have - want:
+            to_delete.setdefault(name, []).append(user_id)
+
+    for name, stale_ids in to_delete.items():
+        await session.execute(
+            delete(Milestone).where(and_(Milestone.name == name, Milestone.user_id.in_(stale_ids)))
+        )
+    if to_insert:
+        await session.execute(insert(Milestone), to_insert)
+    return changes
+
+async def backfill_milestones(
+    engine: AsyncEngine,
+    chunk_size: int = 500,
+    on_progress: Callable[[dict], None] | None = None,
+) -> dict:
+    """Recompute milestones for every user with data in `engine`'s database.
+
+    Users are walked in id order, chunk_size at a time; each chunk is one
+    sync_milestones() call and one commit. They are found through their PRs,
+    change numbers (which archived users keep) and milestones rather than
+    the user table, which only the main database has.
+    """
+    async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    stats = {"users": 0, "inserted": 0, "deleted": 0, "elapsed": 0.0}
+    start = time.perf_counter()
+    last_id = 0
+    users = union(select(PR.user_id), select(ChangeSequence.user_id), select(Milestone.user_id)).subquery()
+
+    async with async_session() as session:
+        total = (await session.execute(select(func.count()).select_from(users))).scalar()
+        stats["total"] = total
+
+        while True:
+            ids_res = await session.execute(
+                select(users.c.user_id).where(users.c.user_id > last_id).order_by(users.c.user_id).limit(chunk_size)
+            )
+            user_ids = list(ids_res.scalars().all())
+            if not user_ids:
+                break
+            last_id = user_ids[-1]
+
+            changes = await sync_milestones(session, user_ids)
+            await session.commit()
+
+            if changes:
+                await cache.invalidate_user_views(list(changes))
+
+            stats["users"] += len(user_ids)
+            stats["inserted"] += sum(len(unlocked) for unlocked, _ in changes.values())
+            stats["deleted"] += sum(len(revoked) for _, revoked in changes.values())
+            stats["elapsed"] = time.perf_counter() - start
+            if on_progress:
+                on_progress(dict(stats))
+
+    return stats
@@ -1,5 +1,7 @@
-from datetime import datetime, timezone
-from typing import Optional
+from datetime import date, datetime, timezone
+from typing import Annotated, List, Literal, Optional, Union
+from pydantic import BaseModel
+from sqlalchemy import Index
 from sqlmodel import SQLModel, Field
 
 # User Table Model
@@ -8,6 +10,7 @@ class User(SQLModel, table=True):
     username: str = Field(unique=True, index=True)
     hashed_password: str
     role: str = Field(default="user") # "user" or "admin"
+    shard: int = Field(default=0, index=True) # Database holding this user's PRs (see app.shards)
 
 # User Schemas
 class UserCreate(SQLModel):
@@ -31,9 +34,18 @@ class PRBase(SQLModel):
 
 # Table Model (Database)
 class PR(PRBase, table=True):
+    __table_args__ = (
+        Index("ix_pr_user_id_performed_at", "user_id", "performed_at"),
+        Index("ix_pr_user_id_seq", "user_id", "seq"),
+        # Never hand out an id again once it was used: archived PRs keep
+        # theirs after leaving the table (see app/archive.py).
+        {"sqlite_autoincrement": True},
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="user.id", nullable=False)
     performed_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    seq: int = Field(default=0, description="Per-user change sequence of the last write")
 
 # Create Model (Client input)
 class PRCreate(PRBase):
@@ -45,6 +57,86 @@ class PRUpdate(SQLModel):
     weight: Optional[float] = Field(default=None, gt=0)
     reps: Optional[int] = Field(default=None, gt=0)
 
+# Change Tracking Tables (Database)
+# ChangeSequence holds each user's latest change number; PR.seq and
+# PRTombstone.seq record which change last touched a row.
+class ChangeSequence(SQLModel, table=True):
+    user_id: int = Field(primary_key=True, foreign_key="user.id")
+    seq: int = 0
+
+class PRTombstone(SQLModel, table=True):
+    user_id: int = Field(primary_key=True, foreign_key="user.id")
+    pr_id: int = Field(primary_key=True)
+    seq: int = Field(index=True)
+    deleted_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+# Delta Sync Response Model (GET /prs/changes)
+class PRChanges(SQLModel):
+    seq: int
+    upserts: List[PR]
+    deletes: List[int]
+
+# Batch Models (POST /prs/batch)
+class PRBatchCreate(SQLModel):
+    op: Literal["create"]
+    data: PRCreate
+
+class PRBatchUpdate(SQLModel):
+    op: Literal["update"]
+    id: int
+    data: PRUpdate
+
+class PRBatchDelete(SQLModel):
+    op: Literal["delete"]
+    id: int
+
+PRBatchOperation = Annotated[Union[PRBatchCreate, PRBatchUpdate, PRBatchDelete], Field(discriminator="op")]
+
+class PRBatchRequest(SQLModel):
+    operations: List[PRBatchOperation] = Field(min_length=1, max_length=100)
+
+class PRBatchResult(SQLModel):
+    index: int
+    op: str
+    status: int
+    pr: Optional[PR] = None
+
+# Volume Rollup Table Model (Database)
+# Running totals per user, period bucket and exercise, kept current on every
+# PR write so analytics never scan the PR table.
+class VolumeRollup(SQLModel, table=True):
+    user_id: int = Field(primary_key=True, foreign_key="user.id")
+    period: str = Field(primary_key=True) # "day", "week" or "month"
+    bucket: date = Field(primary_key=True) # First day of the period
+    exercise: str = Field(primary_key=True)
+    sets: int = 0
+    reps: int = 0
+    tonnage: float = 0.0
+
+# Volume Response Model
+class VolumeRead(SQLModel):
+    period_start: date
+    exercise: str
+    sets: int
+    reps: int
+    tonnage: float
+
+# Strength Sketch Table Model (Database)
+# How many users' best lift for an exercise falls in each log-spaced weight
+# bucket (see app.percentiles). Kept current on every PR write.
+class StrengthBucket(SQLModel, table=True):
+    exercise: str = Field(primary_key=True) # Normalized exercise name
+    bucket: int = Field(primary_key=True)
+    users: int = 0
+
+# Percentile Response Model
+class PercentileRead(SQLModel):
+    exercise: str
+    weight: float
+    percentile: float
+    users: int
+    relative_error: float
+
 # Milestone Table Model (Database)
 class Milestone(SQLModel, table=True):
     name: str = Field(primary_key=True)
@@ -61,3 +153,27 @@ class MilestoneRead(SQLModel):
     title: str
     description: str
     unit: str
+
+# AI Coach Schemas
+# Kept here (not in app.ai_coach) so routes can declare them without
+# importing the AI service and its HTTP client at startup.
+class WorkoutRequest(BaseModel):
+    fitness_level: str
+    days_per_week: int
+    focus_areas: Optional[str] = None
+
+class Exercise(BaseModel):
+    name: str
+    sets: str
+    reps: str
+    notes: Optional[str] = None
+
+class WorkoutDay(BaseModel):
+    day: str
+    focus: str
+    exercises: List[Exercise]
+
+class WorkoutPlan(BaseModel):
+    routine_name: str
+    schedule: List[WorkoutDay]
+    coach_tip: str
@@ -0,0 +1,168 @@
+import math
+from bisect import bisect_left
+from itertools import accumulate
+from sqlalchemy import delete, insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import select, func, and_
+from app.models import PR, ChangeSequence, StrengthBucket
+from app import archive, cache, shards
+
+# Each user's best lift per exercise is counted in a log-spaced bucket
+# (DDSketch-style): bucket i holds weights in (GAMMA**(i-1), GAMMA**i], so
+# any weight is known to within RELATIVE_ACCURACY. Unlike t-digest or KLL,
+# bucket counts can be decremented, which is needed because a user's best
+# drops when their top PR is edited or deleted. ~350 buckets cover 1-1000kg.
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(GAMMA)
+# Lighter bests (bodyweight movements logged as 0kg) share the lowest bucket.
+MIN_WEIGHT = 1.0
+
+def normalize_exercise(name: str) -> str:
+    # Also registered as exercise_key() on every connection (app/db.py), so
+    # SQL groups by exactly this: SQLite's own lower() and trim() only fold
+    # ASCII and only strip spaces.
+    return name.strip().lower()
+
+def _exercise_key():
+    return func.exercise_key(PR.exercise)
+
+def bucket_index(weight: float) -> int:
+    return math.ceil(math.log(max(weight, MIN_WEIGHT)) / _LOG_GAMMA)
+
+class StrengthSketch:
+    """Read-only view of one exercise's buckets, ready for rank queries."""
+
+    def __init__(self, counts: dict[int, int]):
+        self.indexes = sorted(i for i, n in counts.items() if n > 0)
+        self.counts = [counts[i] for i in self.indexes]
+        self.cumulative = list(accumulate(self.counts))
+        self.total = self.cumulative[-1] if self.cumulative else 0
+
+    def merge(self, other: "StrengthSketch") -> "StrengthSketch":
+        counts = dict(zip(self.indexes, self.counts))
+        for i, n in zip(other.indexes, other.counts):
+            counts[i] = counts.get(i, 0) + n
+        return StrengthSketch(counts)
+
+    def percentile(self, weight: float) -> float:
+        """Share of users whose best is below `weight`, counting ties as half."""
+        if not self.total:
+            return 0.0
+        index = bucket_index(weight)
+        pos = bisect_left(self.indexes, index)
+        below = self.cumulative[pos - 1] if pos else 0
+        same = self.counts[pos] if pos < len(self.indexes) and self.indexes[pos] == index else 0
+        return 100.0 * (below + same / 2) / self.total
+
+async def get_sketch(exercise: str) -> StrengthSketch:
+    """The exercise's sketch over all users: each shard's buckets, merged."""
+    key = normalize_exercise(exercise)
+    sketch = cache.strength_sketches.get(key)
+    if sketch is None:
+        version = cache.strength_sketches.version(key)
+
+        async def load(shard, engine):
+            async with engine.connect() as conn:
+                result = await conn.execute(
+                    select(StrengthBucket.bucket, StrengthBucket.users).where(StrengthBucket.exercise == key)
+                )
+                return StrengthSketch(dict(result.all()))
+
+        sketch = StrengthSketch({})
+        for part in await shards.fan_out(load):
+            sketch = sketch.merge(part)
+        cache.strength_sketches.set(key, sketch, version=version)
+    return sketch
+
+async def user_bests(session, keys: set[tuple[int, str]]) -> dict[tuple[int, str], float | None]:
+    """Current best weight per (user id, normalized exercise name)."""
+    key = _exercise_key()
+    result = await session.execute(
+        select(PR.user_id, key, func.max(PR.weight))
+        .where(and_(PR.user_id.in_({u for u, _ in keys}), key.in_({e for _, e in keys})))
+        .group_by(PR.user_id, key)
+    )
+    bests = dict.fromkeys(keys)
+    for user_id, exercise, best in result.all():
+        if (user_id, exercise) in bests:
+            bests[(user_id, exercise)] = best
+    for key, best in bests.items():
+        cold = archived_best(*key)
+        if cold is not None and (best is None or cold > best):
+            bests[key] = cold
+    return bests
+
+def archived_best(user_id: int, exercise: str) -> float | None:
+    cold = archive.load(user_id)
+    if cold is None:
+        return None
+    weights = [e.max_weight for e in cold.exercises if normalize_exercise(e.name) == exercise]
+    return max(weights, default=None)
+
+async def apply_bests(session, before: dict[tuple[int, str], float | None]):
+    """Move users between buckets for every exercise whose best changed.
+
+    Call with user_bests() taken before the write, after flushing it. All
+    moves are netted and applied as one multi-row upsert.
+    """
+    after = await user_bests(session, set(before))
+    deltas: dict[tuple[str, int], int] = {}
+    for (user_id, exercise), old in before.items():
+        new = after[(user_id, exercise)]
+        old_index = bucket_index(old) if old is not None else None
+        new_index = bucket_index(new) if new is not None else None
+        if old_index == new_index:
+            continue
+        if old_index is not None:
+            deltas[(exercise, old_index)] = deltas.get((exercise, old_index), 0) - 1
+        if new_index is not None:
+            deltas[(exercise, new_index)] = deltas.get((exercise, new_index), 0) + 1
+    deltas = {slot: n for slot, n in deltas.items() if n}
+    if not deltas:
+        return
+
+    statement = sqlite_insert(StrengthBucket).values([
+        {"exercise": e, "bucket": b, "users": n} for (e, b), n in deltas.items()
+    ])
+    statement = statement.on_conflict_do_update(
+        index_elements=["exercise", "bucket"],
+        set_={"users": StrengthBucket.users + statement.excluded.users},
+    )
+    await session.execute(statement)
+    if any(n < 0 for n in deltas.values()):
+        await session.execute(
+            delete(StrengthBucket).where(and_(
+                StrengthBucket.exercise.in_({e for e, _ in deltas}),
+                StrengthBucket.users <= 0,
+            ))
+        )
+
+async def rebuild(conn):
+    """Recompute every bucket from the PR table (one grouped scan) and archives."""
+    key = _exercise_key()
+    result = await conn.execute(
+        select(PR.user_id, key, func.max(PR.weight)).group_by(PR.user_id, key)
+    )
+    bests = {(user_id, exercise): best for user_id, exercise, best in result.all()}
+    # Archives are not per shard; count those of users whose data is here.
+    local = {user_id for user_id, _ in bests}
+    local.update((await conn.execute(select(ChangeSequence.user_id))).scalars())
+    for user_id in archive.user_ids():
+        if user_id not in local:
+            continue
+        for stats in archive.load(user_id).exercises:
+            slot = (user_id, normalize_exercise(stats.name))
+            bests[slot] = max(bests.get(slot) or 0, stats.max_weight)
+
+    counts: dict[tuple[str, int], int] = {}
+    for (_, exercise), best in bests.items():
+        slot = (exercise, bucket_index(best))
+        counts[slot] = counts.get(slot, 0) + 1
+
+    await conn.execute(delete(StrengthBucket))
+    if counts:
+        await conn.execute(
+            insert(StrengthBucket),
+            [{"exercise": e, "bucket": b, "users": n} for (e, b), n in counts.items()],
+        )
@@ -0,0 +1,171 @@
+import hmac
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+# PROFILING=true installs the middleware; otherwise nothing here runs.
+# A profiled request is picked at PROFILE_SAMPLE_RATE, or on demand with
+# an "X-Profile: <PROFILE_TOKEN>" header. Without a token set the header
+# is ignored: anyone could otherwise make every request pay for sampling.
+PROFILING = os.getenv("PROFILING", "false").lower() == "true"
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0.01"))
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_HEADER = b"x-profile"
+# Requests matching no route (404 scans) share one entry, so random paths
+# cannot grow the profile table.
+UNMATCHED = "<unmatched>"
+
+# Bounds on what a long-running process keeps in memory.
+MAX_DEPTH = 128
+MAX_STACKS_PER_ROUTE = 5000
+
+class _Request:
+    __slots__ = ("thread_id", "samples")
+
+    def __init__(self, thread_id: int):
+        self.thread_id = thread_id
+        self.samples: Counter[tuple[str, ...]] = Counter()
+
+def _label(frame) -> str:
+    return f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_qualname}"
+
+class SamplingProfiler:
+    """Statistical profiler for requests running on the event loop.
+
+    A background thread wakes every `interval` seconds while a profiled
+    request is in flight and reads the loop thread's current stack with
+    sys._current_frames(). Coroutine frames chain back through the
+    middleware frame of the request being executed, which is how each
+    sample is attributed to its request (and so to its route). Nothing is
+    traced, so the profiled code runs at full speed.
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self.routes: dict[str, Counter[tuple[str, ...]]] = {}
+        self._active: dict[object, _Request] = {}
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    def begin(self, frame) -> _Request:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+            self._thread.start()
+        request = _Request(threading.get_ident())
+        self._active[frame] = request
+        self._wake.set()
+        return request
+
+    def end(self, frame, route: str):
+        request = self._active.pop(frame)
+        if not self._active:
+            self._wake.clear()
+        with self._lock:
+            stacks = self.routes.setdefault(route, Counter())
+            for stack, count in request.samples.items():
+                if stack in stacks or len(stacks) < MAX_STACKS_PER_ROUTE:
+                    stacks[stack] += count
+
+    def reset(self):
+        with self._lock:
+            self.routes.clear()
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            time.sleep(self.interval)
+            self.sample()
+
+    def sample(self):
+        threads = {request.thread_id for request in list(self._active.values())}
+        current = sys._current_frames()
+        for thread_id in threads:
+            frame = current.get(thread_id)
+            stack = []
+            while frame is not None and len(stack) < MAX_DEPTH:
+                request = self._active.get(frame)
+                if request is not None:
+                    request.samples[tuple(reversed(stack))] += 1
+                    break
+                stack.append(_label(frame))
+                frame = frame.f_back
+
+    def collapsed(self) -> str:
+        """Brendan Gregg's folded format: "route;outer;...;inner count" per line."""
+        with self._lock:
+            lines = [
+                ";".join((route, *stack)) + f" {count}"
+                for route, stacks in sorted(self.routes.items())
+                for stack, count in stacks.items()
+            ]
+        return "\n".join(lines) + "\n" if lines else ""
+
+    def speedscope(self) -> dict:
+        """One sampled profile per route in speedscope's file format."""
+        frames: dict[str, int] = {}
+        profiles = []
+        with self._lock:
+            for route, stacks in sorted(self.routes.items()):
+                samples, weights = [], []
+                for stack, count in stacks.items():
+                    samples.append([frames.setdefault(label, len(frames)) for label in stack])
+                    weights.append(count * self.interval * 1000)
+                profiles.append({
+                    "type": "sampled",
+                    "name": route,
+                    "unit": "milliseconds",
+                    "startValue": 0,
+                    "endValue": sum(weights),
+                    "samples": samples,
+                    "weights": weights,
+                })
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": "gym-pr-tracker",
+            "shared": {"frames": [{"name": label} for label in frames]},
+            "profiles": profiles,
+        }
+
+profiler = SamplingProfiler() if PROFILING else None
+
+class ProfilingMiddleware:
+    """Profiles a sampled fraction of requests, aggregated by route template."""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        profiler: SamplingProfiler,
+        sample_rate: float = PROFILE_SAMPLE_RATE,
+        token: str = PROFILE_TOKEN,
+    ):
+        self.app = app
+        self.profiler = profiler
+        self.sample_rate = sample_rate
+        self.token = token.encode()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not self._wanted(scope):
+            await self.app(scope, receive, send)
+            return
+
+        # Samples are attributed by finding this frame on the loop's stack.
+        frame = sys._getframe()
+        self.profiler.begin(frame)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            route = scope.get("route")
+            self.profiler.end(frame, f"{scope['method']} {route.path}" if route is not None else UNMATCHED)
+
+    def _wanted(self, scope: Scope) -> bool:
+        if self.token:
+            value = dict(scope["headers"]).get(PROFILE_HEADER)
+            if value is not None and hmac.compare_digest(value, self.token):
+                return True
+        return random.random() < self.sample_rate
@@ -0,0 +1,122 @@
+import logging
+import math
+import os
+import time
+from dataclasses import dataclass
+from redis.exceptions import RedisError, WatchError
+from app import redis_client
+
+logger = logging.getLogger(__name__)
+
+# Per route class: (burst, tokens refilled per minute), per user. Override
+# with e.g. RATE_LIMIT_AI="5,2". AI calls cost money and hold an upstream
+# slot for seconds; every GET /milestones also syncs (and may write) them.
+DEFAULT_RATE_LIMITS = {
+    "ai": (3, 1.0),
+    "milestones": (20, 60.0),
+}
+RATE_LIMITING = os.getenv("RATE_LIMITING", "true").lower() == "true"
+
+def _limits_from_env() -> dict[str, tuple[int, float]]:
+    limits = {}
+    for name, default in DEFAULT_RATE_LIMITS.items():
+        raw = os.getenv(f"RATE_LIMIT_{name.upper()}")
+        if raw:
+            burst, per_minute = raw.split(",")
+            limits[name] = (int(burst), float(per_minute))
+        else:
+            limits[name] = default
+    return limits
+
+limits = _limits_from_env()
+
+@dataclass(frozen=True)
+class Decision:
+    allowed: bool
+    limit: int
+    remaining: int
+    reset: int  # seconds until the bucket is full again
+    retry_after: int  # seconds until the next request would be allowed
+
+    def headers(self) -> dict[str, str]:
+        headers = {
+            "RateLimit-Limit": str(self.limit),
+            "RateLimit-Remaining": str(self.remaining),
+            "RateLimit-Reset": str(self.reset),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(self.retry_after)
+        return headers
+
+def decide(tat: float | None, now: float, burst: int, per_minute: float) -> tuple[Decision, float]:
+    """One token-bucket step, in GCRA form.
+
+    Instead of a token count the bucket stores one timestamp, the
+    theoretical arrival time (TAT): when the bucket would be full again.
+    Each request pushes it one refill interval further; a request is
+    allowed while that stays within `burst` intervals of now. Returns the
+    decision and the TAT to store (unchanged when rejected).
+    """
+    interval = 60.0 / per_minute
+    tat = max(tat or now, now)
+    new_tat = tat + interval
+    allow_at = new_tat - burst * interval
+    if now < allow_at:
+        return Decision(False, burst, 0, math.ceil(tat - now), max(1, math.ceil(allow_at - now))), tat
+    remaining = int((now - allow_at) / interval + 1e-9)
+    return Decision(True, burst, remaining, math.ceil(new_tat - now), 0), new_tat
+
+class _LocalBuckets:
+    """Per-process fallback for when Redis is not configured or unreachable."""
+
+    def __init__(self):
+        self._tats: dict[str, float] = {}
+
+    def take(self, key: str, now: float, burst: int, per_minute: float) -> Decision:
+        if len(self._tats) > 10_000:
+            self._tats = {k: tat for k, tat in self._tats.items() if tat > now}
+        decision, self._tats[key] = decide(self._tats.get(key), now, burst, per_minute)
+        return decision
+
+_local = _LocalBuckets()
+_clock = time.time
+
+async def _take_redis(redis, key: str, now: float, burst: int, per_minute: float) -> Decision:
+    # Optimistic transaction: if another request for the same user changes
+    # the bucket between GET and EXEC, EXEC fails and the step is redone.
+    # The key expires once the bucket is full again; before that, only a
+    # volatile-* eviction policy keeps Redis from dropping it (compose.yaml).
+    async with redis.pipeline() as pipe:
+        for _ in range(5):
+            try:
+                await pipe.watch(key)
+                raw = await pipe.get(key)
+                decision, tat = decide(float(raw) if raw is not None else None, now, burst, per_minute)
+                if not decision.allowed:
+                    return decision
+                pipe.multi()
+                pipe.set(key, repr(tat), px=max(1, math.ceil((tat - now) * 1000)))
+                await pipe.execute()
+                return decision
+            except WatchError:
+                continue
+    # Five lost races in a row: this user is clearly bursting.
+    return Decision(False, burst, 0, math.ceil(60.0 / per_minute), 1)
+
+async def take(name: str, user_id: int) -> Decision:
+    """Spend one of the user's tokens for route class `name`.
+
+    Buckets live in Redis, shared by all API processes and updated
+    atomically; without Redis each process keeps its own. The clock is the
+    API host's, so hosts are assumed to be NTP-synced.
+    """
+    burst, per_minute = limits[name]
+    now = _clock()
+    key = f"gym-pr-tracker:rl:{name}:{user_id}"
+    redis = redis_client.get_redis()
+    if redis is not None:
+        try:
+            return await _take_redis(redis, key, now, burst, per_minute)
+        except RedisError as e:
+            logger.warning(f"Rate limit store unavailable, limiting in-process: {e}")
+    return _local.take(key, now, burst, per_minute)
@@ -0,0 +1,37 @@
+import logging
+import os
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+# Unset means "run without Redis": every feature built on it has a local fallback.
+REDIS_URL = os.getenv("REDIS_URL")
+
+_client: Redis | None = None
+
+def get_redis() -> Redis | None:
+    return _client
+
+def set_redis(client: Redis | None):
+    # Used by tests to plug in a fakeredis instance.
+    global _client
+    _client = client
+
+async def connect(url: str | None = REDIS_URL) -> Redis | None:
+    if not url:
+        return None
+    client = Redis.from_url(url)
+    try:
+        await client.ping()
+    except (RedisError, OSError) as e:
+        logger.warning(f"Redis unavailable at {url}, continuing without it: {e}")
+        await client.aclose()
+        return None
+    set_redis(client)
+    return client
+
+async def close():
+    if _client is not None:
+        await _client.aclose()
+    set_redis(None)
@@ -1,7 +1,68 @@
-from datetime import datetime, timezone
+from collections import Counter
+from datetime import date, datetime, timezone
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlmodel import select, func, and_
 from sqlmodel.ext.asyncio.session import AsyncSession
-from app.models import PR, PRCreate, PRUpdate, Milestone, MilestoneRead, User
+from app.models import (
+    PR, PRCreate, PRUpdate, PRBatchOperation, PRBatchResult, PRChanges, PRTombstone,
+    ChangeSequence, Milestone, MilestoneRead, User, VolumeRollup,
+)
+from app import archive, cache, events, percentiles, rollups, shards
+from app.milestones import MILESTONES, progress_columns, unlocked_names, with_archive
+
+class PRNotFoundError(LookupError):
+    def __init__(self, index: int):
+        super().__init__(f"Operation {index}: PR not found")
+        self.index = index
+
+class PRArchivedError(Exception):
+    """The PR was moved to cold storage (app.archive), which is read-only."""
+
+    def __init__(self, pr_id: int):
+        super().__init__(f"PR {pr_id} is archived and can no longer be changed")
+        self.pr_id = pr_id
+
+def _as_utc(value: datetime) -> datetime:
+    # performed_at is stored in UTC; naive inputs are taken to be UTC too.
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+async def reserve_seqs(session: AsyncSession, counts: dict[int, int]) -> dict[int, int]:
+    """Reserve counts[user_id] change numbers per user; returns each user's last.
+
+    Allocated inside the write transaction, so SQLite's writer lock makes
+    sequence order match commit order.
+    """
+    statement = sqlite_insert(ChangeSequence).values([{"user_id": u, "seq": n} for u, n in counts.items()])
+    statement = statement.on_conflict_do_update(
+        index_elements=["user_id"], set_={"seq": ChangeSequence.seq + statement.excluded.seq}
+    ).returning(ChangeSequence.user_id, ChangeSequence.seq)
+    result = await session.execute(statement)
+    return dict(result.all())
+
+async def insert_prs(session: AsyncSession, items: list[tuple[int, PRCreate]]) -> list[PR]:
+    """Insert PRs for any mix of users, with one statement per step.
+
+    Change numbers, bests, the insert itself and the rollup upsert each take
+    a single statement however many PRs (and users) are in `items`.
+    """
+    counts = Counter(user_id for user_id, _ in items)
+    last_seqs = await reserve_seqs(session, counts)
+    next_seq = {user_id: last_seqs[user_id] - n + 1 for user_id, n in counts.items()}
+    bests = await percentiles.user_bests(
+        session, {(user_id, percentiles.normalize_exercise(data.exercise)) for user_id, data in items}
+    )
+
+    prs = []
+    for user_id, data in items:
+        prs.append(PR(**data.model_dump(), user_id=user_id, seq=next_seq[user_id]))
+        next_seq[user_id] += 1
+    session.add_all(prs)
+    await session.flush()
+    await rollups.apply_prs(session, prs)
+    await percentiles.apply_bests(session, bests)
+    return prs
 
 class UserRepository:
     def __init__(self, session: AsyncSession):
@@ -14,174 +75,277 @@ class UserRepository:
 
     async def create(self, user: User) -> User:
         self.session.add(user)
+        await self.session.flush()
+        user.shard = shards.shard_for(user.id)
         await self.session.commit()
         await self.session.refresh(user)
+        await cache.bus.invalidate("users", user.username)
         return user
 
 class PRRepository:
     def __init__(self, session: AsyncSession, user_id: int):
         self.session = session
         self.user_id = user_id
+        # Events for the open transaction, published to /events after commit.
+        self._pending_events: list[dict] = []
+
+    async def list_all(self, since: datetime | None = None, until: datetime | None = None) -> list[PR]:
+        if since is None and until is None:
+            return await cache.pr_lists.get_or_load(self.user_id, self._query_prs)
+        return await self._query_prs(since, until)
 
-    async def list_all(self) -> list[PR]:
+    async def _query_prs(self, since: datetime | None = None, until: datetime | None = None) -> list[PR]:
         statement = select(PR).where(PR.user_id == self.user_id)
+        # Date ranges are served by the (user_id, performed_at) index.
+        if since is not None:
+            statement = statement.where(PR.performed_at >= _as_utc(since))
+        if until is not None:
+            statement = statement.where(PR.performed_at < _as_utc(until))
+        result = await self.session.exec(statement)
+        hot = list(result.all())
+        cold = archive.load(self.user_id)
+        if cold is None:
+            return hot
+        return archive.merge(hot, cold.rows(cold.between(since and _as_utc(since), until and _as_utc(until))))
+
+    async def get_volume(self, period: str, start: date | None = None, end: date | None = None) -> list[VolumeRollup]:
+        statement = select(VolumeRollup).where(
+            and_(VolumeRollup.user_id == self.user_id, VolumeRollup.period == period)
+        )
+        if start is not None:
+            statement = statement.where(VolumeRollup.bucket >= start)
+        if end is not None:
+            statement = statement.where(VolumeRollup.bucket <= end)
+        statement = statement.order_by(VolumeRollup.bucket, VolumeRollup.exercise)
         result = await self.session.exec(statement)
         return list(result.all())
 
     async def get_by_id(self, id: int) -> PR | None:
+        pr = await self._get_hot(id)
+        if pr is None:
+            cold = archive.load(self.user_id)
+            pr = cold.find(id) if cold is not None else None
+        return pr
+
+    async def _get_hot(self, id: int) -> PR | None:
         statement = select(PR).where(and_(PR.id == id, PR.user_id == self.user_id))
         result = await self.session.exec(statement)
         return result.first()
 
+    async def _get_writable(self, id: int) -> PR | None:
+        """The PR to change; archived PRs are read-only and raise."""
+        pr = await self._get_hot(id)
+        if pr is None:
+            cold = archive.load(self.user_id)
+            if cold is not None and cold.find(id) is not None:
+                raise PRArchivedError(id)
+        return pr
+
     async def create(self, data: PRCreate) -> PR:
-        pr = PR(**data.model_dump(), user_id=self.user_id)
-        self.session.add(pr)
-        await self.session.flush()
+        pr = await self._insert(data)
         await self.sync_achievements(commit=False)
         await self.session.commit()
+        await self._after_commit()
         await self.session.refresh(pr)
         return pr
 
     async def update(self, id: int, data: PRUpdate) -> PR | None:
-        pr = await self.get_by_id(id)
+        pr = await self._apply_update(id, data)
         if not pr:
             return None
-        
+
+        await self.sync_achievements(commit=False)
+        await self.session.commit()
+        await self._after_commit()
+        await self.session.refresh(pr)
+        return pr
+
+    async def delete(self, id: int) -> bool:
+        if not await self._remove(id):
+            return False
+
+        await self.sync_achievements(commit=False)
+        await self.session.commit()
+        await self._after_commit()
+        return True
+
+    async def apply_batch(self, operations: list[PRBatchOperation]) -> list[PRBatchResult]:
+        """Apply operations in order inside one transaction.
+
+        Milestones are recomputed once and the batch commits once. If any
+        operation targets a missing PR, nothing is written.
+        """
+        results = []
+        try:
+            for index, operation in enumerate(operations):
+                if operation.op == "create":
+                    pr = await self._insert(operation.data)
+                    results.append(PRBatchResult(index=index, op="create", status=201, pr=pr))
+                elif operation.op == "update":
+                    pr = await self._apply_update(operation.id, operation.data)
+                    if not pr:
+                        raise PRNotFoundError(index)
+                    results.append(PRBatchResult(index=index, op="update", status=200, pr=pr))
+                else:
+                    if not await self._remove(operation.id):
+                        raise PRNotFoundError(index)
+                    results.append(PRBatchResult(index=index, op="delete", status=204))
+
+            await self.sync_achievements(commit=False)
+            await self.session.commit()
+        except Exception:
+            await self.session.rollback()
+            self._pending_events.clear()
+            raise
+        await self._after_commit()
+        return results
+
+    async def _insert(self, data: PRCreate) -> PR:
+        (pr,) = await insert_prs(self.session, [(self.user_id, data)])
+        self._pending_events.append({"type": "pr_created", "seq": pr.seq, "pr": pr.model_dump(mode="json")})
+        return pr
+
+    async def _apply_update(self, id: int, data: PRUpdate) -> PR | None:
+        pr = await self._get_writable(id)
+        if not pr:
+            return None
+
+        previous = PR(**pr.model_dump())
+        seq = await self._next_seq()
+        exercises = {pr.exercise} if data.exercise is None else {pr.exercise, data.exercise}
+        bests = await percentiles.user_bests(
+            self.session, {(self.user_id, percentiles.normalize_exercise(e)) for e in exercises}
+        )
+
         pr_data = data.model_dump(exclude_unset=True)
         for key, value in pr_data.items():
             setattr(pr, key, value)
-            
+        pr.seq = seq
+
         self.session.add(pr)
         await self.session.flush()
-        await self.sync_achievements(commit=False)
-        await self.session.commit()
-        await self.session.refresh(pr)
+        if pr.model_dump() != previous.model_dump():
+            await rollups.apply_prs(self.session, [previous], sign=-1)
+            await rollups.apply_prs(self.session, [pr])
+            await percentiles.apply_bests(self.session, bests)
+        self._pending_events.append({"type": "pr_updated", "seq": pr.seq, "pr": pr.model_dump(mode="json")})
         return pr
 
-    async def delete(self, id: int) -> bool:
-        pr = await self.get_by_id(id)
+    async def _remove(self, id: int) -> bool:
+        pr = await self._get_writable(id)
         if not pr:
             return False
-            
+
+        await rollups.apply_prs(self.session, [pr], sign=-1)
+        seq = await self._next_seq()
+        bests = await percentiles.user_bests(
+            self.session, {(self.user_id, percentiles.normalize_exercise(pr.exercise))}
+        )
+        tombstone = sqlite_insert(PRTombstone).values(user_id=self.user_id, pr_id=pr.id, seq=seq)
+        # Row ids can be reused after a delete, so a PR may be tombstoned twice.
+        await self.session.execute(tombstone.on_conflict_do_update(
+            index_elements=["user_id", "pr_id"],
+            set_={"seq": tombstone.excluded.seq, "deleted_at": tombstone.excluded.deleted_at},
+        ))
         await self.session.delete(pr)
         await self.session.flush()
-        await self.sync_achievements(commit=False)
-        await self.session.commit()
+        await percentiles.apply_bests(self.session, bests)
+        self._pending_events.append({"type": "pr_deleted", "seq": seq, "id": id})
         return True
 
-    async def get_milestones(self) -> list[MilestoneRead]:
-        await self.sync_achievements(commit=True)
-        
-        statement_stats = select(
-            func.count(PR.id).label("total_prs"),
-            func.max(PR.weight).label("max_weight"),
-            func.sum(PR.reps).label("total_reps")
-        ).where(PR.user_id == self.user_id)
-        stats_res = await self.session.execute(statement_stats)
-        stats = stats_res.mappings().one()
-        
-        async def get_max(exercise_name: str, exclude: str = None):
-            stmt = select(func.max(PR.weight)).where(
-                and_(
-                    PR.user_id == self.user_id,
-                    func.lower(PR.exercise).contains(exercise_name.lower())
-                )
+    async def _next_seq(self) -> int:
+        return (await reserve_seqs(self.session, {self.user_id: 1}))[self.user_id]
+
+    async def get_changes(self, since: int) -> PRChanges:
+        """PRs written and deleted after change `since`; since=0 is a full snapshot."""
+        seq_res = await self.session.exec(select(ChangeSequence.seq).where(ChangeSequence.user_id == self.user_id))
+        current = seq_res.first() or 0
+
+        upserts_stmt = select(PR).where(PR.user_id == self.user_id)
+        if since > 0:
+            upserts_stmt = upserts_stmt.where(PR.seq > since)
+        upserts = list((await self.session.exec(upserts_stmt.order_by(PR.seq))).all())
+        cold = archive.load(self.user_id)
+        if cold is not None:
+            changed = [i for i, seq in enumerate(cold.seqs) if seq > since]
+            upserts = sorted(archive.merge(upserts, cold.rows(changed)), key=lambda pr: pr.seq)
+
+        deletes = []
+        if since > 0:
+            tombstones_stmt = select(PRTombstone.pr_id).where(
+                and_(PRTombstone.user_id == self.user_id, PRTombstone.seq > since)
             )
-            if exclude:
-                stmt = stmt.where(func.lower(PR.exercise).contains(exclude.lower()) == False)
-            res = await self.session.execute(stmt)
-            val = res.scalar()
-            return float(val) if val is not None else 0.0
-
-        defs = {
-            "novice": {"title": "Novice Lifter", "desc": "Log your first Personal Record", "target": 1, "unit": "PR", "val": stats["total_prs"]},
-            "gains": {"title": "Gains Seeker", "desc": "Log 5 Personal Records", "target": 5, "unit": "PRs", "val": stats["total_prs"]},
-            "destroyer": {"title": "Destroyer of Weakness", "desc": "Log 10 Personal Records", "target": 10, "unit": "PRs", "val": stats["total_prs"]},
-            "chest-pounder": {"title": "Chest Pounder", "desc": "Bench Press 100kg", "target": 100, "unit": "kg", "val": await get_max("bench press", "incline")},
-            "squat-king": {"title": "The Squat King", "desc": "Squat 120kg", "target": 120, "unit": "kg", "val": await get_max("squat")},
-            "earth-shaker": {"title": "Earth Shaker", "desc": "Deadlift 150kg", "target": 150, "unit": "kg", "val": await get_max("deadlift", "romanian")},
-            "shoulder-titan": {"title": "Shoulder Titan", "desc": "Overhead Press 60kg", "target": 60, "unit": "kg", "val": await get_max("overhead press")},
-            "wing-master": {"title": "Wing Master", "desc": "Weighted Pull Up 20kg", "target": 20, "unit": "kg", "val": await get_max("pull up")},
-            "back-builder": {"title": "Back Builder", "desc": "Barbell Row 80kg", "target": 80, "unit": "kg", "val": await get_max("barbell row")},
-            "incline-ace": {"title": "Incline Ace", "desc": "Incline Bench 90kg", "target": 90, "unit": "kg", "val": await get_max("incline bench")},
-            "dip-demon": {"title": "Dip Demon", "desc": "Weighted Dips 40kg", "target": 40, "unit": "kg", "val": await get_max("dips")},
-            "hinge-master": {"title": "Hinge Master", "desc": "Romanian Deadlift 100kg", "target": 100, "unit": "kg", "val": await get_max("romanian deadlift")},
-            "leg-press-lord": {"title": "Leg Press Lord", "desc": "Leg Press 300kg", "target": 300, "unit": "kg", "val": await get_max("leg press")},
-            "century": {"title": "Century Club", "desc": "Hit 100kg in any lift", "target": 100, "unit": "kg", "val": stats["max_weight"] or 0},
-            "double-century": {"title": "Double Century", "desc": "Hit 200kg in any lift", "target": 200, "unit": "kg", "val": stats["max_weight"] or 0},
-            "rep-king": {"title": "Rep King", "desc": "Log 100 total reps", "target": 100, "unit": "reps", "val": stats["total_reps"] or 0},
-        }
+            live_ids = {pr.id for pr in upserts}
+            deletes = [pr_id for pr_id in (await self.session.exec(tombstones_stmt)).all() if pr_id not in live_ids]
+
+        return PRChanges(seq=current, upserts=upserts, deletes=deletes)
+
+    async def _after_commit(self):
+        # Drop this user's cached views in every API process.
+        await cache.invalidate_user_views([self.user_id])
+        await self._publish_events()
+
+    async def _publish_events(self):
+        if self._pending_events:
+            pending, self._pending_events = self._pending_events, []
+            await events.broker.publish(self.user_id, pending)
+
+    async def get_milestones(self) -> list[MilestoneRead]:
+        cached = cache.milestones.get(self.user_id)
+        if cached is not None:
+            return cached
+        version = cache.milestones.version(self.user_id)
+        result = await cache.milestone_views.get_or_load(self.user_id, self._build_milestones)
+        cache.milestones.set(self.user_id, result, version=version)
+        return result
+
+    async def _build_milestones(self) -> list[MilestoneRead]:
+        progress = await self._progress()
+        await self.sync_achievements(commit=True, progress=progress)
 
         existing_res = await self.session.exec(select(Milestone).where(Milestone.user_id == self.user_id))
         unlocked = {m.name: m.unlocked_at for m in existing_res.all()}
 
-        return [
+        result = [
             MilestoneRead(
                 name=k,
                 is_unlocked=k in unlocked,
                 unlocked_at=unlocked.get(k),
-                progress=float(min(v["val"], v["target"])),
+                progress=float(min(progress[k] or 0, v["target"])),
                 target=float(v["target"]),
                 title=v["title"],
                 description=v["desc"],
                 unit=v["unit"]
-            ) for k, v in defs.items()
+            ) for k, v in MILESTONES.items()
         ]
+        return result
 
-    async def sync_achievements(self, commit: bool = True):
-        stmt_stats = select(
-            func.count(PR.id).label("total_prs"),
-            func.max(PR.weight).label("max_weight"),
-            func.sum(PR.reps).label("total_reps")
-        ).where(PR.user_id == self.user_id)
-        stats_res = await self.session.execute(stmt_stats)
-        stats = stats_res.mappings().one()
-        
-        async def get_max(ex: str, exc: str = None):
-            s = select(func.max(PR.weight)).where(
-                and_(
-                    PR.user_id == self.user_id,
-                    func.lower(PR.exercise).contains(ex.lower())
-                )
-            )
-            if exc: s = s.where(func.lower(PR.exercise).contains(exc.lower()) == False)
-            res = await self.session.execute(s)
-            return res.scalar() or 0
-
-        conditions = {
-            "novice": (stats["total_prs"] or 0) >= 1,
-            "gains": (stats["total_prs"] or 0) >= 5,
-            "destroyer": (stats["total_prs"] or 0) >= 10,
-            "chest-pounder": (await get_max("bench press", "incline")) >= 100,
-            "squat-king": (await get_max("squat")) >= 120,
-            "earth-shaker": (await get_max("deadlift", "romanian")) >= 150,
-            "shoulder-titan": (await get_max("overhead press")) >= 60,
-            "wing-master": (await get_max("pull up")) >= 20,
-            "back-builder": (await get_max("barbell row")) >= 80,
-            "incline-ace": (await get_max("incline bench")) >= 90,
-            "dip-demon": (await get_max("dips")) >= 40,
-            "hinge-master": (await get_max("romanian deadlift")) >= 100,
-            "leg-press-lord": (await get_max("leg press")) >= 300,
-            "century": (stats["max_weight"] or 0) >= 100,
-            "double-century": (stats["max_weight"] or 0) >= 200,
-            "rep-king": (stats["total_reps"] or 0) >= 100,
-        }
+    async def _progress(self):
+        statement = select(*progress_columns()).where(PR.user_id == self.user_id)
+        result = await self.session.execute(statement)
+        return with_archive(result.mappings().one(), self.user_id)
+
+    async def sync_achievements(self, commit: bool = True, progress=None):
+        if progress is None:
+            progress = await self._progress()
+        unlocked = unlocked_names(progress)
 
         existing_stmt = select(Milestone).where(Milestone.user_id == self.user_id)
         existing_res = await self.session.exec(existing_stmt)
         existing_milestones = existing_res.all()
         existing_map = {m.name: m for m in existing_milestones}
 
-        for name, cond in conditions.items():
-            if cond and name not in existing_map:
-                self.session.add(Milestone(name=name, user_id=self.user_id))
+        for name in unlocked - existing_map.keys():
+            self.session.add(Milestone(name=name, user_id=self.user_id))
+            self._pending_events.append({"type": "milestone_unlocked", "name": name})
 
         for name, milestone in existing_map.items():
-            cond = conditions.get(name, False)
-            if not cond:
+            if name not in unlocked:
                 await self.session.delete(milestone)
+                self._pending_events.append({"type": "milestone_revoked", "name": name})
         
         if commit:
             await self.session.commit()
+            await self._publish_events()
         else:
             await self.session.flush()
@@ -0,0 +1,90 @@
+from datetime import date, datetime, timedelta
+from sqlalchemy import delete, func, insert, literal
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import select, and_
+from app.models import PR, VolumeRollup
+
+PERIODS = ("day", "week", "month")
+
+def bucket_start(performed_at: datetime, period: str) -> date:
+    day = performed_at.date()
+    if period == "week":
+        return day - timedelta(days=day.weekday())
+    if period == "month":
+        return day.replace(day=1)
+    return day
+
+def _bucket_expression(period: str):
+    # SQLite equivalents of bucket_start(); weeks start on Monday.
+    if period == "week":
+        return func.date(PR.performed_at, "weekday 0", "-6 days")
+    if period == "month":
+        return func.date(PR.performed_at, "start of month")
+    return func.date(PR.performed_at)
+
+async def apply_prs(session, prs: list[PR], sign: int = 1):
+    """Add (sign=1) or remove (sign=-1) the PRs' volume in every period.
+
+    Deltas are summed per row first, so any number of PRs costs a single
+    multi-row upsert.
+    """
+    deltas: dict[tuple, list] = {}
+    for pr in prs:
+        for period in PERIODS:
+            key = (pr.user_id, period, bucket_start(pr.performed_at, period), pr.exercise)
+            delta = deltas.setdefault(key, [0, 0, 0.0])
+            delta[0] += sign
+            delta[1] += sign * pr.reps
+            delta[2] += sign * pr.weight * pr.reps
+    if not deltas:
+        return
+
+    statement = sqlite_insert(VolumeRollup).values([
+        {"user_id": u, "period": p, "bucket": b, "exercise": e, "sets": sets, "reps": reps, "tonnage": tonnage}
+        for (u, p, b, e), (sets, reps, tonnage) in deltas.items()
+    ])
+    statement = statement.on_conflict_do_update(
+        index_elements=["user_id", "period", "bucket", "exercise"],
+        set_={
+            "sets": VolumeRollup.sets + statement.excluded.sets,
+            "reps": VolumeRollup.reps + statement.excluded.reps,
+            "tonnage": VolumeRollup.tonnage + statement.excluded.tonnage,
+        },
+    )
+    await session.execute(statement)
+
+    if sign < 0:
+        user_ids = {pr.user_id for pr in prs}
+        await session.execute(
+            delete(VolumeRollup).where(and_(VolumeRollup.user_id.in_(user_ids), VolumeRollup.sets <= 0))
+        )
+
+def rebuild_statements(user_ids: list[int] | None = None) -> list:
+    """Statements that recompute rollups from the PR table.
+
+    Limited to user_ids when given, so large rebuilds can run chunk by chunk.
+    """
+    clear = delete(VolumeRollup)
+    if user_ids is not None:
+        clear = clear.where(VolumeRollup.user_id.in_(user_ids))
+    statements = [clear]
+
+    for period in PERIODS:
+        bucket = _bucket_expression(period)
+        source = select(
+            PR.user_id,
+            literal(period),
+            bucket,
+            PR.exercise,
+            func.count(PR.id),
+            func.sum(PR.reps),
+            func.sum(PR.weight * PR.reps),
+        ).group_by(PR.user_id, bucket, PR.exercise)
+        if user_ids is not None:
+            source = source.where(PR.user_id.in_(user_ids))
+        statements.append(
+            insert(VolumeRollup).from_select(
+                ["user_id", "period", "bucket", "exercise", "sets", "reps", "tonnage"], source
+            )
+        )
+    return statements
@@ -0,0 +1,116 @@
+import asyncio
+import zlib
+from typing import Awaitable, Callable, TypeVar
+from sqlalchemy import delete, update
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app import archive, cache, db, percentiles
+from app.models import PR, ChangeSequence, Milestone, PRTombstone, User, VolumeRollup
+
+T = TypeVar("T")
+
+# Tables holding per-user data; these live on the user's shard. Everything
+# keyed by user except StrengthBucket, which each shard keeps for its own
+# users and readers merge (see percentiles.get_sketch).
+USER_TABLES = (PR, PRTombstone, ChangeSequence, VolumeRollup, Milestone)
+
+# Modules, not names, are imported from app: app.db imports app.percentiles,
+# which imports this module, so neither is fully loaded at import time.
+
+def count() -> int:
+    return len(db.engines)
+
+def shard_for(user_id: int) -> int:
+    """Home shard for a new user. Stored on the user, so it never changes
+    when shards are added; scripts/rebalance_shards.py moves existing users."""
+    return zlib.crc32(user_id.to_bytes(8, "big")) % count()
+
+def session(shard: int) -> AsyncSession:
+    return AsyncSession(db.engines[shard], expire_on_commit=False)
+
+async def fan_out(fn: Callable[[int, AsyncEngine], Awaitable[T]]) -> list[T]:
+    """Run fn(shard, engine) on every shard concurrently; results in shard order."""
+    return await asyncio.gather(*(fn(shard, engine) for shard, engine in enumerate(db.engines)))
+
+async def move_user(user_id: int, target: int) -> dict:
+    """Copy a user's rows to `target`, repoint the user, then delete the originals.
+
+    The copy runs inside a write transaction on the source shard, so it is
+    consistent; writes the user makes on another API process mid-move wait
+    for it, but a write already routed to the old shard may still land there
+    after the switch. Move users while they are idle (or with the API down).
+    PR ids that are taken on the target are renumbered: the old id is
+    tombstoned and the row gets a new id and change number, so syncing
+    clients see a delete plus a create.
+    """
+    async with session(0) as directory:
+        user = await directory.get(User, user_id)
+    if user is None:
+        raise LookupError(f"User {user_id} not found")
+    source = user.shard
+    stats = {"user_id": user_id, "source": source, "target": target, "prs": 0, "renumbered": 0}
+    if source == target:
+        return stats
+
+    async with session(source) as src, session(target) as dst:
+        # Take the source's writer lock first: the user's rows cannot change
+        # between the copy and the delete below.
+        await src.execute(update(ChangeSequence).where(ChangeSequence.user_id == user_id).values(seq=ChangeSequence.seq))
+        rows = {table: list((await src.exec(select(table).where(table.user_id == user_id))).all()) for table in USER_TABLES}
+        exercises = {percentiles.normalize_exercise(pr.exercise) for pr in rows[PR]}
+        src_bests = await percentiles.user_bests(src, {(user_id, e) for e in exercises})
+
+        # Clear anything a previous, interrupted move left on the target.
+        leftover = list((await dst.exec(select(PR.exercise).where(PR.user_id == user_id))).all())
+        keys = {(user_id, e) for e in exercises | {percentiles.normalize_exercise(e) for e in leftover}}
+        dst_bests = await percentiles.user_bests(dst, keys)
+        for table in USER_TABLES:
+            await dst.execute(delete(table).where(table.user_id == user_id))
+
+        taken = set()
+        if rows[PR]:
+            taken = set((await dst.exec(select(PR.id).where(PR.id.in_([pr.id for pr in rows[PR]])))).all())
+        seq = rows[ChangeSequence][0].seq if rows[ChangeSequence] else 0
+        if taken:
+            seq += 1
+        copies = {table: [table(**row.model_dump()) for row in rows[table]] for table in USER_TABLES}
+        renumbered = [pr for pr in copies[PR] if pr.id in taken]
+        tombstones = {t.pr_id: t for t in copies[PRTombstone]}
+        for pr in renumbered:
+            tombstones[pr.id] = PRTombstone(user_id=user_id, pr_id=pr.id, seq=seq)
+            pr.id, pr.seq = None, seq
+        copies[PRTombstone] = list(tombstones.values())
+        copies[ChangeSequence] = [ChangeSequence(user_id=user_id, seq=seq)] if seq else []
+        # Rows keeping their ids go first, so new ids are allocated above
+        # them, and above the user's archived ids, which the target's id
+        # sequence has never seen.
+        dst.add_all([pr for pr in copies[PR] if pr.id is not None])
+        for table in USER_TABLES[1:]:
+            dst.add_all(copies[table])
+        await dst.flush()
+        cold = archive.load(user_id)
+        if cold is not None:
+            await archive.reserve_ids(dst, cold.max_id)
+        dst.add_all(renumbered)
+        await dst.flush()
+        await percentiles.apply_bests(dst, dst_bests)
+        await dst.commit()
+
+        # The source shard 0 is the directory itself, and src holds its lock.
+        if source == 0:
+            await src.execute(update(User).where(User.id == user_id).values(shard=target))
+        else:
+            async with session(0) as directory:
+                await directory.execute(update(User).where(User.id == user_id).values(shard=target))
+                await directory.commit()
+
+        for table in USER_TABLES:
+            await src.execute(delete(table).where(table.user_id == user_id))
+        await percentiles.apply_bests(src, src_bests)
+        await src.commit()
+
+    await cache.bus.invalidate("users", user.username)
+    await cache.invalidate_user_views([user_id])
+    stats.update(prs=len(rows[PR]), renumbered=len(taken))
+    return stats
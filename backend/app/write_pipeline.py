@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import os
+from dataclasses import dataclass, field
+from app import cache, events, shards
+from app.milestones import sync_milestones
+from app.models import PR, PRCreate
+from app.repository import insert_prs
+
+logger = logging.getLogger(__name__)
+
+# GROUP_COMMIT=true routes POST /prs through a GroupCommitter. A batch is
+# committed once it has GROUP_COMMIT_MAX writes or its first write has
+# waited GROUP_COMMIT_WINDOW seconds.
+GROUP_COMMIT = os.getenv("GROUP_COMMIT", "false").lower() == "true"
+GROUP_COMMIT_WINDOW = float(os.getenv("GROUP_COMMIT_WINDOW", "0.005"))
+GROUP_COMMIT_MAX = int(os.getenv("GROUP_COMMIT_MAX", "64"))
+
+class CommitterClosed(RuntimeError):
+    """The committer is stopping; write directly instead."""
+
+@dataclass
+class _Write:
+    user_id: int
+    data: PRCreate
+    shard: int
+    future: asyncio.Future = field(default_factory=lambda: asyncio.get_running_loop().create_future())
+
+class GroupCommitter:
+    """Coalesces concurrent PR inserts into shared SQLite transactions.
+
+    SQLite admits one writer at a time, every commit is an fsync, and each
+    single write costs about ten statements. Here a single task drains a
+    queue and writes a whole batch, across users, with one statement per
+    step (see insert_prs), syncs all affected users' milestones in one
+    grouped pass, and commits once. If the batch fails, its writes are
+    retried one by one under savepoints so only the failing callers get
+    the error. A batch spanning shards commits once per shard.
+    """
+
+    def __init__(self, window: float = GROUP_COMMIT_WINDOW, max_batch: int = GROUP_COMMIT_MAX):
+        self.window = window
+        self.max_batch = max_batch
+        self._queue: asyncio.Queue[_Write | None] = asyncio.Queue()
+        self._task: asyncio.Task | None = None
+        self._closed = False
+
+    async def start(self):
+        self._closed = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # Refuse new writes, commit whatever is queued, then exit.
+        self._closed = True
+        if self._task is not None:
+            self._queue.put_nowait(None)
+            await self._task
+        self._task = None
+
+    async def submit(self, user_id: int, data: PRCreate, shard: int = 0) -> PR:
+        if self._closed:
+            raise CommitterClosed()
+        write = _Write(user_id, data, shard)
+        # No await between the check and the put: nothing can be queued
+        # behind the stop sentinel.
+        self._queue.put_nowait(write)
+        return await write.future
+
+    async def _run(self):
+        try:
+            await self._drain()
+        finally:
+            # Nobody reads the queue any more; fail what is left rather than
+            # leave its callers waiting forever.
+            while not self._queue.empty():
+                write = self._queue.get_nowait()
+                if write is not None and not write.future.done():
+                    write.future.set_exception(CommitterClosed())
+
+    async def _drain(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is None:
+                break
+            batch = [first]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch:
+                try:
+                    async with asyncio.timeout_at(deadline):
+                        write = await self._queue.get()
+                except TimeoutError:
+                    break
+                if write is None:
+                    stopping = True
+                    break
+                batch.append(write)
+            groups: dict[int, list[_Write]] = {}
+            for write in batch:
+                groups.setdefault(write.shard, []).append(write)
+            # Each shard has its own writer lock, so their commits overlap.
+            await asyncio.gather(*(self._commit_shard(shard, writes) for shard, writes in groups.items()))
+
+    async def _commit_shard(self, shard: int, batch: list[_Write]):
+        try:
+            await self._commit(shard, batch)
+        except Exception as e:
+            logger.exception("Group commit failed", extra={"shard": shard, "writes": len(batch)})
+            for write in batch:
+                if not write.future.done():
+                    write.future.set_exception(e)
+
+    async def _commit(self, shard: int, batch: list[_Write]):
+        async with shards.session(shard) as session:
+            try:
+                async with session.begin_nested():
+                    prs = await insert_prs(session, [(write.user_id, write.data) for write in batch])
+                applied = list(zip(batch, prs))
+            except Exception:
+                # Find the bad write(s): retry one by one, each under its own
+                # SAVEPOINT, so only the failing callers get an error.
+                applied = []
+                for write in batch:
+                    try:
+                        async with session.begin_nested():
+                            (pr,) = await insert_prs(session, [(write.user_id, write.data)])
+                    except Exception as e:
+                        if not write.future.done():
+                            write.future.set_exception(e)
+                    else:
+                        applied.append((write, pr))
+
+            if not applied:
+                return
+            user_ids = sorted({write.user_id for write, _ in applied})
+            changes = await sync_milestones(session, user_ids)
+            await session.commit()
+
+        pending: dict[int, list[dict]] = {}
+        for write, pr in applied:
+            pending.setdefault(write.user_id, []).append(
+                {"type": "pr_created", "seq": pr.seq, "pr": pr.model_dump(mode="json")}
+            )
+        for user_id, (unlocked, revoked) in changes.items():
+            pending[user_id].extend({"type": "milestone_unlocked", "name": name} for name in unlocked)
+            pending[user_id].extend({"type": "milestone_revoked", "name": name} for name in revoked)
+
+        await cache.invalidate_user_views(user_ids)
+        for user_id, user_events in pending.items():
+            await events.broker.publish(user_id, user_events)
+        for write, pr in applied:
+            if not write.future.done():
+                write.future.set_result(pr)
+
+committer: GroupCommitter | None = None
+
+async def start():
+    global committer
+    if GROUP_COMMIT:
+        committer = GroupCommitter()
+        await committer.start()
+
+async def stop():
+    global committer
+    # Unpublish first, so requests arriving while the queue drains write
+    # directly instead of queueing behind the stop.
+    stopping, committer = committer, None
+    if stopping is not None:
+        await stopping.stop()
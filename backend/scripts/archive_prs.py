@@ -0,0 +1,39 @@
+import argparse
+import asyncio
+import sys
+import os
+from datetime import datetime, timedelta, timezone
+
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db import engines, init_db
+from app.archive import ARCHIVE_AFTER_DAYS, ARCHIVE_DIR, archive_shard
+from app import shards
+
+def print_progress(shard: int, stats: dict):
+    print(f"shard {shard}: {stats['users']}/{stats['total']} users, {stats['archived']} PRs archived")
+
+async def main():
+    parser = argparse.ArgumentParser(description="Move old PRs from the PR table into per-user archive files.")
+    parser.add_argument(
+        "--older-than", type=int, default=ARCHIVE_AFTER_DAYS,
+        help=f"archive PRs performed more than this many days ago (default {ARCHIVE_AFTER_DAYS})",
+    )
+    args = parser.parse_args()
+    cutoff = datetime.now(timezone.utc) - timedelta(days=args.older_than)
+
+    await init_db()
+
+    print(f"Archiving PRs performed before {cutoff:%Y-%m-%d} into {ARCHIVE_DIR}...")
+    results = await shards.fan_out(lambda shard, engine: archive_shard(
+        engine, cutoff, on_progress=lambda stats: print_progress(shard, stats)
+    ))
+    # Reads merge hot and archived rows, so cached views stay valid as is.
+    print(f"Done: {sum(s['archived'] for s in results)} PRs from {sum(s['users'] for s in results)} users.")
+
+    for engine in engines:
+        await engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
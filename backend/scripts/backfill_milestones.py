@@ -0,0 +1,46 @@
+import argparse
+import asyncio
+import sys
+import os
+
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db import engines, init_db
+from app.milestones import backfill_milestones
+from app import cache, redis_client, shards
+
+def print_progress(shard: int, stats: dict):
+    rate = stats["users"] / stats["elapsed"] if stats["elapsed"] else 0.0
+    print(
+        f"shard {shard}: {stats['users']}/{stats['total']} users "
+        f"(+{stats['inserted']} / -{stats['deleted']} milestones) "
+        f"{rate:,.0f} users/s"
+    )
+
+async def main():
+    parser = argparse.ArgumentParser(description="Recompute milestones for all users.")
+    parser.add_argument("--chunk-size", type=int, default=500, help="users per transaction")
+    args = parser.parse_args()
+
+    await init_db()
+    # Publish invalidations so running API processes drop stale milestone views.
+    await cache.bus.start(await redis_client.connect())
+
+    print(f"Backfilling milestones on {shards.count()} shard(s)...")
+    # Shards have separate writer locks, so they are backfilled in parallel.
+    results = await shards.fan_out(lambda shard, engine: backfill_milestones(
+        engine, chunk_size=args.chunk_size, on_progress=lambda stats: print_progress(shard, stats)
+    ))
+    print(
+        f"Done: {sum(s['users'] for s in results)} users in {max(s['elapsed'] for s in results):.1f}s, "
+        f"{sum(s['inserted'] for s in results)} unlocked, {sum(s['deleted'] for s in results)} revoked."
+    )
+
+    await cache.bus.stop()
+    await redis_client.close()
+    for engine in engines:
+        await engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,82 @@
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+
+# Measures the two costs a fresh API replica pays before serving traffic:
+# importing app.main, and running the FastAPI lifespan (schema check/creation).
+# Each sample runs in a new interpreter so module caches do not skew results.
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_PROBE = """
+import sys, time
+start = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - start
+heavy = [m for m in ("app.ai_coach", "httpx", "dotenv") if m in sys.modules]
+print(f"{elapsed:.6f} {','.join(heavy) or '-'}")
+"""
+
+STARTUP_PROBE = """
+import asyncio, time
+from app.main import app, lifespan
+from app.db import engine
+
+async def run():
+    start = time.perf_counter()
+    async with lifespan(app):
+        elapsed = time.perf_counter() - start
+    await engine.dispose()
+    print(f"{elapsed:.6f}")
+
+asyncio.run(run())
+"""
+
+def sample(probe: str) -> list[str]:
+    result = subprocess.run(
+        [sys.executable, "-c", probe],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return result.stdout.split()
+
+def report(name: str, timings: list[float]):
+    timings = sorted(timings)
+    print(
+        f"{name:<10} median {statistics.median(timings) * 1000:8.2f} ms   "
+        f"min {timings[0] * 1000:8.2f} ms   max {timings[-1] * 1000:8.2f} ms"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark API import and startup time.")
+    parser.add_argument("-n", "--runs", type=int, default=10, help="samples per measurement")
+    args = parser.parse_args()
+
+    # Make sure the schema exists so startup measures the steady-state path.
+    asyncio.run(_ensure_schema())
+
+    import_times, heavy = [], set()
+    for _ in range(args.runs):
+        elapsed, loaded = sample(IMPORT_PROBE)
+        import_times.append(float(elapsed))
+        heavy.update(m for m in loaded.split(",") if m != "-")
+
+    startup_times = [float(sample(STARTUP_PROBE)[0]) for _ in range(args.runs)]
+
+    report("import", import_times)
+    report("lifespan", startup_times)
+    print(f"Heavy modules loaded by import: {', '.join(sorted(heavy)) or 'none'}")
+
+async def _ensure_schema():
+    sys.path.insert(0, BACKEND_DIR)
+    from app.db import engine, init_db
+    await init_db()
+    await engine.dispose()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+import asyncio
+import sys
+import os
+
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db import SCHEMA_VERSION, engines, get_schema_version, migrate
+
+async def main():
+    for shard, engine in enumerate(engines):
+        current = await get_schema_version(engine)
+        if current >= SCHEMA_VERSION:
+            print(f"Shard {shard}: schema is up to date (version {current}).")
+        else:
+            print(f"Shard {shard}: migrating schema from version {current} to {SCHEMA_VERSION}...")
+            await migrate(engine)
+            print(f"Shard {shard}: migration complete.")
+
+        await engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
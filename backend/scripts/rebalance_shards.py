@@ -0,0 +1,60 @@
+import argparse
+import asyncio
+import sys
+import os
+
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlmodel import select
+from app.db import engines, init_db
+from app.models import User
+from app import cache, redis_client, shards
+
+async def main():
+    parser = argparse.ArgumentParser(
+        description="Move users between shards (SHARD_URLS). Run while the users being moved are idle."
+    )
+    parser.add_argument("--user", type=int, help="id of a single user to move (needs --to)")
+    parser.add_argument("--to", type=int, help="target shard for --user")
+    parser.add_argument(
+        "--all", action="store_true",
+        help="move every user whose shard differs from the hash of their id (e.g. after adding shards)",
+    )
+    parser.add_argument("--dry-run", action="store_true", help="only print the planned moves")
+    args = parser.parse_args()
+    if (args.user is None) == (not args.all) or (args.user is not None and args.to is None):
+        parser.error("use either --user ID --to SHARD, or --all")
+    if args.to is not None and not 0 <= args.to < shards.count():
+        parser.error(f"--to must be between 0 and {shards.count() - 1}")
+
+    await init_db()
+    # Publish invalidations so running API processes pick up the new shard.
+    await cache.bus.start(await redis_client.connect())
+
+    if args.user is not None:
+        moves = [(args.user, args.to)]
+    else:
+        async with shards.session(0) as session:
+            result = await session.exec(select(User.id, User.shard).order_by(User.id))
+            moves = [(user_id, shards.shard_for(user_id)) for user_id, shard in result.all()
+                     if shard != shards.shard_for(user_id)]
+
+    print(f"{len(moves)} user(s) to move across {shards.count()} shard(s).")
+    for user_id, target in moves:
+        if args.dry_run:
+            print(f"user {user_id} -> shard {target}")
+            continue
+        stats = await shards.move_user(user_id, target)
+        print(
+            f"user {user_id}: shard {stats['source']} -> {stats['target']}, "
+            f"{stats['prs']} PRs ({stats['renumbered']} renumbered)"
+        )
+
+    await cache.bus.stop()
+    await redis_client.close()
+    for engine in engines:
+        await engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,28 @@
+import asyncio
+import sys
+import os
+import time
+
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db import engines, init_db
+from app.percentiles import rebuild
+from app import shards
+
+async def main():
+    await init_db()
+    start = time.perf_counter()
+
+    async def rebuild_shard(shard, engine):
+        # Each shard's buckets count its own users; readers merge them.
+        async with engine.begin() as conn:
+            await rebuild(conn)
+
+    await shards.fan_out(rebuild_shard)
+    print(f"Strength percentiles rebuilt on {shards.count()} shard(s) in {time.perf_counter() - start:.2f}s.")
+    for engine in engines:
+        await engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,55 @@
+import argparse
+import asyncio
+import sys
+import os
+import time
+
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import union
+from sqlmodel import select
+from app.db import engines, init_db
+from app.models import PR, VolumeRollup
+from app.rollups import apply_prs, rebuild_statements
+from app import archive, shards
+
+async def main():
+    parser = argparse.ArgumentParser(description="Rebuild training volume rollups from the PR table.")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="users per transaction")
+    args = parser.parse_args()
+
+    await init_db()
+    start = time.perf_counter()
+    # Users with PRs or rollups on a shard; only the main database has users.
+    users = union(select(PR.user_id), select(VolumeRollup.user_id)).subquery()
+
+    async def rebuild_shard(shard, engine):
+        last_id, done = 0, 0
+        while True:
+            async with engine.begin() as conn:
+                result = await conn.execute(
+                    select(users.c.user_id).where(users.c.user_id > last_id)
+                    .order_by(users.c.user_id).limit(args.chunk_size)
+                )
+                user_ids = list(result.scalars().all())
+                if not user_ids:
+                    break
+                for statement in rebuild_statements(user_ids):
+                    await conn.execute(statement)
+                # Archived PRs are no longer in the PR table; add them back.
+                for user_id in user_ids:
+                    cold = archive.load(user_id)
+                    if cold is not None:
+                        await apply_prs(conn, cold.rows())
+            last_id = user_ids[-1]
+            done += len(user_ids)
+            print(f"Shard {shard}: rebuilt rollups for {done} users ({done / (time.perf_counter() - start):,.0f} users/s)")
+
+    await shards.fan_out(rebuild_shard)
+    print("Rollups rebuilt.")
+    for engine in engines:
+        await engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
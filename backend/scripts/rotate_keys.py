@@ -1,25 +1,52 @@
+import argparse
 import os
 import secrets
+import sys
+import time
 from pathlib import Path
 
-def rotate_secret():
-    
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.auth import ACCESS_TOKEN_EXPIRE_MINUTES, JWT_ENV_FILE, parse_keys, read_settings
+
+def rotate_secret(keep: int):
+    # Current keys (falling back to JWT_SECRET / the development key), so
+    # tokens signed before the first rotation stay valid too.
+    keys, _ = parse_keys(read_settings())
+    kid = time.strftime("k%Y%m%d%H%M%S")
     new_key = secrets.token_urlsafe(32)
-    print(f"Generated new Secret Key: {new_key}")
-    
-    env_path = Path(".env")
-    if env_path.exists():
-        lines = env_path.read_text().splitlines()
-        new_lines = []
-        for line in lines:
-            if line.startswith("JWT_SECRET="):
-                new_lines.append(f"JWT_SECRET={new_key}")
-            else:
-                new_lines.append(line)
-        env_path.write_text("\n".join(new_lines))
-        print("Updated .env with new JWT_SECRET")
-    else:
-        print("No .env file found. Please create one with JWT_SECRET=...")
+    keys[kid] = new_key
+    # Older keys are dropped; tokens they signed stop verifying.
+    kept = list(keys.items())[-keep:]
+    print(f"Generated new signing key {kid}; keeping {', '.join(k for k, _ in kept)}")
+
+    settings = {
+        "JWT_KEYS": ",".join(f"{k}:{secret}" for k, secret in kept),
+        "JWT_ACTIVE_KID": kid,
+    }
+    env_path = Path(JWT_ENV_FILE)
+    lines = env_path.read_text().splitlines() if env_path.exists() else []
+    new_lines = []
+    for line in lines:
+        name = line.split("=", 1)[0].strip()
+        if name in settings:
+            new_lines.append(f"{name}={settings.pop(name)}")
+        else:
+            new_lines.append(line)
+    new_lines.extend(f"{name}={value}" for name, value in settings.items())
+    env_path.write_text("\n".join(new_lines) + "\n")
+    print(f"Updated {env_path} with JWT_KEYS and JWT_ACTIVE_KID")
+    print("Apply it without a restart: POST /admin/keys/reload (all processes) or kill -HUP <api pid>.")
 
 if __name__ == "__main__":
-    rotate_secret()
+    parser = argparse.ArgumentParser(description="Add a new JWT signing key and make it the active one.")
+    parser.add_argument(
+        "--keep", type=int, default=2,
+        help=f"keys to keep, including the new one (tokens live {ACCESS_TOKEN_EXPIRE_MINUTES} minutes, "
+             "so rotate no more often than that per dropped key)",
+    )
+    args = parser.parse_args()
+    if args.keep < 2:
+        parser.error("--keep must be at least 2, or every outstanding token is invalidated")
+    rotate_secret(args.keep)
@@ -1,7 +1,17 @@
+import asyncio
 import pytest
 import time
 from httpx import AsyncClient, ASGITransport
 from app.main import app
+from app.db import engine, init_db
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    # ASGITransport does not run the app lifespan, so apply the schema here.
+    async def setup():
+        await init_db()
+        await engine.dispose()
+    asyncio.run(setup())
 
 @pytest.fixture
 async def client():
@@ -0,0 +1,59 @@
+from datetime import date, datetime, timedelta, timezone
+import pytest
+from app.rollups import bucket_start
+
+def test_bucket_start():
+    sunday = datetime(2025, 1, 5, 18, 30)
+    assert bucket_start(sunday, "day") == date(2025, 1, 5)
+    assert bucket_start(sunday, "week") == date(2024, 12, 30)
+    assert bucket_start(sunday, "month") == date(2025, 1, 1)
+
+@pytest.mark.anyio
+async def test_volume_tracks_writes(client, auth_header):
+    first = await client.post("/prs", json={"exercise": "Squat", "weight": 100, "reps": 5}, headers=auth_header)
+    await client.post("/prs", json={"exercise": "Squat", "weight": 110, "reps": 3}, headers=auth_header)
+    await client.post("/prs", json={"exercise": "Bench Press", "weight": 80, "reps": 5}, headers=auth_header)
+
+    response = await client.get("/analytics/volume?period=month", headers=auth_header)
+    assert response.status_code == 200
+    volume = {row["exercise"]: row for row in response.json()}
+    assert volume["Squat"]["sets"] == 2
+    assert volume["Squat"]["reps"] == 8
+    assert volume["Squat"]["tonnage"] == 830
+    assert volume["Bench Press"]["tonnage"] == 400
+
+    await client.put(f"/prs/{first.json()['id']}", json={"exercise": "Front Squat"}, headers=auth_header)
+    await client.delete(f"/prs/{first.json()['id']}", headers=auth_header)
+
+    volume = {row["exercise"]: row for row in (await client.get("/analytics/volume?period=day", headers=auth_header)).json()}
+    assert "Front Squat" not in volume
+    assert volume["Squat"]["sets"] == 1
+    assert volume["Squat"]["tonnage"] == 330
+
+@pytest.mark.anyio
+async def test_volume_rejects_unknown_period(client, auth_header):
+    response = await client.get("/analytics/volume?period=year", headers=auth_header)
+    assert response.status_code == 422
+
+@pytest.mark.anyio
+async def test_prs_date_range(client, auth_header):
+    await client.post("/prs", json={"exercise": "Deadlift", "weight": 140, "reps": 2}, headers=auth_header)
+    tomorrow = (datetime.now(timezone.utc) + timedelta(days=1)).date().isoformat()
+
+    assert len((await client.get("/prs", params={"until": "2000-01-01T00:00:00"}, headers=auth_header)).json()) == 0
+    assert len((await client.get("/prs", params={"until": tomorrow + "T00:00:00"}, headers=auth_header)).json()) == 1
+
+@pytest.mark.anyio
+async def test_rebuild_matches_incremental(client, auth_header):
+    from app.db import engine
+    from app.rollups import rebuild_statements
+
+    await client.post("/prs", json={"exercise": "Row", "weight": 60, "reps": 10}, headers=auth_header)
+    await client.post("/prs", json={"exercise": "Row", "weight": 70, "reps": 8}, headers=auth_header)
+    incremental = (await client.get("/analytics/volume?period=week", headers=auth_header)).json()
+
+    async with engine.begin() as conn:
+        for statement in rebuild_statements():
+            await conn.execute(statement)
+
+    assert (await client.get("/analytics/volume?period=week", headers=auth_header)).json() == incremental
@@ -0,0 +1,122 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+from sqlalchemy import update
+from sqlmodel import select
+from app import archive, percentiles, shards
+from app.models import PR
+
+@pytest.fixture(autouse=True)
+def archive_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", str(tmp_path))
+    archive._open.clear()
+    yield tmp_path
+    archive._open.clear()
+
+async def log(client, auth_header, exercise, weight, reps):
+    response = await client.post("/prs", json={"exercise": exercise, "weight": weight, "reps": reps}, headers=auth_header)
+    return response.json()
+
+async def backdate(ids, days):
+    async with shards.session(0) as session:
+        when = datetime.now(timezone.utc) - timedelta(days=days)
+        await session.execute(update(PR).where(PR.id.in_(ids)).values(performed_at=when))
+        await session.commit()
+
+async def archive_old(user_id, days=365):
+    async with shards.session(0) as session:
+        return await archive.archive_user(session, user_id, datetime.now(timezone.utc) - timedelta(days=days))
+
+def unlocked(milestones):
+    return {m["name"] for m in milestones if m["is_unlocked"]}
+
+@pytest.mark.anyio
+async def test_archived_prs_read_like_hot_ones(client, auth_header):
+    bench = await log(client, auth_header, "Bench Press", 100, 1)
+    squat = await log(client, auth_header, "Squat", 80, 5)
+    await log(client, auth_header, "Curl", 20, 10)
+    uid = bench["user_id"]
+    await backdate([bench["id"], squat["id"]], days=400)
+    before = sorted((await client.get("/prs", headers=auth_header)).json(), key=lambda pr: pr["id"])
+    milestones_before = unlocked((await client.get("/milestones", headers=auth_header)).json())
+
+    assert await archive_old(uid) == 2
+    async with shards.session(0) as session:
+        hot = (await session.exec(select(PR.exercise).where(PR.user_id == uid))).all()
+    assert hot == ["Curl"]
+
+    after = sorted((await client.get("/prs", headers=auth_header)).json(), key=lambda pr: pr["id"])
+    assert after == before
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=365)).isoformat()
+    old = (await client.get("/prs", params={"until": cutoff}, headers=auth_header)).json()
+    assert sorted(pr["exercise"] for pr in old) == ["Bench Press", "Squat"]
+    assert (await client.get(f"/prs/{bench['id']}", headers=auth_header)).json() == before[0]
+    changes = (await client.get("/prs/changes", headers=auth_header)).json()
+    assert len(changes["upserts"]) == 3
+
+    # Milestones and strength bests still count archived lifts, also after
+    # a new write recomputes them.
+    await log(client, auth_header, "Row", 50, 5)
+    assert unlocked((await client.get("/milestones", headers=auth_header)).json()) == milestones_before
+    async with shards.session(0) as session:
+        bests = await percentiles.user_bests(session, {(uid, "bench press")})
+    assert bests[(uid, "bench press")] == 100
+
+@pytest.mark.anyio
+async def test_archived_prs_are_read_only(client, auth_header):
+    pr = await log(client, auth_header, "Deadlift", 140, 3)
+    await log(client, auth_header, "Warmup", 20, 10)
+    await backdate([pr["id"]], days=400)
+    await archive_old(pr["user_id"])
+
+    response = await client.put(f"/prs/{pr['id']}", json={"weight": 150}, headers=auth_header)
+    assert response.status_code == 409
+    assert (await client.delete(f"/prs/{pr['id']}", headers=auth_header)).status_code == 409
+    response = await client.post(
+        "/prs/batch", json={"operations": [{"op": "delete", "id": pr["id"]}]}, headers=auth_header
+    )
+    assert response.status_code == 409
+    assert (await client.get(f"/prs/{pr['id']}", headers=auth_header)).json()["weight"] == 140
+
+@pytest.mark.anyio
+async def test_archive_runs_add_to_the_file(client, auth_header):
+    first = await log(client, auth_header, "Press", 40, 8)
+    second = await log(client, auth_header, "Press", 45, 6)
+    await log(client, auth_header, "Warmup", 20, 10)
+    uid = first["user_id"]
+    await backdate([first["id"]], days=500)
+    await backdate([second["id"]], days=400)
+
+    assert await archive_old(uid, days=450) == 1
+    assert await archive_old(uid, days=365) == 1
+    cold = archive.load(uid)
+    assert [cold.row(i).id for i in range(len(cold))] == [first["id"], second["id"]]
+    assert cold.exercises == [archive.ExerciseStats("Press", 2, 14, 45.0)]
+    since = datetime.now(timezone.utc) - timedelta(days=450)
+    assert [pr.id for pr in cold.rows(cold.between(since=since))] == [second["id"]]
+
+@pytest.mark.anyio
+async def test_archived_ids_are_not_reused(client, auth_header):
+    old = await log(client, auth_header, "Deadlift", 140, 3)
+    newest = await log(client, auth_header, "Warmup", 20, 10)
+    await backdate([old["id"]], days=400)
+    assert await archive_old(old["user_id"]) == 1
+
+    # The archived id is now above every row but the newest; with that gone
+    # too, a plain rowid table would hand it out again.
+    assert (await client.delete(f"/prs/{newest['id']}", headers=auth_header)).status_code == 204
+    fresh = await log(client, auth_header, "Squat", 100, 5)
+    assert fresh["id"] > newest["id"]
+    prs = (await client.get("/prs", headers=auth_header)).json()
+    assert sorted(pr["id"] for pr in prs) == [old["id"], fresh["id"]]
+
+@pytest.mark.anyio
+async def test_exercise_suggestions_include_archived_history(client, auth_header):
+    first = await log(client, auth_header, "Zercher Squat", 90, 5)
+    second = await log(client, auth_header, "Zercher Squat", 95, 5)
+    await log(client, auth_header, "Zottman Curl", 15, 10)
+    await backdate([first["id"], second["id"]], days=400)
+    assert await archive_old(first["user_id"]) == 2
+
+    response = await client.get("/exercises/suggest", params={"q": "z"}, headers=auth_header)
+    # Only archived now, and logged twice: ahead of the hot Zottman Curl.
+    assert response.json()[:2] == ["Zercher Squat", "Zottman Curl"]
@@ -0,0 +1,92 @@
+import asyncio
+import pytest
+from fakeredis import FakeServer
+from fakeredis.aioredis import FakeRedis
+from app.cache import InvalidationBus, LocalCache
+
+def test_local_cache_drops_value_computed_before_invalidation():
+    cache = LocalCache("test")
+    version = cache.version("k")
+    cache.invalidate("k")  # a write lands while the value is being computed
+    cache.set("k", "stale", version=version)
+    assert cache.get("k") is None
+
+    cache.set("k", "fresh", version=cache.version("k"))
+    assert cache.get("k") == "fresh"
+
+def test_local_cache_clear_drops_loads_of_uncached_keys():
+    cache = LocalCache("test")
+    version = cache.version("k")  # nothing cached for "k" yet
+    cache.clear()  # e.g. invalidations missed during a Redis reconnect
+    cache.set("k", "stale", version=version)
+    assert cache.get("k") is None
+
+def test_local_cache_evicts_least_recently_used():
+    cache = LocalCache("test", maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+
+@pytest.mark.anyio
+async def test_invalidation_reaches_other_process():
+    server = FakeServer()
+    worker_a, worker_b = InvalidationBus(), InvalidationBus()
+    cache_a = worker_a.register(LocalCache("milestones"))
+    cache_b = worker_b.register(LocalCache("milestones"))
+    await worker_a.start(FakeRedis(server=server))
+    await worker_b.start(FakeRedis(server=server))
+    try:
+        await asyncio.sleep(0.05)  # let both listeners subscribe
+        cache_a.set(7, "view")
+        cache_b.set(7, "view")
+
+        await worker_a.invalidate("milestones", 7)
+        for _ in range(50):
+            if cache_b.get(7) is None:
+                break
+            await asyncio.sleep(0.01)
+
+        assert cache_a.get(7) is None
+        assert cache_b.get(7) is None
+    finally:
+        await worker_a.stop()
+        await worker_b.stop()
+
+@pytest.mark.anyio
+async def test_malformed_invalidations_do_not_stop_the_listener():
+    server = FakeServer()
+    worker_a, worker_b = InvalidationBus(), InvalidationBus()
+    worker_a.register(LocalCache("milestones"))
+    cache_b = worker_b.register(LocalCache("milestones"))
+    publisher = FakeRedis(server=server)
+    await worker_a.start(FakeRedis(server=server))
+    await worker_b.start(FakeRedis(server=server))
+    try:
+        await asyncio.sleep(0.05)
+        for junk in ("not json", "[1]", '{"origin": "x"}', '{"origin": "x", "cache": "milestones", "keys": [[1]]}'):
+            await publisher.publish(InvalidationBus.CHANNEL, junk)
+        cache_b.set(7, "view")
+
+        await worker_a.invalidate("milestones", 7)
+        for _ in range(50):
+            if cache_b.get(7) is None:
+                break
+            await asyncio.sleep(0.01)
+        assert cache_b.get(7) is None
+    finally:
+        await worker_a.stop()
+        await worker_b.stop()
+        await publisher.aclose()
+
+@pytest.mark.anyio
+async def test_pr_write_invalidates_milestone_view(client, auth_header):
+    before = await client.get("/milestones", headers=auth_header)
+    assert not next(m for m in before.json() if m["name"] == "novice")["is_unlocked"]
+
+    await client.post("/prs", json={"exercise": "Squat", "weight": 60, "reps": 5}, headers=auth_header)
+
+    after = await client.get("/milestones", headers=auth_header)
+    assert next(m for m in after.json() if m["name"] == "novice")["is_unlocked"]
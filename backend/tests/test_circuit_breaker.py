@@ -0,0 +1,90 @@
+import json
+import httpx
+import pytest
+from app import ai_coach
+from app.circuit_breaker import CircuitBreaker
+from app.models import WorkoutRequest
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_opens_on_failure_rate_then_probes():
+    clock = FakeClock()
+    breaker = CircuitBreaker("test", failure_rate=0.5, min_calls=4, cooldown=30, clock=clock)
+    for success in (True, False, True, False):
+        assert breaker.allow()
+        breaker.record(success)
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    clock.now += 30
+    assert breaker.state == "half_open"
+    assert breaker.allow()  # the probe
+    assert not breaker.allow()  # only one at a time
+    breaker.record(False)
+    assert breaker.state == "open"
+
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record(True)
+    assert breaker.state == "closed"
+
+def test_slow_calls_count_as_failures():
+    breaker = CircuitBreaker("test", slow_call=1.0, min_calls=2, clock=FakeClock())
+    breaker.record(True, duration=0.1)
+    breaker.record(True, duration=5.0)
+    assert breaker.state == "open"
+
+def test_old_calls_leave_the_window():
+    clock = FakeClock()
+    breaker = CircuitBreaker("test", window=60, min_calls=3, clock=clock)
+    breaker.record(False)
+    breaker.record(False)
+    clock.now += 61
+    breaker.record(True)
+    breaker.record(True)
+    breaker.record(False)
+    assert breaker.state == "closed"
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """A stub OpenAI server; set `calls` and `fail` to steer it."""
+    state = {"calls": 0, "fail": True}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        state["calls"] += 1
+        if state["fail"]:
+            return httpx.Response(503)
+        plan = {"routine_name": "Stub", "schedule": [], "coach_tip": "Lift"}
+        return httpx.Response(200, json={"choices": [{"message": {"content": json.dumps(plan)}}]})
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("USE_MOCK_AI", "false")
+    clock = FakeClock()
+    monkeypatch.setattr(ai_coach, "breaker", CircuitBreaker("openai", min_calls=3, cooldown=30, clock=clock))
+    ai_coach.set_client(httpx.AsyncClient(base_url="http://stub", transport=httpx.MockTransport(handler)))
+    state["clock"] = clock
+    yield state
+    ai_coach.set_client(None)
+
+@pytest.mark.anyio
+async def test_open_circuit_skips_upstream(upstream):
+    request = WorkoutRequest(fitness_level="beginner", days_per_week=3)
+    for _ in range(3):
+        plan = await ai_coach.AICoachService.generate_routine(request)
+        assert plan.routine_name.startswith("Fallback")
+    assert upstream["calls"] == 3
+
+    plan = await ai_coach.AICoachService.generate_routine(request)
+    assert plan.schedule[0].exercises[0].notes == "AI coach temporarily unavailable"
+    assert upstream["calls"] == 3
+
+    upstream["fail"] = False
+    upstream["clock"].now += 30
+    plan = await ai_coach.AICoachService.generate_routine(request)
+    assert plan.routine_name == "Stub"
+    assert ai_coach.breaker.state == "closed"
@@ -0,0 +1,52 @@
+import asyncio
+import pytest
+from fakeredis import FakeServer
+from fakeredis.aioredis import FakeRedis
+from app import events
+from app.events import InProcessBroker, RedisBroker
+
+def drain(queue):
+    items = []
+    while not queue.empty():
+        items.append(queue.get_nowait())
+    return items
+
+@pytest.mark.anyio
+async def test_pr_writes_publish_events(client, auth_header):
+    first = (await client.post("/prs", json={"exercise": "Curl", "weight": 20, "reps": 10}, headers=auth_header)).json()
+    queue = events.broker.subscribe(first["user_id"])
+    try:
+        squat = (await client.post("/prs", json={"exercise": "Squat", "weight": 120, "reps": 1}, headers=auth_header)).json()
+        created = drain(queue)
+        assert {"type": "milestone_unlocked", "name": "squat-king"} in created
+        assert any(e["type"] == "pr_created" and e["pr"]["id"] == squat["id"] for e in created)
+
+        await client.delete(f"/prs/{squat['id']}", headers=auth_header)
+        deleted = drain(queue)
+        assert {"type": "milestone_revoked", "name": "squat-king"} in deleted
+        assert any(e["type"] == "pr_deleted" and e["id"] == squat["id"] for e in deleted)
+    finally:
+        events.broker.unsubscribe(first["user_id"], queue)
+
+@pytest.mark.anyio
+async def test_slow_subscriber_gets_resync():
+    broker = InProcessBroker()
+    queue = broker.subscribe(1)
+    await broker.publish(1, [{"type": "pr_created"}] * (events.QUEUE_SIZE + 1))
+    assert drain(queue)[-1] == {"type": "resync"}
+
+@pytest.mark.anyio
+async def test_redis_broker_reaches_other_process():
+    server = FakeServer()
+    sender, receiver = RedisBroker(FakeRedis(server=server)), RedisBroker(FakeRedis(server=server))
+    await sender.start()
+    await receiver.start()
+    try:
+        await asyncio.sleep(0.05)  # let listeners subscribe
+        queue = receiver.subscribe(42)
+        await sender.publish(42, [{"type": "milestone_unlocked", "name": "novice"}])
+        event = await asyncio.wait_for(queue.get(), timeout=1)
+        assert event == {"type": "milestone_unlocked", "name": "novice"}
+    finally:
+        await sender.stop()
+        await receiver.stop()
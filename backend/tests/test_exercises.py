@@ -0,0 +1,34 @@
+import time
+import pytest
+from app.exercises import PrefixIndex, catalog_index
+
+def test_prefix_index_matches_word_starts():
+    index = PrefixIndex([("Bench Press", 3), ("Press", 1), ("Leg Press", 5), ("Squat", 9)])
+    assert index.search("pre", 10) == ["Press", "Leg Press", "Bench Press"]
+    assert index.search("BENCH  p", 10) == ["Bench Press"]
+    assert index.search("x", 10) == []
+
+def test_catalog_search_is_fast():
+    start = time.perf_counter()
+    for _ in range(1000):
+        catalog_index.search("dead", 10)
+    assert (time.perf_counter() - start) / 1000 < 0.001
+
+@pytest.mark.anyio
+async def test_suggest_puts_own_history_first(client, auth_header):
+    for _ in range(2):
+        await client.post("/prs", json={"exercise": "Deadlift (Trap Bar)", "weight": 180, "reps": 3}, headers=auth_header)
+    await client.post("/prs", json={"exercise": "deadlift (trap  bar)", "weight": 170, "reps": 3}, headers=auth_header)
+
+    response = await client.get("/exercises/suggest", params={"q": "dead"}, headers=auth_header)
+    assert response.status_code == 200
+    names = response.json()
+    assert names[0] == "Deadlift (Trap Bar)"
+    assert "Deadlift" in names and "Romanian Deadlift" in names
+    assert len(names) == len(set(names))
+
+@pytest.mark.anyio
+async def test_suggest_updates_after_pr_write(client, auth_header):
+    assert "Zercher Squat" not in (await client.get("/exercises/suggest", params={"q": "zer"}, headers=auth_header)).json()
+    await client.post("/prs", json={"exercise": "Zercher Squat", "weight": 100, "reps": 5}, headers=auth_header)
+    assert (await client.get("/exercises/suggest", params={"q": "zer"}, headers=auth_header)).json() == ["Zercher Squat"]
@@ -0,0 +1,126 @@
+import hashlib
+import json
+import time
+import pytest
+from fakeredis.aioredis import FakeRedis
+from redis.exceptions import ConnectionError
+from app import idempotency, redis_client
+from app.auth import decode_access_token
+from app.models import UserCreate
+
+@pytest.fixture(params=["local", "redis"])
+async def store(request):
+    if request.param == "local":
+        yield None
+        return
+    redis = FakeRedis()
+    redis_client.set_redis(redis)
+    yield redis
+    redis_client.set_redis(None)
+    await redis.aclose()
+
+@pytest.mark.anyio
+async def test_retried_create_is_replayed_not_duplicated(client, auth_header, store):
+    headers = {**auth_header, "Idempotency-Key": f"create-{time.time_ns()}"}
+    payload = {"exercise": "Squat", "weight": 100, "reps": 5}
+
+    first = await client.post("/prs", json=payload, headers=headers)
+    second = await client.post("/prs", json=payload, headers=headers)
+    assert first.status_code == second.status_code == 201
+    assert second.json() == first.json()
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert "Idempotent-Replayed" not in first.headers
+
+    prs = (await client.get("/prs", headers=auth_header)).json()
+    assert [pr["id"] for pr in prs] == [first.json()["id"]]
+
+@pytest.mark.anyio
+async def test_key_reused_with_different_body_is_rejected(client, auth_header, store):
+    headers = {**auth_header, "Idempotency-Key": f"reuse-{time.time_ns()}"}
+    await client.post("/prs", json={"exercise": "Squat", "weight": 100, "reps": 5}, headers=headers)
+    response = await client.post("/prs", json={"exercise": "Squat", "weight": 105, "reps": 5}, headers=headers)
+    assert response.status_code == 422
+
+@pytest.mark.anyio
+async def test_keys_are_scoped_per_user(client, auth_header, store):
+    key = f"shared-{time.time_ns()}"
+    other = await client.post("/auth/register", json={"username": f"other_{key}", "password": "password123"})
+    other_header = {"Authorization": f"Bearer {other.json()['access_token']}"}
+    payload = {"exercise": "Deadlift", "weight": 140, "reps": 3}
+
+    mine = await client.post("/prs", json=payload, headers={**auth_header, "Idempotency-Key": key})
+    theirs = await client.post("/prs", json=payload, headers={**other_header, "Idempotency-Key": key})
+    assert theirs.status_code == 201
+    assert "Idempotent-Replayed" not in theirs.headers
+    assert theirs.json()["id"] != mine.json()["id"]
+
+@pytest.mark.anyio
+async def test_failed_request_releases_key(client, auth_header, store):
+    headers = {**auth_header, "Idempotency-Key": f"batch-{time.time_ns()}"}
+    missing = {"operations": [{"op": "delete", "id": 999999999}]}
+    assert (await client.post("/prs/batch", json=missing, headers=headers)).status_code == 404
+
+    ok = {"operations": [{"op": "create", "data": {"exercise": "Row", "weight": 60, "reps": 8}}]}
+    first = await client.post("/prs/batch", json=ok, headers=headers)
+    second = await client.post("/prs/batch", json=ok, headers=headers)
+    assert first.status_code == 200
+    assert second.json() == first.json()
+    assert second.headers["Idempotent-Replayed"] == "true"
+
+@pytest.mark.anyio
+async def test_register_retry_reissues_token_without_storing_secrets(client, store):
+    key = f"register-{time.time_ns()}"
+    payload = {"username": f"idem_{key}", "password": "password123"}
+    first = await client.post("/auth/register", json=payload, headers={"Idempotency-Key": key})
+    second = await client.post("/auth/register", json=payload, headers={"Idempotency-Key": key})
+    assert first.status_code == second.status_code == 200
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert decode_access_token(second.json()["access_token"])["sub"] == payload["username"]
+
+    # Neither the password (nor a plain hash of it) nor the token is kept.
+    if store is None:
+        records = [value for _, value in idempotency._local_store._entries.values()]
+    else:
+        records = [(await store.get(k)).decode() for k in await store.keys("gym-pr-tracker:idem:register:*")]
+    (record,) = [r for r in records if json.loads(r)["fingerprint"] == idempotency._fingerprint(UserCreate(**payload))]
+    assert first.json()["access_token"] not in record
+    plain = hashlib.sha256(json.dumps(payload, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+    assert plain not in record
+
+    fresh = await client.post("/auth/register", json=payload)
+    assert fresh.status_code == 400
+
+    other_password = {**payload, "password": "different123"}
+    response = await client.post("/auth/register", json=other_password, headers={"Idempotency-Key": key})
+    assert response.status_code == 422
+
+@pytest.mark.anyio
+async def test_redis_dropping_mid_request_is_not_a_500(monkeypatch):
+    redis = FakeRedis()
+    redis_client.set_redis(redis)
+    key = f"drop-{time.time_ns()}"
+    calls = []
+
+    async def handler():
+        calls.append(1)
+        return {"ok": True}
+
+    async def failing():
+        raise ValueError("handler failed")
+
+    async def down(*args, **kwargs):
+        raise ConnectionError("Redis went away")
+
+    try:
+        await idempotency.run_idempotent(key, "test", {"n": 1}, handler)
+        monkeypatch.setattr(redis, "get", down)
+        monkeypatch.setattr(redis, "delete", down)
+        # The retry finds the key but cannot read it: runs unguarded.
+        response = await idempotency.run_idempotent(key, "test", {"n": 1}, handler)
+        assert response == {"ok": True} and len(calls) == 2
+        # Releasing the key fails too; the handler's own error surfaces.
+        with pytest.raises(ValueError, match="handler failed"):
+            await idempotency.run_idempotent(f"{key}-2", "test", {"n": 1}, failing)
+    finally:
+        redis_client.set_redis(None)
+        await redis.aclose()
@@ -0,0 +1,79 @@
+import asyncio
+import pytest
+from httpx import ASGITransport, AsyncClient
+from app.middleware import ConcurrencyLimiter, ConcurrencyLimitMiddleware, route_class
+
+def test_route_classes():
+    assert route_class("POST", "/auth/token") == "auth"
+    assert route_class("POST", "/ai/generate_routine") == "ai"
+    assert route_class("GET", "/prs") == "reads"
+    assert route_class("DELETE", "/prs/3") == "writes"
+    assert route_class("GET", "/events") is None
+
+@pytest.mark.anyio
+async def test_limiter_queues_then_sheds():
+    limiter = ConcurrencyLimiter("test", limit=1, max_queue=1, max_wait=0.05)
+    assert await limiter.acquire()
+
+    waiting = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0)
+    assert not await limiter.acquire()  # queue full: shed immediately
+    assert not await waiting  # deadline passed while queued
+    assert limiter.shed == 2
+
+    waiting = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0)
+    limiter.release(0.01)
+    assert await waiting  # slot handed straight to the waiter
+    assert limiter.active == 1
+    limiter.release(0.01)
+    assert limiter.active == 0
+
+@pytest.mark.anyio
+async def test_limiter_handoff_racing_the_deadline_keeps_the_slot():
+    # max_wait=0 schedules the timeout for the next tick, the same tick in
+    # which release() below hands the slot to the waiter.
+    limiter = ConcurrencyLimiter("test", limit=1, max_queue=1, max_wait=0)
+    assert await limiter.acquire()
+    waiting = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0)
+    limiter.release(0.01)
+    assert await waiting
+    assert limiter.active == 1
+    limiter.release(0.01)
+    assert limiter.active == 0
+
+@pytest.mark.anyio
+async def test_limiter_cancelled_waiter_already_skipped_by_release():
+    limiter = ConcurrencyLimiter("test", limit=1, max_queue=1, max_wait=1)
+    assert await limiter.acquire()
+    waiting = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0)
+    waiting.cancel()
+    limiter.release(0.01)  # pops the cancelled waiter before it runs
+    with pytest.raises(asyncio.CancelledError):
+        await waiting
+    assert limiter.active == 0
+    assert limiter.stats()["queued"] == 0
+
+@pytest.mark.anyio
+async def test_middleware_answers_503_with_retry_after():
+    gate = asyncio.Event()
+
+    async def app(scope, receive, send):
+        await gate.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    limiter = ConcurrencyLimiter("reads", limit=1, max_queue=0, max_wait=0.1)
+    transport = ASGITransport(app=ConcurrencyLimitMiddleware(app, {"reads": limiter}))
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        first = asyncio.create_task(client.get("/prs"))
+        await asyncio.sleep(0.01)
+        shed = await client.get("/prs")
+        assert shed.status_code == 503
+        assert int(shed.headers["Retry-After"]) >= 1
+
+        gate.set()
+        assert (await first).status_code == 200
+        assert limiter.active == 0
@@ -0,0 +1,55 @@
+import json
+import logging
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient, ASGITransport
+from app.logging_config import setup_logging
+from app.middleware import RequestContextMiddleware
+
+@pytest.fixture
+def failing_app():
+    app = FastAPI()
+    app.add_middleware(RequestContextMiddleware)
+
+    @app.get("/boom")
+    async def boom():
+        logging.getLogger("app.test").info("about to fail", extra={"user_id": 7})
+        raise RuntimeError("kaboom")
+
+    return app
+
+@pytest.fixture
+def logging_to(tmp_path):
+    path = tmp_path / "app.log"
+    listener = setup_logging(str(path))
+    yield path, listener
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if type(handler).__name__ == "_StructuredQueueHandler":
+            root.removeHandler(handler)
+
+@pytest.mark.anyio
+async def test_unhandled_error_is_logged_as_json(failing_app, logging_to):
+    log_file, listener = logging_to
+    transport = ASGITransport(app=failing_app, raise_app_exceptions=False)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.get("/boom", headers={"X-Request-ID": "req-123"})
+
+    assert response.status_code == 500
+    assert response.json() == {"detail": "Internal Server Error", "request_id": "req-123"}
+    assert response.headers["x-request-id"] == "req-123"
+
+    listener.stop()  # drains the queue into the file
+    lines = [json.loads(line) for line in log_file.read_text().splitlines()]
+    info, error = [line for line in lines if line["logger"] in ("app.test", "app.middleware")]
+    assert info["message"] == "about to fail"
+    assert info["user_id"] == 7
+    assert info["request_id"] == "req-123"
+    assert error["level"] == "ERROR"
+    assert error["path"] == "/boom"
+    assert "RuntimeError: kaboom" in error["exc"]
+
+@pytest.mark.anyio
+async def test_request_id_generated_when_missing(client):
+    response = await client.get("/prs")
+    assert len(response.headers["x-request-id"]) == 32
@@ -111,3 +111,63 @@ async def test_create_invalid_pr_short_name(client, auth_header):
 async def test_update_non_existent_pr(client, auth_header):
     response = await client.put("/prs/9999", json={"weight": 120}, headers=auth_header)
     assert response.status_code == 404
+
+
+# Batch Tests
+
+@pytest.mark.anyio
+async def test_batch_applies_operations_in_order(client, auth_header):
+    setup = await client.post("/prs", json={"exercise": "Bench Press", "weight": 80, "reps": 5}, headers=auth_header)
+    pr_id = setup.json()["id"]
+
+    response = await client.post(
+        "/prs/batch",
+        json={"operations": [
+            {"op": "create", "data": {"exercise": "Squat", "weight": 100, "reps": 5}},
+            {"op": "update", "id": pr_id, "data": {"weight": 85}},
+            {"op": "delete", "id": pr_id},
+        ]},
+        headers=auth_header,
+    )
+    assert response.status_code == 200
+    results = response.json()
+    assert [r["status"] for r in results] == [201, 200, 204]
+    assert results[0]["pr"]["exercise"] == "Squat"
+    assert results[1]["pr"]["weight"] == 85
+
+    prs = (await client.get("/prs", headers=auth_header)).json()
+    assert [pr["exercise"] for pr in prs] == ["Squat"]
+
+
+@pytest.mark.anyio
+async def test_batch_is_atomic(client, auth_header):
+    response = await client.post(
+        "/prs/batch",
+        json={"operations": [
+            {"op": "create", "data": {"exercise": "Deadlift", "weight": 150, "reps": 1}},
+            {"op": "delete", "id": 999999},
+        ]},
+        headers=auth_header,
+    )
+    assert response.status_code == 404
+    assert "Operation 1" in response.json()["detail"]
+
+    prs = (await client.get("/prs", headers=auth_header)).json()
+    assert prs == []
+
+
+@pytest.mark.anyio
+async def test_batch_syncs_milestones_once(client, auth_header, monkeypatch):
+    from app.repository import PRRepository
+    calls = []
+    original = PRRepository.sync_achievements
+
+    async def counting_sync(self, commit=True):
+        calls.append(commit)
+        return await original(self, commit=commit)
+
+    monkeypatch.setattr(PRRepository, "sync_achievements", counting_sync)
+    operations = [{"op": "create", "data": {"exercise": "Row", "weight": 50, "reps": 8}}] * 10
+    response = await client.post("/prs/batch", json={"operations": operations}, headers=auth_header)
+    assert response.status_code == 200
+    assert len(calls) == 1
@@ -0,0 +1,52 @@
+import uuid
+import pytest
+from sqlalchemy.orm import sessionmaker
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.db import engine
+from app.milestones import backfill_milestones
+from app.models import PR, Milestone, User
+
+@pytest.fixture
+async def session():
+    async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with async_session() as session:
+        yield session
+
+async def make_user(session, prs):
+    user = User(username=f"backfill_{uuid.uuid4().hex}", hashed_password="x")
+    session.add(user)
+    await session.flush()
+    for exercise, weight, reps in prs:
+        session.add(PR(exercise=exercise, weight=weight, reps=reps, user_id=user.id))
+    await session.commit()
+    return user.id
+
+async def milestone_names(session, user_id):
+    result = await session.exec(select(Milestone.name).where(Milestone.user_id == user_id))
+    return set(result.all())
+
+@pytest.mark.anyio
+async def test_backfill_unlocks_and_revokes(session):
+    lifter = await make_user(session, [("Bench Press", 100, 1), ("Incline Bench Press", 95, 1)])
+    idle = await make_user(session, [])
+    # Stale state: idle user holds a milestone they never earned.
+    session.add(Milestone(name="century", user_id=idle))
+    await session.commit()
+
+    stats = await backfill_milestones(engine, chunk_size=1)
+
+    assert await milestone_names(session, lifter) == {"novice", "chest-pounder", "incline-ace", "century"}
+    assert await milestone_names(session, idle) == set()
+    assert stats["users"] == stats["total"]
+
+@pytest.mark.anyio
+async def test_backfill_matches_per_user_sync(client, auth_header, session):
+    await client.post("/prs", json={"exercise": "Romanian Deadlift", "weight": 110, "reps": 5}, headers=auth_header)
+    await client.post("/prs", json={"exercise": "Deadlift", "weight": 150, "reps": 1}, headers=auth_header)
+    before = {m["name"] for m in (await client.get("/milestones", headers=auth_header)).json() if m["is_unlocked"]}
+
+    await backfill_milestones(engine)
+
+    after = {m["name"] for m in (await client.get("/milestones", headers=auth_header)).json() if m["is_unlocked"]}
+    assert before == after == {"novice", "hinge-master", "earth-shaker", "century"}
@@ -0,0 +1,81 @@
+import random
+import time
+import pytest
+from app import cache, db, percentiles
+from app.percentiles import RELATIVE_ACCURACY, StrengthSketch, bucket_index
+
+def test_sketch_percentile_within_bucket_error():
+    rng = random.Random(7)
+    bests = [rng.uniform(20, 250) for _ in range(10_000)]
+    counts = {}
+    for w in bests:
+        counts[bucket_index(w)] = counts.get(bucket_index(w), 0) + 1
+    sketch = StrengthSketch(counts)
+
+    for weight in (40, 100, 180):
+        exact_low = 100 * sum(b < weight * (1 - 2 * RELATIVE_ACCURACY) for b in bests) / len(bests)
+        exact_high = 100 * sum(b < weight * (1 + 2 * RELATIVE_ACCURACY) for b in bests) / len(bests)
+        assert exact_low <= sketch.percentile(weight) <= exact_high
+    assert len(sketch.indexes) < 150
+
+def test_sketches_merge_by_adding_counts():
+    a = StrengthSketch({bucket_index(100): 2})
+    b = StrengthSketch({bucket_index(100): 1, bucket_index(50): 1})
+    merged = a.merge(b)
+    assert merged.total == 4
+    assert merged.percentile(75) == 25.0
+
+async def register(client, name):
+    response = await client.post("/auth/register", json={"username": name, "password": "password123"})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+@pytest.mark.anyio
+async def test_percentile_tracks_each_users_best(client):
+    exercise = f"Test Squat {time.time_ns()}"
+    headers = [await register(client, f"pct_{i}_{time.time_ns()}") for i in range(4)]
+    for h, weight in zip(headers, (60, 100, 140, 180)):
+        await client.post("/prs", json={"exercise": exercise, "weight": weight, "reps": 5}, headers=h)
+    # A lighter lift does not change that user's best.
+    await client.post("/prs", json={"exercise": exercise.upper(), "weight": 50, "reps": 5}, headers=headers[3])
+
+    cache.strength_sketches.clear()
+    response = await client.get("/analytics/percentile", params={"exercise": exercise, "weight": 120}, headers=headers[0])
+    assert response.status_code == 200
+    body = response.json()
+    assert body["users"] == 4
+    assert body["percentile"] == 50.0
+
+    # Deleting the top lift drops that user's best back to 50kg.
+    prs = (await client.get("/prs", headers=headers[3])).json()
+    top = next(pr for pr in prs if pr["weight"] == 180)
+    await client.delete(f"/prs/{top['id']}", headers=headers[3])
+
+    cache.strength_sketches.clear()
+    body = (await client.get("/analytics/percentile", params={"exercise": exercise, "weight": 120}, headers=headers[0])).json()
+    assert body["users"] == 4
+    assert body["percentile"] == 75.0
+
+@pytest.mark.anyio
+async def test_percentile_unknown_exercise(client, auth_header):
+    response = await client.get("/analytics/percentile", params={"exercise": f"Nothing {time.time_ns()}", "weight": 10}, headers=auth_header)
+    assert response.status_code == 404
+
+@pytest.mark.anyio
+async def test_percentile_keys_fold_non_ascii_and_whitespace(client):
+    # SQLite's lower() leaves "Ü" alone and trim() keeps tabs; keys must not.
+    suffix = time.time_ns()
+    headers = [await register(client, f"pct_u{i}_{suffix}") for i in range(2)]
+    for h, (name, weight) in zip(headers, ((f"Überzug {suffix}", 40), (f"überzug {suffix}\t", 60))):
+        await client.post("/prs", json={"exercise": name, "weight": weight, "reps": 8}, headers=h)
+
+    async def users():
+        cache.strength_sketches.clear()
+        params = {"exercise": f"ÜBERZUG {suffix}", "weight": 50}
+        response = await client.get("/analytics/percentile", params=params, headers=headers[0])
+        assert response.status_code == 200
+        return response.json()["users"]
+
+    assert await users() == 2
+    async with db.engine.begin() as conn:
+        await percentiles.rebuild(conn)
+    assert await users() == 2
@@ -0,0 +1,62 @@
+import time
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from app.profiler import ProfilingMiddleware, SamplingProfiler
+
+def burn_cpu(seconds: float):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        sum(range(100))
+
+def make_client(profiler: SamplingProfiler) -> AsyncClient:
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def read_item(item_id: int):
+        burn_cpu(0.05)
+        return {"id": item_id}
+
+    app.add_middleware(ProfilingMiddleware, profiler=profiler, sample_rate=0.0, token="secret")
+    return AsyncClient(transport=ASGITransport(app=app), base_url="http://test")
+
+@pytest.mark.anyio
+async def test_profiles_requests_by_route():
+    profiler = SamplingProfiler(interval=0.001)
+    async with make_client(profiler) as client:
+        await client.get("/items/1")
+        assert profiler.routes == {}  # not sampled, no header
+
+        await client.get("/items/1", headers={"X-Profile": "1"})
+        assert profiler.routes == {}  # wrong token
+
+        await client.get("/items/1", headers={"X-Profile": "secret"})
+        await client.get("/items/2", headers={"X-Profile": "secret"})
+
+    assert list(profiler.routes) == ["GET /items/{item_id}"]
+    collapsed = profiler.collapsed()
+    assert collapsed.startswith("GET /items/{item_id};")
+    assert f"{__name__}:burn_cpu" in collapsed
+
+    doc = profiler.speedscope()
+    (profile,) = doc["profiles"]
+    assert profile["name"] == "GET /items/{item_id}"
+    assert len(profile["samples"]) == len(profile["weights"])
+    names = {f["name"] for f in doc["shared"]["frames"]}
+    assert f"{__name__}:burn_cpu" in names
+
+    profiler.reset()
+    assert profiler.collapsed() == ""
+
+@pytest.mark.anyio
+async def test_unmatched_paths_share_one_entry():
+    profiler = SamplingProfiler(interval=0.001)
+    async with make_client(profiler) as client:
+        for path in ("/scan/a", "/scan/b", "/wp-admin.php"):
+            await client.get(path, headers={"X-Profile": "secret"})
+    assert list(profiler.routes) == ["<unmatched>"]
+
+@pytest.mark.anyio
+async def test_profile_endpoint_requires_admin(client, auth_header):
+    response = await client.get("/admin/profile", headers=auth_header)
+    assert response.status_code == 403
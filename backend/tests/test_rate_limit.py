@@ -0,0 +1,80 @@
+import time
+import pytest
+from fakeredis import FakeServer
+from fakeredis.aioredis import FakeRedis
+from app import rate_limit, redis_client
+
+@pytest.fixture(params=["local", "redis"])
+async def store(request, monkeypatch):
+    monkeypatch.setitem(rate_limit.limits, "milestones", (2, 6.0))
+    now = [time.time()]
+    monkeypatch.setattr(rate_limit, "_clock", lambda: now[0])
+    if request.param == "local":
+        yield now
+        return
+    redis = FakeRedis()
+    redis_client.set_redis(redis)
+    yield now
+    redis_client.set_redis(None)
+    await redis.aclose()
+
+async def register(client, name):
+    username = f"{name}_{time.time_ns()}"
+    await client.post("/auth/register", json={"username": username, "password": "testpassword"})
+    response = await client.post("/auth/token", data={"username": username, "password": "testpassword"})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+@pytest.mark.anyio
+async def test_bucket_empties_and_refills(client, auth_header, store):
+    first = await client.get("/milestones", headers=auth_header)
+    second = await client.get("/milestones", headers=auth_header)
+    assert first.status_code == second.status_code == 200
+    assert first.headers["RateLimit-Limit"] == "2"
+    assert [first.headers["RateLimit-Remaining"], second.headers["RateLimit-Remaining"]] == ["1", "0"]
+    assert second.headers["RateLimit-Reset"] == "20"
+
+    rejected = await client.get("/milestones", headers=auth_header)
+    assert rejected.status_code == 429
+    assert rejected.headers["Retry-After"] == "10"
+    assert rejected.headers["RateLimit-Remaining"] == "0"
+
+    # 6 per minute: one token back every 10 seconds.
+    store[0] += 10
+    assert (await client.get("/milestones", headers=auth_header)).status_code == 200
+    assert (await client.get("/milestones", headers=auth_header)).status_code == 429
+
+@pytest.mark.anyio
+async def test_buckets_are_per_user_and_route_class(client, auth_header, store):
+    for _ in range(2):
+        await client.get("/milestones", headers=auth_header)
+    assert (await client.get("/milestones", headers=auth_header)).status_code == 429
+
+    other = await register(client, "ratelimit")
+    assert (await client.get("/milestones", headers=other)).status_code == 200
+    # Unlimited routes are untouched and carry no headers.
+    response = await client.get("/prs", headers=auth_header)
+    assert response.status_code == 200
+    assert "RateLimit-Limit" not in response.headers
+
+@pytest.mark.anyio
+async def test_redis_outage_falls_back_to_local_buckets(client, auth_header, monkeypatch):
+    monkeypatch.setitem(rate_limit.limits, "milestones", (1, 6.0))
+    server = FakeServer()
+    server.connected = False
+    redis_client.set_redis(FakeRedis(server=server))
+    try:
+        assert (await client.get("/milestones", headers=auth_header)).status_code == 200
+        assert (await client.get("/milestones", headers=auth_header)).status_code == 429
+    finally:
+        redis_client.set_redis(None)
+
+def test_decide_matches_a_token_bucket():
+    tat = None
+    remaining = []
+    for _ in range(4):
+        decision, tat = rate_limit.decide(tat, 100.0, burst=3, per_minute=60)
+        remaining.append(decision.remaining if decision.allowed else None)
+    assert remaining == [2, 1, 0, None]
+    # Idle for longer than a full refill: back to the burst, not beyond.
+    decision, _ = rate_limit.decide(tat, 200.0, burst=3, per_minute=60)
+    assert decision.allowed and decision.remaining == 2
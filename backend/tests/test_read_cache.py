@@ -0,0 +1,65 @@
+import pytest
+from fakeredis.aioredis import FakeRedis
+from app import cache, redis_client
+from app.repository import PRRepository
+
+@pytest.fixture
+async def fake_redis():
+    redis = FakeRedis()
+    redis_client.set_redis(redis)
+    yield redis
+    redis_client.set_redis(None)
+    await redis.aclose()
+
+@pytest.fixture
+def query_counter(monkeypatch):
+    calls = []
+    original = PRRepository._query_prs
+
+    async def counting(self, *args, **kwargs):
+        calls.append(self.user_id)
+        return await original(self, *args, **kwargs)
+
+    monkeypatch.setattr(PRRepository, "_query_prs", counting)
+    return calls
+
+@pytest.mark.anyio
+async def test_pr_list_served_from_redis_until_write(client, auth_header, fake_redis, query_counter):
+    await client.post("/prs", json={"exercise": "Squat", "weight": 100, "reps": 5}, headers=auth_header)
+
+    first = (await client.get("/prs", headers=auth_header)).json()
+    second = (await client.get("/prs", headers=auth_header)).json()
+    assert first == second
+    assert len(query_counter) == 1
+
+    await client.post("/prs", json={"exercise": "Bench Press", "weight": 80, "reps": 5}, headers=auth_header)
+    third = (await client.get("/prs", headers=auth_header)).json()
+    assert len(third) == 2
+    assert len(query_counter) == 2
+
+@pytest.mark.anyio
+async def test_milestones_shared_across_processes(client, auth_header, fake_redis, monkeypatch):
+    await client.post("/prs", json={"exercise": "Deadlift", "weight": 150, "reps": 1}, headers=auth_header)
+    first = (await client.get("/milestones", headers=auth_header)).json()
+
+    # Another worker has an empty local cache but shares Redis.
+    cache.milestones.clear()
+    async def fail(self):
+        raise AssertionError("should be served from Redis")
+    monkeypatch.setattr(PRRepository, "_build_milestones", fail)
+    assert (await client.get("/milestones", headers=auth_header)).json() == first
+
+@pytest.mark.anyio
+async def test_cache_can_be_disabled(client, auth_header, fake_redis, query_counter, monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_ENABLED", False)
+    await client.get("/prs", headers=auth_header)
+    await client.get("/prs", headers=auth_header)
+    assert len(query_counter) == 2
+    assert await fake_redis.keys("gym-pr-tracker:prs:*") == []
+
+@pytest.mark.anyio
+async def test_oversized_entries_are_not_stored(client, auth_header, fake_redis, monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_MAX_ENTRY_BYTES", 8)
+    await client.post("/prs", json={"exercise": "Row", "weight": 60, "reps": 8}, headers=auth_header)
+    assert len((await client.get("/prs", headers=auth_header)).json()) == 1
+    assert await fake_redis.keys("gym-pr-tracker:prs:*") == []
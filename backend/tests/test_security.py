@@ -43,3 +43,73 @@ async def test_invalid_claims(client: AsyncClient):
     
     response = await client.get("/prs", headers=headers)
     assert response.status_code == 401
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("kid", [["legacy"], {"k": 1}, 7])
+async def test_non_string_kid_is_unauthorized(client: AsyncClient, kid):
+    from jose import jwt
+    from app.auth import SECRET_KEY, ALGORITHM
+
+    token = jwt.encode({"sub": "test", "exp": 9999999999}, SECRET_KEY, algorithm=ALGORITHM, headers={"kid": kid})
+    response = await client.get("/prs", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 401
+
+@pytest.fixture
+def key_file(tmp_path, monkeypatch):
+    from app import auth
+    path = tmp_path / ".env"
+    monkeypatch.setattr(auth, "JWT_ENV_FILE", str(path))
+    yield path
+    monkeypatch.undo()
+    auth.keyring.reload()
+
+def token_kid(token):
+    from jose import jwt
+    return jwt.get_unverified_header(token)["kid"]
+
+@pytest.mark.anyio
+async def test_rotated_keys_verify_until_dropped(client: AsyncClient, key_file):
+    from app.auth import keyring, decode_access_token
+    key_file.write_text("JWT_KEYS=old:first-secret\n")
+    keyring.reload()
+    old_token = create_access_token(data={"sub": "rotating"})
+    assert token_kid(old_token) == "old"
+
+    key_file.write_text("JWT_KEYS=old:first-secret,new:second-secret\nJWT_ACTIVE_KID=new\n")
+    keyring.reload()
+    new_token = create_access_token(data={"sub": "rotating"})
+    assert token_kid(new_token) == "new"
+    assert decode_access_token(old_token)["sub"] == "rotating"
+    assert decode_access_token(new_token)["sub"] == "rotating"
+
+    # Dropping a key also drops its tokens from the verified cache.
+    key_file.write_text("JWT_KEYS=new:second-secret\n")
+    keyring.reload()
+    assert decode_access_token(old_token) is None
+    assert decode_access_token(new_token)["sub"] == "rotating"
+
+def test_invalid_keyring_is_rejected():
+    from app.auth import parse_keys
+    with pytest.raises(ValueError):
+        parse_keys({"JWT_KEYS": "no-separator"})
+    with pytest.raises(ValueError):
+        parse_keys({"JWT_KEYS": "a:secret", "JWT_ACTIVE_KID": "b"})
+    assert parse_keys({"JWT_SECRET": "s"}) == ({"legacy": "s"}, "legacy")
+
+def test_verified_tokens_skip_crypto_until_exp(monkeypatch):
+    from app import auth
+    token = create_access_token(data={"sub": "cached"})
+    calls = []
+    decode = auth.jwt.decode
+    monkeypatch.setattr(auth.jwt, "decode", lambda *a, **kw: calls.append(1) or decode(*a, **kw))
+
+    assert auth.decode_access_token(token)["sub"] == "cached"
+    assert auth.decode_access_token(token)["sub"] == "cached"
+    assert len(calls) == 1
+
+    cache = auth.VerifiedTokens(maxsize=1)
+    cache.add(b"expired", {"exp": 1, "sub": "old"})
+    assert cache.get(b"expired") is None
+    cache.add(b"a", {"exp": 9999999999})
+    cache.add(b"b", {"exp": 9999999999})
+    assert cache.get(b"a") is None and cache.get(b"b") is not None
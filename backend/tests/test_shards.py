@@ -0,0 +1,91 @@
+import uuid
+import pytest
+from sqlalchemy import func
+from sqlmodel import select
+from app import db, shards
+from app.models import PR, User
+
+@pytest.fixture
+async def two_shards(tmp_path, monkeypatch):
+    extra = db.make_engine(f"sqlite+aiosqlite:///{tmp_path}/shard1.db")
+    await db.migrate(extra)
+    monkeypatch.setattr(db, "engines", [db.engine, extra])
+    yield extra
+    await extra.dispose()
+
+async def user_id(client, auth_header):
+    pr = (await client.post("/prs", json={"exercise": "Warmup", "weight": 20, "reps": 10}, headers=auth_header)).json()
+    return pr["user_id"]
+
+async def home_shard(uid):
+    async with shards.session(0) as session:
+        return (await session.get(User, uid)).shard
+
+async def pr_count(shard, uid):
+    async with shards.session(shard) as session:
+        return (await session.exec(select(func.count(PR.id)).where(PR.user_id == uid))).one()
+
+@pytest.mark.anyio
+async def test_new_users_are_spread_by_id(two_shards):
+    assert {shards.shard_for(uid) for uid in range(1, 50)} == {0, 1}
+
+@pytest.mark.anyio
+async def test_user_data_follows_the_user(client, auth_header, two_shards):
+    uid = await user_id(client, auth_header)
+    source = await home_shard(uid)
+    target = 1 - source
+    await client.post("/prs", json={"exercise": "Shardlift", "weight": 100, "reps": 5}, headers=auth_header)
+
+    stats = await shards.move_user(uid, target)
+    assert stats["prs"] == 2
+    assert await pr_count(source, uid) == 0
+    assert await pr_count(target, uid) == 2
+
+    # Requests now read and write on the new shard.
+    await client.post("/prs", json={"exercise": "Shardlift", "weight": 110, "reps": 3}, headers=auth_header)
+    assert await pr_count(target, uid) == 3
+    prs = (await client.get("/prs", headers=auth_header)).json()
+    assert sorted(pr["weight"] for pr in prs) == [20, 100, 110]
+    milestones = (await client.get("/milestones", headers=auth_header)).json()
+    assert {m["name"] for m in milestones if m["is_unlocked"]} == {"novice", "century"}
+
+@pytest.mark.anyio
+async def test_percentiles_merge_all_shards(client, auth_header, two_shards):
+    uid = await user_id(client, auth_header)
+    exercise = f"Merge Press {uuid.uuid4().hex[:8]}"
+    await client.post("/prs", json={"exercise": exercise, "weight": 100, "reps": 1}, headers=auth_header)
+    await shards.move_user(uid, 1 - await home_shard(uid))
+
+    other = "shard_other_" + str(uid)
+    await client.post("/auth/register", json={"username": other, "password": "pw"})
+    token = (await client.post("/auth/token", data={"username": other, "password": "pw"})).json()["access_token"]
+    other_header = {"Authorization": f"Bearer {token}"}
+    other_id = await user_id(client, other_header)
+    await client.post("/prs", json={"exercise": exercise, "weight": 50, "reps": 1}, headers=other_header)
+    if await home_shard(other_id) == await home_shard(uid):
+        await shards.move_user(other_id, 1 - await home_shard(uid))
+
+    response = await client.get("/analytics/percentile", params={"exercise": exercise, "weight": 75}, headers=auth_header)
+    assert response.json()["users"] == 2
+    assert response.json()["percentile"] == 50.0
+
+@pytest.mark.anyio
+async def test_move_renumbers_taken_ids(client, auth_header, two_shards):
+    uid = await user_id(client, auth_header)
+    source = await home_shard(uid)
+    target = 1 - source
+    pr = (await client.post("/prs", json={"exercise": "Clash", "weight": 60, "reps": 5}, headers=auth_header)).json()
+    # Another user on the target already has a PR with this id.
+    async with shards.session(target) as session:
+        session.add(PR(id=pr["id"], user_id=uid + 100000, exercise="Other", weight=1, reps=1))
+        await session.commit()
+
+    seq = (await client.get("/prs/changes", headers=auth_header)).json()["seq"]
+    stats = await shards.move_user(uid, target)
+    assert stats["renumbered"] == 1
+
+    changes = (await client.get("/prs/changes", params={"since": seq}, headers=auth_header)).json()
+    assert changes["deletes"] == [pr["id"]]
+    assert [(p["exercise"], p["id"] != pr["id"]) for p in changes["upserts"]] == [("Clash", True)]
+    full = (await client.get("/prs", headers=auth_header)).json()
+    assert sorted(p["exercise"] for p in full) == ["Clash", "Warmup"]
@@ -0,0 +1,22 @@
+import subprocess
+import sys
+import pytest
+from app.db import SCHEMA_VERSION, get_schema_version, init_db
+
+def test_import_does_not_load_ai_coach():
+    # Run in a fresh interpreter: other tests may already have imported it.
+    probe = "import sys, app.main; print('app.ai_coach' in sys.modules, 'httpx' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, check=True)
+    assert result.stdout.split() == ["False", "False"]
+
+@pytest.mark.anyio
+async def test_schema_version_is_recorded():
+    await init_db()
+    assert await get_schema_version() == SCHEMA_VERSION
+
+@pytest.mark.anyio
+async def test_init_db_skips_ddl_when_current(monkeypatch):
+    async def fail():
+        raise AssertionError("migrate() should not run on an up-to-date schema")
+    monkeypatch.setattr("app.db.migrate", fail)
+    await init_db()
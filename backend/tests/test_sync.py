@@ -0,0 +1,32 @@
+import uuid
+import pytest
+
+@pytest.mark.anyio
+async def test_changes_since_returns_only_new_writes(client, auth_header):
+    kept = (await client.post("/prs", json={"exercise": "Squat", "weight": 100, "reps": 5}, headers=auth_header)).json()
+    doomed = (await client.post("/prs", json={"exercise": "Bench Press", "weight": 80, "reps": 5}, headers=auth_header)).json()
+
+    snapshot = (await client.get("/prs/changes", headers=auth_header)).json()
+    assert {pr["id"] for pr in snapshot["upserts"]} == {kept["id"], doomed["id"]}
+    assert snapshot["deletes"] == []
+
+    await client.put(f"/prs/{kept['id']}", json={"weight": 105}, headers=auth_header)
+    await client.delete(f"/prs/{doomed['id']}", headers=auth_header)
+
+    delta = (await client.get(f"/prs/changes?since={snapshot['seq']}", headers=auth_header)).json()
+    assert [pr["weight"] for pr in delta["upserts"]] == [105]
+    assert delta["deletes"] == [doomed["id"]]
+    assert delta["seq"] == snapshot["seq"] + 2
+
+    idle = (await client.get(f"/prs/changes?since={delta['seq']}", headers=auth_header)).json()
+    assert idle == {"seq": delta["seq"], "upserts": [], "deletes": []}
+
+@pytest.mark.anyio
+async def test_changes_are_per_user(client, auth_header):
+    await client.post("/prs", json={"exercise": "Deadlift", "weight": 150, "reps": 1}, headers=auth_header)
+
+    username = f"sync_{uuid.uuid4().hex}"
+    await client.post("/auth/register", json={"username": username, "password": "pw"})
+    token = (await client.post("/auth/token", data={"username": username, "password": "pw"})).json()["access_token"]
+    other = (await client.get("/prs/changes", headers={"Authorization": f"Bearer {token}"})).json()
+    assert other == {"seq": 0, "upserts": [], "deletes": []}
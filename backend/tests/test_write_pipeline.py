@@ -0,0 +1,81 @@
+import asyncio
+import pytest
+from app import write_pipeline
+from app.models import PRCreate
+from app.write_pipeline import GroupCommitter
+
+@pytest.fixture
+async def committer():
+    committer = GroupCommitter(window=0.05, max_batch=16)
+    await committer.start()
+    write_pipeline.committer = committer
+    yield committer
+    write_pipeline.committer = None
+    await committer.stop()
+
+async def user_id(client, auth_header):
+    # The API does not expose ids; read one back from a PR.
+    pr = (await client.post("/prs", json={"exercise": "Warmup", "weight": 20, "reps": 10}, headers=auth_header)).json()
+    return pr["user_id"]
+
+@pytest.mark.anyio
+async def test_concurrent_creates_share_a_commit(client, auth_header, committer, monkeypatch):
+    commits = []
+    original = GroupCommitter._commit
+
+    async def counting(self, shard, batch):
+        commits.append(len(batch))
+        await original(self, shard, batch)
+
+    monkeypatch.setattr(GroupCommitter, "_commit", counting)
+    responses = await asyncio.gather(*(
+        client.post("/prs", json={"exercise": "Squat", "weight": 100 + i, "reps": 5}, headers=auth_header)
+        for i in range(10)
+    ))
+    assert [r.status_code for r in responses] == [201] * 10
+    assert len({r.json()["id"] for r in responses}) == 10
+    assert sum(commits) == 10 and len(commits) < 10
+
+    prs = (await client.get("/prs", headers=auth_header)).json()
+    assert len(prs) == 10
+    milestones = (await client.get("/milestones", headers=auth_header)).json()
+    assert {m["name"] for m in milestones if m["is_unlocked"]} >= {"novice", "gains", "destroyer", "century"}
+
+@pytest.mark.anyio
+async def test_failed_write_only_fails_its_caller(client, auth_header, committer):
+    uid = await user_id(client, auth_header)
+    good = committer.submit(uid, PRCreate(exercise="Bench Press", weight=80, reps=5))
+    # Skips validation, so the insert itself fails (exercise is NOT NULL).
+    bad = committer.submit(uid, PRCreate.model_construct(exercise=None, weight=80, reps=5))
+    results = await asyncio.gather(good, bad, return_exceptions=True)
+    assert results[0].id is not None
+    assert isinstance(results[1], Exception)
+
+    prs = (await client.get("/prs", headers=auth_header)).json()
+    assert sorted(pr["exercise"] for pr in prs) == ["Bench Press", "Warmup"]
+
+@pytest.mark.anyio
+async def test_stop_commits_queued_writes_then_refuses_new_ones(client, auth_header, committer):
+    uid = await user_id(client, auth_header)
+    queued = asyncio.create_task(committer.submit(uid, PRCreate(exercise="Deadlift", weight=140, reps=3)))
+    await asyncio.sleep(0)
+    await committer.stop()
+    assert (await queued).id is not None
+    with pytest.raises(write_pipeline.CommitterClosed):
+        await committer.submit(uid, PRCreate(exercise="Deadlift", weight=145, reps=3))
+
+    # A request that still picked up the stopping committer writes directly.
+    response = await client.post("/prs", json={"exercise": "Row", "weight": 60, "reps": 8}, headers=auth_header)
+    assert response.status_code == 201
+    prs = (await client.get("/prs", headers=auth_header)).json()
+    assert sorted(pr["exercise"] for pr in prs) == ["Deadlift", "Row", "Warmup"]
+
+@pytest.mark.anyio
+async def test_writes_left_behind_the_stop_sentinel_fail():
+    committer = GroupCommitter()
+    committer._queue.put_nowait(None)
+    stranded = asyncio.create_task(committer.submit(1, PRCreate(exercise="Squat", weight=100, reps=5)))
+    await asyncio.sleep(0)
+    await committer._run()
+    with pytest.raises(write_pipeline.CommitterClosed):
+        await asyncio.wait_for(stranded, timeout=1)
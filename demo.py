@@ -1,3 +1,7 @@
+import argparse
+import asyncio
+import math
+import random
 import urllib.request
 import urllib.error
 import urllib.parse
@@ -138,5 +142,147 @@ def main():
 
     print("\n✨ Demo Completed Successfully! ✨")
 
+# --- Load Mode ---
+# Open-loop load: athlete visits arrive as a Poisson process whatever the
+# server's latency, so a slow server faces a growing backlog the way it
+# would in production (a closed loop would politely slow down with it).
+
+EXERCISES = ["Squat", "Bench Press", "Deadlift", "Overhead Press", "Barbell Row", "Pull Up", "Leg Press"]
+
+class Stats:
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = {}
+        self.errors: dict[str, int] = {}
+        self.statuses: dict[int, int] = {}
+        self.dropped = 0
+
+    def record(self, endpoint, status, latency):
+        self.latencies.setdefault(endpoint, []).append(latency)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if not 200 <= status < 300:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+def percentile(sorted_values, q):
+    index = max(0, math.ceil(q / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+async def timed(client, stats, endpoint, method, url, **kwargs):
+    start = time.perf_counter()
+    try:
+        response = await client.request(method, url, **kwargs)
+        status = response.status_code
+    except Exception:
+        response, status = None, 0  # connection refused, pool timeout, ...
+    stats.record(endpoint, status, time.perf_counter() - start)
+    return response
+
+async def athlete_visit(client, stats, athletes, new_athlete_share):
+    """One visit: sign up or log in, log a PR or two, look at progress."""
+    if not athletes or random.random() < new_athlete_share:
+        username = f"load_{time.time_ns()}_{random.randrange(10**6)}"
+        response = await timed(client, stats, "POST /auth/register", "POST", "/auth/register",
+                               json={"username": username, "password": PASSWORD})
+        # Only athletes that exist can come back and log in; a shed or
+        # failed sign-up would turn into spurious 401s later.
+        if response is not None and response.status_code == 200:
+            athletes.append(username)
+    else:
+        username = random.choice(athletes)
+        response = await timed(client, stats, "POST /auth/token", "POST", "/auth/token",
+                               data={"username": username, "password": PASSWORD})
+    if response is None or response.status_code != 200:
+        return
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    for _ in range(random.choice((1, 1, 2, 3))):
+        pr = {"exercise": random.choice(EXERCISES), "weight": random.randrange(40, 200, 5), "reps": random.randint(1, 10)}
+        await timed(client, stats, "POST /prs", "POST", "/prs", json=pr, headers=headers)
+    await timed(client, stats, "GET /prs", "GET", "/prs", headers=headers)
+    if random.random() < 0.6:
+        await timed(client, stats, "GET /milestones", "GET", "/milestones", headers=headers)
+
+def arrival_rate(elapsed, rate, ramp_up):
+    """Visits per second at `elapsed`: linear ramp from 0, then flat."""
+    if ramp_up > 0 and elapsed < ramp_up:
+        return rate * elapsed / ramp_up
+    return rate
+
+async def run_load(args):
+    try:
+        import httpx
+    except ImportError:
+        print("❌ Load mode needs httpx (it ships with the backend: `cd backend && uv run python ../demo.py --load`).")
+        return
+
+    stats = Stats()
+    athletes: list[str] = []
+    in_flight: set[asyncio.Task] = set()
+    limits = httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections)
+
+    print(f"🚀 Open-loop load: {args.rate} visits/s (ramp {args.ramp_up}s) for {args.duration}s against {args.base_url}")
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout) as client:
+        start = time.perf_counter()
+        while True:
+            # Poisson arrivals with a time-varying rate, by thinning: draw at
+            # the peak rate and keep each arrival with probability rate(t)/peak.
+            await asyncio.sleep(random.expovariate(args.rate))
+            elapsed = time.perf_counter() - start
+            if elapsed >= args.duration:
+                break
+            if random.random() > arrival_rate(elapsed, args.rate, args.ramp_up) / args.rate:
+                continue
+            if len(in_flight) >= args.max_in_flight:
+                stats.dropped += 1
+                continue
+            task = asyncio.create_task(athlete_visit(client, stats, athletes, args.new_athletes))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+
+        if in_flight:
+            await asyncio.wait(in_flight)
+        wall = time.perf_counter() - start
+
+    report(stats, wall)
+
+def report(stats, wall):
+    print_step(f"Results over {wall:.1f}s")
+    header = f"{'endpoint':<22}{'count':>8}{'req/s':>9}{'err%':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+    print(header)
+    print("-" * len(header))
+    total = errors = 0
+    for endpoint, values in sorted(stats.latencies.items()):
+        values.sort()
+        count, failed = len(values), stats.errors.get(endpoint, 0)
+        total += count
+        errors += failed
+        print(
+            f"{endpoint:<22}{count:>8}{count / wall:>9.1f}{100 * failed / count:>7.1f}"
+            f"{percentile(values, 50) * 1000:>9.1f}{percentile(values, 95) * 1000:>9.1f}"
+            f"{percentile(values, 99) * 1000:>9.1f}{values[-1] * 1000:>9.1f}"
+        )
+    if total:
+        print(f"\nTotal: {total} requests, {total / wall:.1f} req/s, {100 * errors / total:.2f}% errors")
+    print(f"Status codes: {dict(sorted(stats.statuses.items()))} (0 = transport error)")
+    if stats.dropped:
+        print(f"⚠️ {stats.dropped} visits dropped at the client (--max-in-flight reached); the server is saturated.")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Gym PR Tracker demo walkthrough, or an open-loop load test with --load.")
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--load", action="store_true", help="run the load generator instead of the walkthrough")
+    parser.add_argument("--rate", type=float, default=10.0, help="peak athlete visits started per second")
+    parser.add_argument("--ramp-up", type=float, default=10.0, help="seconds to ramp linearly from 0 to --rate")
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds to generate arrivals for")
+    parser.add_argument("--new-athletes", type=float, default=0.2, help="share of visits that register a new athlete")
+    parser.add_argument("--connections", type=int, default=100, help="HTTP connection pool size")
+    parser.add_argument("--max-in-flight", type=int, default=2000, help="visits in progress before new ones are dropped")
+    parser.add_argument("--timeout", type=float, default=30.0, help="per request timeout in seconds")
+    return parser.parse_args()
+
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    BASE_URL = args.base_url
+    if args.load:
+        asyncio.run(run_load(args))
+    else:
+        main()
@@ -1,4 +1,4 @@
-import { useEffect, useState } from "react";
+import { useEffect, useRef, useState } from "react";
 import { api } from "./api";
 import type { PR, PRCreate, PRUpdate } from "./types";
 import { Milestones } from "./components/Milestones/Milestones";
@@ -19,18 +19,30 @@ function App() {
   );
 
   const [username, setUsername] = useState<string>("");
+  // Last change sequence we have applied; 0 means we hold nothing yet.
+  const syncedSeq = useRef(0);
 
   const handleLogout = () => {
     localStorage.removeItem("token");
     setToken(null);
     setPrs([]);
+    syncedSeq.current = 0;
     setUsername("");
   };
 
   const fetchPRs = async () => {
     try {
-      const data = await api.getAll();
-      setPrs(data);
+      const since = syncedSeq.current;
+      const changes = await api.getChanges(since);
+      setPrs((current) => {
+        const byId = new Map<number, PR>(
+          (since === 0 ? [] : current).map((pr): [number, PR] => [pr.id, pr]),
+        );
+        changes.deletes.forEach((id) => byId.delete(id));
+        changes.upserts.forEach((pr) => byId.set(pr.id, pr));
+        return [...byId.values()].sort((a, b) => a.id - b.id);
+      });
+      syncedSeq.current = changes.seq;
     } catch (error: any) {
       console.error("Error fetching PRs:", error);
       if (error.response?.status === 401) {
@@ -42,6 +54,7 @@ function App() {
   // Fetch PRs when token changes
   useEffect(() => {
     if (token) {
+      syncedSeq.current = 0;
       fetchPRs();
       try {
         // Simple JWT decode to get username
@@ -108,8 +121,8 @@ function App() {
     if (deletingPRId === null) return;
     try {
       await api.delete(deletingPRId);
-      setPrs(prs.filter((pr) => pr.id !== deletingPRId));
       setDeletingPRId(null);
+      await fetchPRs();
     } catch (error) {
       alert("Failed to delete PR");
     }
@@ -1,5 +1,5 @@
 import axios from "axios";
-import type { PR, PRCreate, PRUpdate, Milestone } from "./types";
+import type { PR, PRChanges, PRCreate, PRUpdate, Milestone } from "./types";
 
 const API_URL = "http://127.0.0.1:8000";
 
@@ -42,6 +42,14 @@ export const api = {
     return response.data;
   },
 
+  // Get PRs written or deleted after change `since` (0 = everything)
+  getChanges: async (since: number): Promise<PRChanges> => {
+    const response = await client.get<PRChanges>("/prs/changes", {
+      params: { since },
+    });
+    return response.data;
+  },
+
   // Create a new PR
   create: async (data: PRCreate): Promise<PR> => {
     const response = await client.post<PR>("/prs", data);
@@ -65,6 +73,14 @@ export const api = {
     return response.data;
   },
 
+  // Exercise names for autocomplete: the user's own first, then common lifts
+  suggestExercises: async (q: string): Promise<string[]> => {
+    const response = await client.get<string[]>("/exercises/suggest", {
+      params: { q },
+    });
+    return response.data;
+  },
+
   // Generate Workout Routine
   generateRoutine: async (data: {
     fitness_level: string;
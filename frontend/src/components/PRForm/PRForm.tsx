@@ -1,8 +1,23 @@
 import { useState, useEffect } from "react";
+import { api } from "../../api";
 import type { PRCreate } from "../../types";
 import { Input } from "../Input/Input";
 import styles from "./PRForm.module.css";
 
+// Shown when suggestions cannot be fetched.
+const DEFAULT_EXERCISES = [
+  "Squat",
+  "Bench Press",
+  "Deadlift",
+  "Overhead Press",
+  "Pull Up",
+  "Barbell Row",
+  "Incline Bench Press",
+  "Dips",
+  "Romanian Deadlift",
+  "Leg Press",
+];
+
 interface PRFormProps {
   onSubmit: (data: PRCreate) => Promise<void>;
   onCancel?: () => void;
@@ -15,6 +30,7 @@ export function PRForm({ onSubmit, onCancel, initialValues }: PRFormProps) {
   const [reps, setReps] = useState(initialValues?.reps.toString() || "");
   const [loading, setLoading] = useState(false);
   const [showDropdown, setShowDropdown] = useState(false);
+  const [suggestions, setSuggestions] = useState<string[] | null>(null);
 
   useEffect(() => {
     if (initialValues) {
@@ -24,6 +40,31 @@ export function PRForm({ onSubmit, onCancel, initialValues }: PRFormProps) {
     }
   }, [initialValues]);
 
+  useEffect(() => {
+    if (!showDropdown) return;
+    let cancelled = false;
+    const timer = setTimeout(() => {
+      api
+        .suggestExercises(exercise)
+        .then((names) => {
+          if (!cancelled) setSuggestions(names);
+        })
+        .catch(() => {
+          if (!cancelled) setSuggestions(null);
+        });
+    }, 150);
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [exercise, showDropdown]);
+
+  const options =
+    suggestions ??
+    DEFAULT_EXERCISES.filter((ex) =>
+      ex.toLowerCase().includes(exercise.toLowerCase()),
+    );
+
   const handleSubmit = async (e: React.FormEvent) => {
     e.preventDefault();
     if (!exercise || !weight || !reps) return;
@@ -74,34 +115,19 @@ export function PRForm({ onSubmit, onCancel, initialValues }: PRFormProps) {
             />
             {showDropdown && (
               <div className={styles.dropdown}>
-                {[
-                  "Squat",
-                  "Bench Press",
-                  "Deadlift",
-                  "Overhead Press",
-                  "Pull Up",
-                  "Barbell Row",
-                  "Incline Bench Press",
-                  "Dips",
-                  "Romanian Deadlift",
-                  "Leg Press",
-                ]
-                  .filter((ex) =>
-                    ex.toLowerCase().includes(exercise.toLowerCase()),
-                  )
-                  .map((ex) => (
-                    <div
-                      key={ex}
-                      onMouseDown={(e) => {
-                        e.preventDefault();
-                        setExercise(ex);
-                        setShowDropdown(false);
-                      }}
-                      className={styles.dropdownItem}
-                    >
-                      {ex}
-                    </div>
-                  ))}
+                {options.map((ex) => (
+                  <div
+                    key={ex}
+                    onMouseDown={(e) => {
+                      e.preventDefault();
+                      setExercise(ex);
+                      setShowDropdown(false);
+                    }}
+                    className={styles.dropdownItem}
+                  >
+                    {ex}
+                  </div>
+                ))}
               </div>
             )}
           </div>
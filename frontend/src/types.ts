@@ -6,6 +6,12 @@ export interface PR {
   performed_at: string;
 }
 
+export interface PRChanges {
+  seq: number;
+  upserts: PR[];
+  deletes: number[];
+}
+
 export interface PRCreate {
   exercise: string;
   weight: number;